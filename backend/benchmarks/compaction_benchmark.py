@@ -0,0 +1,124 @@
+# backend/benchmarks/compaction_benchmark.py
+
+# Compares prompt size and extraction accuracy with prompt compaction on and off.
+# Run from the backend folder:
+#
+#   python -m benchmarks.compaction_benchmark                 # offline: token estimates and field retention
+#   python -m benchmarks.compaction_benchmark --live          # real OpenAI calls (needs OPENAI_API_KEY)
+#
+# Offline mode can't ask the model, so it checks the next best thing: whether
+# the vendor, total and date are still in the prompt after compaction. Live
+# mode sends every invoice both ways and scores the answers against the
+# known values, using the token counts OpenAI reports.
+
+import time
+import random
+import asyncio
+import argparse
+import datetime
+from dotenv import load_dotenv
+
+# --live needs OPENAI_API_KEY, which may be in .env
+load_dotenv()
+
+from services.openai_service import build_messages, extract_invoice_data_async
+from services.prompt_compaction import estimate_tokens, PROMPT_TOKEN_BUDGET
+from utils.normalize import parse_amount, parse_invoice_date
+
+VENDORS = ["Northwind Supplies", "Contoso Consulting LLC", "Globex Utilities", "Initech Hardware Inc", "Umbrella Travel Co"]
+ITEMS = ["Printer paper", "Consulting hours", "Network switch", "Cloud hosting", "Office chairs", "Flight LHR-JFK", "Electricity"]
+TERMS = (
+    "Payment terms and conditions: all invoices are payable within thirty days. The supplier shall not be liable for "
+    "indirect or consequential losses, and any warranty is limited to replacement of the goods. These terms are "
+    "governed by the laws of the State of Delaware and any dispute shall be settled by arbitration. Confidential."
+)
+
+def make_invoice(rng, number):
+    """A synthetic invoice: header, line items, totals and a few pages of terms. Returns (text, truth)."""
+    vendor = rng.choice(VENDORS)
+    issued = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+    items = [(rng.choice(ITEMS), rng.randint(1, 20), rng.randint(500, 50000) / 100) for _ in range(rng.randint(5, 60))]
+    subtotal = round(sum(qty * price for _, qty, price in items), 2)
+    tax = round(subtotal * 0.08, 2)
+    total = round(subtotal + tax, 2)
+    pages = rng.randint(1, 4)
+
+    lines = [vendor, "1200 Market Street, Suite 400", "San Francisco, CA 94103", "",
+             f"INVOICE #INV-{number:05d}", f"Invoice Date: {issued.strftime('%B %d, %Y')}",
+             f"Due Date: {(issued + datetime.timedelta(days=30)).strftime('%B %d, %Y')}",
+             "Bill To: Example Customer Ltd, 1 Main Street, Springfield", "",
+             "Description Qty Unit price Amount"]
+    lines += [f"{name} {qty} ${price:,.2f} ${qty * price:,.2f}" for name, qty, price in items]
+    lines += [f"Subtotal ${subtotal:,.2f}", f"Sales tax 8% ${tax:,.2f}", "Total Due", f"${total:,.2f}", ""]
+    for page in range(2, pages + 2):
+        lines += [f"{vendor} - Page {page} of {pages + 1}"] + [TERMS] * rng.randint(4, 10)
+
+    truth = {"vendor": vendor, "amount": total, "invoice_date": issued.isoformat()}
+    return "\n".join(lines), truth
+
+def prompt_tokens(invoice_text, compact):
+    return estimate_tokens("".join(message["content"] for message in build_messages(invoice_text, compact)))
+
+def fields_in_prompt(invoice_text, truth, compact):
+    """How many of vendor, total and date still appear in the prompt."""
+    prompt = build_messages(invoice_text, compact)[-1]["content"]
+    issued = datetime.date.fromisoformat(truth["invoice_date"])
+    return sum([
+        truth["vendor"] in prompt,
+        f"{truth['amount']:,.2f}" in prompt,
+        issued.strftime("%B %d, %Y") in prompt,
+    ])
+
+def score_answer(data, truth):
+    """How many of vendor, total and date the model got right."""
+    vendor = (data.get("vendor") or "").strip().lower()
+    return sum([
+        bool(vendor) and (vendor in truth["vendor"].lower() or truth["vendor"].lower() in vendor),
+        parse_amount(data.get("amount"))[0] == parse_amount(truth["amount"])[0],
+        parse_invoice_date(data.get("invoice_date")) == datetime.date.fromisoformat(truth["invoice_date"]),
+    ])
+
+def run_offline(invoices):
+    for compact in (False, True):
+        tokens = [prompt_tokens(text, compact) for text, _ in invoices]
+        retained = sum(fields_in_prompt(text, truth, compact) for text, truth in invoices)
+        print(f"compaction {'on ' if compact else 'off'}: "
+              f"{sum(tokens):>8} prompt tokens (avg {sum(tokens) / len(tokens):7.0f}, max {max(tokens):6}), "
+              f"fields kept {retained}/{3 * len(invoices)}")
+
+async def run_live(invoices):
+    for compact in (False, True):
+        prompt_total = completion_total = correct = 0
+        started = time.perf_counter()
+        for text, truth in invoices:
+            try:
+                data, usage = await extract_invoice_data_async(text, compact)
+            except Exception as e:
+                print(f"⚠️ Extraction failed: {e}")
+                continue
+            prompt_total += usage["prompt_tokens"]
+            completion_total += usage["completion_tokens"]
+            correct += score_answer(data, truth)
+        elapsed = time.perf_counter() - started
+        print(f"compaction {'on ' if compact else 'off'}: "
+              f"{prompt_total:>8} prompt + {completion_total} completion tokens, "
+              f"fields correct {correct}/{3 * len(invoices)}, {elapsed / len(invoices):.2f}s per invoice")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt compaction benchmark")
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--live", action="store_true", help="Call OpenAI and score the answers")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    invoices = [make_invoice(rng, number) for number in range(args.invoices)]
+    print(f"{len(invoices)} synthetic invoices, token budget {PROMPT_TOKEN_BUDGET}")
+
+    if args.live:
+        asyncio.run(run_live(invoices))
+    else:
+        run_offline(invoices)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# backend/benchmarks/db_concurrency_benchmark.py
+
+# Read/write throughput of the database under concurrent load, with the old
+# engine settings (rollback journal, default pool) and with database.py's
+# make_engine (WAL, pragmas, bigger pool). Writer threads insert invoices
+# and commit one at a time, the way uploads do; reader threads page
+# through the invoice list at the same time. Run from the backend folder:
+#
+#   python -m benchmarks.db_concurrency_benchmark
+#   python -m benchmarks.db_concurrency_benchmark --writers 8 --readers 16 --seconds 10
+#   python -m benchmarks.db_concurrency_benchmark --url postgresql+psycopg://localhost/bench   # tuned profile only
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import datetime
+import threading
+import statistics
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import make_engine
+from migrations import run_migrations
+from models.invoice import Invoice
+from models.user import User
+
+SEED_INVOICES = 20000
+OWNERS = 20
+PAGE_SIZE = 100
+VENDORS = ["Northwind Supplies", "Contoso Consulting LLC", "Globex Utilities", "Initech Hardware Inc", "Umbrella Travel Co"]
+
+def seed(engine):
+    run_migrations(engine)
+    rng = random.Random(1)
+    started = datetime.datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": owner, "email": f"user{owner}@example.com"} for owner in range(1, OWNERS + 1)])
+        conn.execute(insert(Invoice), [
+            {
+                "owner_id": rng.randint(1, OWNERS), "file_name": f"invoice-{i}.pdf", "file_path": "uploads/x.pdf",
+                "upload_date": started + datetime.timedelta(seconds=i), "vendor": rng.choice(VENDORS),
+                "amount_cents": rng.randint(100, 900000), "currency": "USD", "extraction_status": "completed",
+            }
+            for i in range(SEED_INVOICES)
+        ])
+
+def run_load(sessions, writers, readers, seconds):
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {"write": [], "read": [], "errors": 0}
+
+    def record(kind, elapsed):
+        with lock:
+            results[kind].append(elapsed)
+
+    def writer(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = sessions()
+            try:
+                db.add(Invoice(owner_id=rng.randint(1, OWNERS), file_name="upload.pdf", file_path="uploads/y.pdf",
+                               vendor=rng.choice(VENDORS), amount=rng.randint(1, 9000), extraction_status="pending"))
+                db.commit()
+                record("write", time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    results["errors"] += 1
+            finally:
+                db.close()
+
+    def reader(number):
+        rng = random.Random(1000 + number)
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = sessions()
+            try:
+                # A list page, like GET /invoices/
+                (db.query(Invoice).filter(Invoice.owner_id == rng.randint(1, OWNERS))
+                   .order_by(Invoice.upload_date, Invoice.id).limit(PAGE_SIZE).all())
+                record("read", time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    results["errors"] += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+def p95(timings):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * 0.95))] if timings else 0.0
+
+def report(label, results, seconds):
+    writes, reads = results["write"], results["read"]
+    print(
+        f"{label:<10} {len(writes) / seconds:>9.0f} {p95(writes) * 1000:>10.1f}"
+        f" {len(reads) / seconds:>9.0f} {p95(reads) * 1000:>10.1f} {results['errors']:>7}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Database read/write throughput under concurrent load")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--url", help="Benchmark this (empty) database with the tuned settings only")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.url:
+            profiles = [("tuned", lambda: make_engine(args.url))]
+        else:
+            # What database.py used to do: defaults everywhere
+            profiles = [
+                ("before", lambda: create_engine(f"sqlite:///{os.path.join(folder, 'before.db')}",
+                                                 connect_args={"check_same_thread": False})),
+                ("after", lambda: make_engine(f"sqlite:///{os.path.join(folder, 'after.db')}")),
+            ]
+
+        print(f"{args.writers} writers, {args.readers} readers, {args.seconds:.0f}s each, {SEED_INVOICES} seeded invoices\n")
+        print(f"{'':<10} {'writes/s':>9} {'p95 ms':>10} {'reads/s':>9} {'p95 ms':>10} {'errors':>7}")
+        for label, build in profiles:
+            engine = build()
+            seed(engine)
+            sessions = sessionmaker(bind=engine, autoflush=False)
+            results = run_load(sessions, args.writers, args.readers, args.seconds)
+            report(label, results, args.seconds)
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# backend/benchmarks/search_benchmark.py
+
+# Times full-text search on a big tenant. Builds a throwaway SQLite database
+# with synthetic invoices (one large tenant plus a few small ones), indexes
+# them the way startup does, and runs a mix of queries.
+# Run from the backend folder:
+#
+#   python -m benchmarks.search_benchmark                   # 100k invoices for the big tenant
+#   python -m benchmarks.search_benchmark --invoices 300000
+
+import os
+import time
+import zlib
+import random
+import hashlib
+import argparse
+import tempfile
+import statistics
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from database import Base
+from models.invoice import Invoice
+from models.user import User  # noqa: F401 - invoices.owner_id points at users
+from models.document_text import DocumentText
+from services.search_index import create_search_index, search_invoices
+
+VENDORS = ["Northwind Supplies", "Contoso Consulting LLC", "Globex Utilities", "Initech Hardware Inc", "Umbrella Travel Co",
+           "Stark Industries", "Wayne Enterprises", "Acme Corporation", "Hooli Cloud", "Vandelay Imports"]
+CATEGORIES = ["Office Supplies", "Consulting", "Utilities", "Hardware", "Travel", "Software"]
+ITEMS = ["printer paper", "consulting hours", "network switch", "cloud hosting", "office chairs", "flight tickets",
+         "electricity", "laptop", "monitor stand", "software licence", "catering", "courier service"]
+QUERIES = ["northwind", "contoso consulting", "laptop", "hosting invoice", "umbr", "courier service march",
+           "stark hardware", "electricity utilities", "wayne", "invoice 104211", "vandelay 1042"]
+BATCH_SIZE = 5000
+
+def make_row(rng, invoice_id, owner_id):
+    vendor = rng.choice(VENDORS)
+    items = rng.sample(ITEMS, 4)
+    text = (
+        f"{vendor}\nInvoice #{invoice_id}\nDate: March {rng.randint(1, 28)}, 2025\n"
+        + "\n".join(f"{item} {rng.randint(1, 9)} x {rng.randint(5, 900)}.00" for item in items)
+        + f"\nTotal due: USD {rng.randint(50, 90000)}.00\nThank you for your business"
+    )
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    invoice = {
+        "id": invoice_id, "owner_id": owner_id, "file_name": f"invoice-{invoice_id}.pdf", "vendor": vendor,
+        "category": rng.choice(CATEGORIES), "content_hash": content_hash, "extraction_status": "completed",
+    }
+    document = {
+        "content_hash": content_hash, "text_zlib": zlib.compress(text.encode("utf-8")), "char_count": len(text),
+        "page_count": 1, "pages_read": 1, "has_text_layer": True,
+    }
+    return invoice, document
+
+def seed(engine, rng, big_tenant, small_tenants, small_size):
+    owners = [1] * big_tenant + [owner for owner in range(2, small_tenants + 2) for _ in range(small_size)]
+    rng.shuffle(owners)  # Tenants' invoices interleave like real uploads
+    with engine.begin() as conn:
+        for start in range(0, len(owners), BATCH_SIZE):
+            rows = [make_row(rng, invoice_id, owners[invoice_id - 1]) for invoice_id in range(start + 1, min(start + BATCH_SIZE, len(owners)) + 1)]
+            conn.execute(insert(Invoice), [invoice for invoice, _ in rows])
+            conn.execute(insert(DocumentText).prefix_with("OR IGNORE"), [document for _, document in rows])
+    return len(owners)
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--invoices", type=int, default=100_000, help="Invoices for the big tenant")
+    parser.add_argument("--tenants", type=int, default=20, help="Other, smaller tenants")
+    parser.add_argument("--tenant-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        engine = create_engine(f"sqlite:///{os.path.join(folder, 'search.db')}")
+        Base.metadata.create_all(bind=engine)
+
+        started = time.perf_counter()
+        total = seed(engine, rng, args.invoices, args.tenants, args.tenant_size)
+        print(f"Seeded {total} invoices in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            create_search_index(conn)
+        print(f"Built the index in {time.perf_counter() - started:.1f}s\n")
+
+        with Session(engine) as db:
+            print(f"{'query':<26} {'hits':>6} {'median ms':>10} {'p95 ms':>8}")
+            for query in QUERIES:
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    hits = search_invoices(db, 1, query, limit=20)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(f"{query:<26} {len(hits):>6} {statistics.median(timings):>10.2f} {p95:>8.2f}")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/benchmarks/startup_benchmark.py
+
+# Measures how long a fresh API process takes to come up, and fails when it
+# takes longer than the budget, so slow imports don't creep back in.
+# Every run is a new Python process in an empty folder (so migrations start
+# from an empty database), timing:
+#
+#   import   - `import main`, i.e. building the app
+#   startup  - the lifespan: directories, migrations, background workers
+#
+# and checking that the OpenAI SDK and PyMuPDF weren't loaded on the way.
+# Run from the backend folder:
+#
+#   python -m benchmarks.startup_benchmark
+#   python -m benchmarks.startup_benchmark --runs 10 --budget 1.5
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds for import + startup (median), on a developer laptop
+DEFAULT_BUDGET_SECONDS = 1.5
+
+# Loaded on first use only - a cold start shouldn't pay for them
+LAZY_MODULES = ("openai", "fitz")
+
+CHILD = """
+import sys, time, json
+sys.path.insert(0, {backend!r})
+from fastapi.testclient import TestClient  # The test client's own imports aren't part of the app's startup
+
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+with TestClient(main.app):
+    ready = time.perf_counter()
+print(json.dumps({{
+    "import": imported - started,
+    "startup": ready - imported,
+    "loaded": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+def run_once():
+    with tempfile.TemporaryDirectory() as folder:
+        # .env and the real database stay out of it
+        env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(backend=BACKEND_DIR, lazy=LAZY_MODULES)],
+            cwd=folder, env=env, capture_output=True, text=True, timeout=120,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help="Seconds allowed for import + startup (median)")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    imports = [run["import"] for run in runs]
+    startups = [run["startup"] for run in runs]
+    totals = [run["import"] + run["startup"] for run in runs]
+
+    print(f"{'':<10} {'median ms':>10} {'max ms':>8}")
+    for label, timings in (("import", imports), ("startup", startups), ("total", totals)):
+        print(f"{label:<10} {statistics.median(timings) * 1000:>10.0f} {max(timings) * 1000:>8.0f}")
+
+    failed = False
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    if loaded:
+        print(f"❌ Loaded at startup but should be lazy: {', '.join(loaded)}")
+        failed = True
+    median = statistics.median(totals)
+    if median > args.budget:
+        print(f"❌ Median cold start {median:.2f}s is over the {args.budget:.2f}s budget")
+        failed = True
+    else:
+        print(f"✅ Median cold start {median:.2f}s, budget {args.budget:.2f}s")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -2,39 +2,115 @@
 
 from fastapi import FastAPI  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
+from fastapi.responses import PlainTextResponse # type: ignore
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
 import os
 
-from database import Base, engine 
-from routers import auth, invoice
+# Importing this module only builds the app. Everything that touches the
+# disk or the database - the uploads folder, migrations, the background
+# workers - happens once in the lifespan below, when the server starts.
+# The OpenAI SDK and PyMuPDF are loaded on first use (services/openai_service.py,
+# utils/pdf_processor.py). benchmarks/startup_benchmark.py keeps an eye on it.
 
-# Create the uploads directory if it doesn't exist
-os.makedirs("uploads", exist_ok=True)
+# Create the directories, the database tables and the background workers when the app starts and stop them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from database import engine
+    from migrations import run_migrations
+    from services.extraction_queue import worker_pool
+    from services.file_cleaner import file_cleaner
+    from services.event_hub import event_hub
+    from services.usage_ledger import usage_ledger
+    from utils.pdf_processor import pdf_pool
 
-# create the database tables if they don't exist 
-Base.metadata.create_all(bind=engine)
+    # Create the uploads directory if it doesn't exist
+    os.makedirs("uploads", exist_ok=True)
+    # create the database tables if they don't exist and add any new columns
+    run_migrations(engine)
 
-# Initialize FastAPI app 
-app = FastAPI(title="Invoice Analyzer API")
+    event_hub.start()
+    usage_ledger.start()
+    worker_pool.start()
+    file_cleaner.start()
+    yield
+    event_hub.close()
+    await worker_pool.stop()
+    await file_cleaner.stop()
+    # After the workers, so their last entries are written too
+    await usage_ledger.stop()
+    pdf_pool.shutdown()
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app():
+    """Builds the API. Run it with `uvicorn main:app`, or `uvicorn --factory main:create_app`."""
+    # The one place .env is read. It has to come before the app modules,
+    # which read their settings when they're imported.
+    load_dotenv()
 
-#Add routers for authentication and invoice management
-app.include_router(auth.router)
-app.include_router(invoice.router)
+    from database import SessionLocal
+    from routers import auth, invoice, stats, usage
+    from services.extraction_cache import extraction_cache
+    from services.event_hub import event_hub
+    from services.rule_extractor import extraction_stats
+    from utils.metrics import CallbackMetric, RequestTimingMiddleware, instrument_commits, render_metrics
 
-# Home route
-@app.get("/")
-async def root():
-    return {"message": "Welcome to the Invoice Analyzer API"}
+    # Initialize FastAPI app
+    app = FastAPI(title="Invoice Analyzer API", lifespan=lifespan)
 
-# Health check route
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "version": "0.1.0"}
\ No newline at end of file
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Content-Disposition"],  # Lets the frontend read the pagination cursor, ETags and export file names
+    )
+
+    # Time every request by route; event streams stay open for hours and would only skew it
+    app.add_middleware(RequestTimingMiddleware, skip_paths=["/metrics", "/invoices/events"])
+    instrument_commits(SessionLocal)
+
+    # Read from the components' own counters when /metrics is scraped
+    CallbackMetric(
+        "invoice_extraction_cache_lookups_total", "Extraction cache lookups by result", "counter",
+        lambda: {(result,): extraction_cache.counters[key] for result, key in
+                 (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))},
+        labelnames=["result"],
+    )
+    CallbackMetric("invoice_event_streams", "Open GET /invoices/events connections", "gauge", event_hub.subscriber_count)
+
+    #Add routers for authentication and invoice management
+    app.include_router(auth.router)
+    app.include_router(stats.router)
+    app.include_router(invoice.router)
+    app.include_router(usage.router)
+
+    # Home route
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to the Invoice Analyzer API"}
+
+    # Health check route
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy", "version": "0.1.0"}
+
+    # Extraction cache counters (per process) - GET /cache/stats
+    @app.get("/cache/stats")
+    async def cache_stats():
+        return extraction_cache.stats()
+
+    # Prometheus metrics for this process - GET /metrics
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    # How invoices were extracted (vendor rules, cache or OpenAI) and per-path latency - GET /extraction/stats
+    @app.get("/extraction/stats")
+    async def extraction_path_stats():
+        return extraction_stats.stats()
+
+    return app
+
+app = create_app()
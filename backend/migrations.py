@@ -0,0 +1,111 @@
+# File: backend/migrations.py
+
+from sqlalchemy import inspect, text
+
+from database import Base
+from services.search_index import create_search_index
+from services.vendor_directory import backfill_vendor_ids
+from utils.normalize import DEFAULT_CURRENCY, parse_amount, parse_invoice_date
+
+BACKFILL_BATCH_SIZE = 1000
+
+def backfill_typed_columns(conn):
+    """Fills amount_cents, currency and issued_on for rows saved before those columns existed."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT id, amount, invoice_date FROM invoices"
+                " WHERE id > :last_id"
+                " AND ((amount IS NOT NULL AND amount_cents IS NULL)"
+                " OR (invoice_date IS NOT NULL AND issued_on IS NULL))"
+                " ORDER BY id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": BACKFILL_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            return
+
+        for invoice_id, amount, invoice_date in rows:
+            cents, currency = parse_amount(amount)
+            issued_on = parse_invoice_date(invoice_date)
+            conn.execute(
+                text(
+                    "UPDATE invoices SET amount_cents = :cents,"
+                    " currency = COALESCE(currency, :currency), issued_on = :issued_on"
+                    " WHERE id = :id"
+                ),
+                {
+                    "id": invoice_id,
+                    "cents": cents,
+                    "currency": (currency or DEFAULT_CURRENCY) if cents is not None else None,
+                    "issued_on": issued_on,
+                },
+            )
+        last_id = rows[-1][0]
+
+# Data fixes that run after missing columns are added. Each entry is a SQL
+# statement or a function taking the connection, and must be safe to run on
+# every startup.
+BACKFILLS = [
+    # Invoices uploaded before the job queue existed were extracted inline
+    "UPDATE invoices SET extraction_status = 'completed' WHERE extraction_status IS NULL",
+    # Replaced by the wider (owner_id, column, upload_date, id) indexes
+    "DROP INDEX IF EXISTS ix_invoices_owner_category",
+    "DROP INDEX IF EXISTS ix_invoices_owner_vendor",
+    # Range queries moved to the typed issued_on / amount_cents columns
+    "DROP INDEX IF EXISTS ix_invoices_owner_invoice_date",
+    "DROP INDEX IF EXISTS ix_invoices_owner_amount",
+    # Replaced by ix_invoices_owner_issued, which also covers the duplicate filter
+    "DROP INDEX IF EXISTS ix_invoices_owner_issued_on",
+    # Vendor templates became per user (ix_vendor_templates_owner_vendor). The
+    # old shared ones can't be given to anyone, so they're learned again.
+    "DROP INDEX IF EXISTS ix_vendor_templates_vendor",
+    "DELETE FROM vendor_templates WHERE owner_id IS NULL",
+    backfill_typed_columns,
+    # Canonical vendors for invoices extracted before vendors existed
+    backfill_vendor_ids,
+    # Full-text search table, filled from existing invoices the first time
+    create_search_index,
+]
+
+def run_migrations(engine):
+    """
+    Brings an existing database up to date with the models.
+
+    create_all only creates missing tables, so this also adds any new columns
+    and indexes to tables that already exist, then runs the backfills.
+    """
+    # Make sure every model is registered on Base before creating tables
+    import models.invoice  # noqa: F401
+    import models.user  # noqa: F401
+    import models.vendor_template  # noqa: F401
+    import models.document_text  # noqa: F401
+    import models.invoice_fingerprint  # noqa: F401
+    import models.vendor  # noqa: F401
+    import models.reextraction  # noqa: F401
+    import models.api_usage  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+        for backfill in BACKFILLS:
+            if callable(backfill):
+                backfill(conn)
+            else:
+                conn.execute(text(backfill))
@@ -0,0 +1,33 @@
+# File: backend/models/api_usage.py
+
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, Index
+import datetime
+
+from database import Base
+
+class ApiUsage(Base):
+    """
+    One OpenAI extraction (or cache hit standing in for one) in the usage
+    ledger. Written in batches by services/usage_ledger.py and rolled up
+    by GET /usage.
+    """
+    __tablename__ = "api_usage"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    day = Column(Date, nullable=False)                 # UTC day of created_at, what the rollups group by
+    owner_id = Column(Integer, nullable=True)          # From the invoice; None when it was deleted before the flush
+    invoice_id = Column(Integer, nullable=True)        # No foreign key - usage outlives deleted invoices
+    model = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Integer, nullable=False, default=0)
+    cache_status = Column(String, nullable=False)      # hit, miss (a real API call) or batch
+    success = Column(Boolean, nullable=False, default=True)
+    cost_micro_usd = Column(BigInteger, nullable=False, default=0)  # Priced when recorded, in millionths of a dollar
+
+    __table_args__ = (
+        # Per-user and all-users rollups by day - the trailing columns make the sums index-only
+        Index("ix_api_usage_owner_day", "owner_id", "day", "cost_micro_usd", "prompt_tokens", "completion_tokens", "cache_status"),
+        Index("ix_api_usage_day_owner", "day", "owner_id", "cost_micro_usd", "prompt_tokens", "completion_tokens", "cache_status"),
+    )
@@ -0,0 +1,22 @@
+# File: backend/models/document_text.py
+
+from sqlalchemy import Column, Integer, String, Boolean, LargeBinary, DateTime
+import datetime
+
+from database import Base
+
+class DocumentText(Base):
+    """
+    Text extracted from a stored PDF, saved once per file content so
+    re-extraction, search and debugging never have to parse the PDF again.
+    Keyed by the file's SHA-256: new content means a new row.
+    """
+    __tablename__ = "document_texts"
+
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 of the PDF, same as Invoice.content_hash
+    text_zlib = Column(LargeBinary, nullable=False)      # zlib-compressed UTF-8 text
+    char_count = Column(Integer, nullable=False, default=0)
+    page_count = Column(Integer, nullable=False, default=0)  # Pages in the PDF
+    pages_read = Column(Integer, nullable=False, default=0)  # Pages we extracted (see PDF_MAX_PAGES)
+    has_text_layer = Column(Boolean, nullable=False, default=False)  # False for scanned PDFs without text
+    extracted_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -1,26 +1,99 @@
 #File: backend/models/invoice.py 
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Float, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Integer, BigInteger, String, Float, Date, DateTime, Index
+from sqlalchemy.orm import relationship, validates
 import datetime
 
 from database import Base
+from utils.normalize import DEFAULT_CURRENCY, parse_amount, parse_invoice_date, normalize_currency
+
+# Extraction job states - an upload starts as "pending" and the worker pool
+# moves it to "processing" and then "completed" or "failed"
+EXTRACTION_PENDING = "pending"
+EXTRACTION_PROCESSING = "processing"
+EXTRACTION_COMPLETED = "completed"
+EXTRACTION_FAILED = "failed"
+# Handed to an offline batch job (services/batch_extraction.py) - workers skip these
+EXTRACTION_BATCHED = "batched"
+
 class Invoice(Base):
     __tablename__ = "invoices"
 
     id = Column(Integer, primary_key=True, index=True)
     file_name = Column(String)
     file_path = Column(String)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the stored PDF
     upload_date = Column(DateTime, default=datetime.datetime.utcnow)
     
     # Extracted data
     vendor = Column(String, nullable=True)
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=True)  # Canonical vendor (services/vendor_directory.py)
     amount = Column(Float, nullable=True)
     invoice_date = Column(String, nullable=True)
     category = Column(String, nullable=True)
+
+    # Typed copies of amount and invoice_date, kept in sync by the validators
+    # below. Range filters and aggregations use these so they can hit indexes.
+    amount_cents = Column(BigInteger, nullable=True)   # Fixed-point amount in minor units
+    currency = Column(String(3), nullable=True)        # ISO 4217 code, e.g. USD
+    issued_on = Column(Date, nullable=True)            # Parsed invoice_date
+
+    # Extraction job queue - each invoice row doubles as its own job
+    extraction_status = Column(String, nullable=True, default=EXTRACTION_COMPLETED)
+    extraction_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    extraction_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # when a pending job may be picked up again
+    claimed_at = Column(DateTime, nullable=True)       # when a worker started processing it
+    extraction_method = Column(String, nullable=True)  # rules, cache, llm or duplicate - which path produced the fields
+    prompt_version = Column(String, nullable=True)     # model and prompt behind AI-extracted fields (EXTRACTION_VERSION)
+
+    # Set when this upload is a copy of an earlier invoice (services/duplicate_detection.py).
+    # Copies keep their own row but are left out of the dashboard totals.
+    duplicate_of_id = Column(Integer, ForeignKey("invoices.id"), nullable=True)
     
     # Foreign key to user
     owner_id = Column(Integer, ForeignKey("users.id"))
     
     # Relationship with user
-    owner = relationship("User", back_populates="invoices")
\ No newline at end of file
+    owner = relationship("User", back_populates="invoices")
+
+    __table_args__ = (
+        # Lets workers find the next runnable job without scanning the table
+        Index("ix_invoices_extraction_queue", "extraction_status", "next_attempt_at"),
+        # Keyset pagination of GET /invoices/ in (upload_date, id) order
+        Index("ix_invoices_owner_upload", "owner_id", "upload_date", "id"),
+        # Per-owner indexes for the list filters and the dashboard aggregations
+        # in routers/stats.py. Vendor and category also carry the pagination
+        # order so filtered pages stay cheap too.
+        Index("ix_invoices_owner_category_upload", "owner_id", "category", "upload_date", "id"),
+        Index("ix_invoices_owner_vendor_upload", "owner_id", "vendor", "upload_date", "id"),
+        # Spend per canonical vendor without touching the table
+        Index("ix_invoices_owner_vendor_id", "owner_id", "vendor_id", "duplicate_of_id", "amount_cents"),
+        # Date and amount ranges - the trailing columns make sums index-only
+        Index("ix_invoices_owner_issued", "owner_id", "issued_on", "amount_cents", "duplicate_of_id"),
+        Index("ix_invoices_owner_amount_cents", "owner_id", "amount_cents"),
+        # Finding the copies of an invoice when it's deleted
+        Index("ix_invoices_duplicate_of", "duplicate_of_id"),
+    )
+
+    @validates("amount")
+    def _sync_amount(self, key, value):
+        cents, currency = parse_amount(value)
+        self.amount_cents = cents
+        if currency:
+            self.currency = currency
+        elif cents is not None and not self.currency:
+            self.currency = DEFAULT_CURRENCY
+        return cents / 100 if cents is not None else None
+
+    @validates("invoice_date")
+    def _sync_invoice_date(self, key, value):
+        self.issued_on = parse_invoice_date(value)
+        return value
+
+    @validates("currency")
+    def _normalize_currency(self, key, value):
+        currency = normalize_currency(value)
+        if currency is None and self.amount_cents is not None:
+            currency = DEFAULT_CURRENCY
+        return currency
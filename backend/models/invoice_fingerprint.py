@@ -0,0 +1,24 @@
+# File: backend/models/invoice_fingerprint.py
+
+from sqlalchemy import Column, ForeignKey, Integer, BigInteger, Index
+
+from database import Base
+
+class InvoiceFingerprint(Base):
+    """
+    Locality-sensitive index of invoice text fingerprints (see utils/simhash.py).
+    Each invoice has one row per band of its SimHash, so finding near
+    duplicates is a primary key lookup for a handful of buckets instead of
+    a comparison with every stored invoice.
+    """
+    __tablename__ = "invoice_fingerprints"
+
+    owner_id = Column(Integer, primary_key=True)  # Duplicates are only looked for within one user's invoices
+    bucket = Column(Integer, primary_key=True)    # Band number and the band's bits
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), primary_key=True)
+    simhash = Column(BigInteger, nullable=False)  # The whole fingerprint, stored signed
+
+    __table_args__ = (
+        # Cleaning up when an invoice is deleted
+        Index("ix_invoice_fingerprints_invoice", "invoice_id"),
+    )
@@ -0,0 +1,41 @@
+# File: backend/models/reextraction.py
+
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, DateTime, Index
+import datetime
+
+from database import Base
+
+# Checkpoint states of one invoice in a run
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+class ReextractionRun(Base):
+    """
+    One re-extraction backfill (scripts/reextract.py). The invoices it
+    covers are snapshotted into ReextractionItem rows when it starts, so a
+    crashed run resumes with exactly the invoices it hadn't finished.
+    """
+    __tablename__ = "reextraction_runs"
+
+    id = Column(Integer, primary_key=True)
+    filters = Column(Text, nullable=False)                 # JSON of the command-line selection, for the status listing
+    extraction_version = Column(String, nullable=False)    # EXTRACTION_VERSION the run was started with
+    total = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ReextractionItem(Base):
+    """The checkpoint of one invoice in a run."""
+    __tablename__ = "reextraction_items"
+
+    run_id = Column(Integer, ForeignKey("reextraction_runs.id", ondelete="CASCADE"), primary_key=True)
+    # No foreign key: invoices deleted during a run are simply skipped
+    invoice_id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, default=ITEM_PENDING)
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Resuming reads a run's pending items in invoice order
+        Index("ix_reextraction_items_run_status", "run_id", "status", "invoice_id"),
+    )
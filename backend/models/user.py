@@ -12,6 +12,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # Goes up with every change to the user's invoices - the ETags are made from it (services/data_version.py)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationship with invoices - one user has many invoices
     invoices = relationship("Invoice", back_populates="owner")
\ No newline at end of file
@@ -0,0 +1,34 @@
+# File: backend/models/vendor.py
+
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, UniqueConstraint, Index
+import datetime
+
+from database import Base
+
+class Vendor(Base):
+    """
+    One real-world vendor of a user. Invoices point here through vendor_id,
+    however the AI happened to spell the name ("ACME Corp", "Acme
+    Corporation", ...). See services/vendor_directory.py.
+    """
+    __tablename__ = "vendors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String, nullable=False)  # Display name - the first spelling we saw
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class VendorAlias(Base):
+    """A normalized spelling of a vendor's name (see vendor_key)."""
+    __tablename__ = "vendor_aliases"
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    alias = Column(String, nullable=False)
+    vendor_id = Column(Integer, ForeignKey("vendors.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        # One spelling belongs to one vendor; also what loading a user's aliases reads
+        UniqueConstraint("owner_id", "alias", name="uq_vendor_aliases_owner_alias"),
+        Index("ix_vendor_aliases_vendor", "vendor_id"),
+    )
@@ -0,0 +1,32 @@
+# File: backend/models/vendor_template.py
+
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Index
+import datetime
+
+from database import Base
+
+class VendorTemplate(Base):
+    """
+    Layout of a recurring vendor's invoices, learned from AI extractions
+    that the invoice text backs up. services/rule_extractor.py uses it to
+    extract that vendor's invoices without calling OpenAI. Each user learns
+    their own templates.
+    """
+    __tablename__ = "vendor_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    vendor = Column(String)  # Name as the AI returned it, also how we spot the vendor in the text
+    amount_label = Column(String, nullable=True)       # Text on the line with the total, e.g. "Total Due"
+    date_label = Column(String, nullable=True)         # Text on the line with the invoice date
+    category = Column(String, nullable=True)
+    currency = Column(String(3), nullable=True)
+
+    # How many extractions agreed with these labels - only confirmed templates are used
+    confirmations = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        # One template per vendor and user (an index, so migrations can add it to old databases)
+        Index("ix_vendor_templates_owner_vendor", "owner_id", "vendor", unique=True),
+    )
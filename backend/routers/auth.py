@@ -1,7 +1,6 @@
 # File: backend/routers/auth.py
 
 import os
-from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException, status # type: ignore
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm # type: ignore
 from sqlalchemy.orm import Session
@@ -25,8 +24,7 @@ router = APIRouter(
 # Using bcrypt for hashing passwords
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# JWT setup
-load_dotenv()  # Load environment variables from .env file
+# JWT setup - SECRET_KEY can come from .env, which create_app() in main.py loads
 SECRET_KEY = os.getenv("SECRET_KEY", "temporary_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
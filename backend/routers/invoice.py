@@ -1,16 +1,39 @@
 # backend/routers/invoice.py
-from utils.pdf_processor import extract_text_from_pdf
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Form # type: ignore
+from utils.pdf_processor import PdfLimitError
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Form, Query, Request, Response # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
+from fastapi.security import OAuth2PasswordBearer # type: ignore
 import json # type: ignore
+from sqlalchemy import or_, tuple_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
-from datetime import datetime
+import time
+import asyncio
+from datetime import datetime, date
 from pydantic import BaseModel
-from services.openai_service import extract_invoice_data_with_cache
+from services.extraction_queue import (
+    enqueue_extraction, extract_invoice_fields, claim_invoice, release_invoice,
+    save_job_result, worker_pool,
+)
+from services.rule_extractor import template_store
+from services.document_text import load_document
+from services.duplicate_detection import forget_invoices
+from services.file_cleaner import file_cleaner
+from services.vendor_directory import assign_vendor, vendor_directory
+from services.search_index import InvalidSearchQuery, index_invoice, remove_invoice, search_available, search_invoices
+from services.data_version import bump_data_version, not_modified
+from services.event_hub import event_hub
+from services.invoice_export import EXPORT_FORMATS, ExportUnavailable, check_format, export_query, stream_export
 
-from database import get_db
-from models.invoice import Invoice
+from database import SessionLocal, get_db
+from models.invoice import Invoice, EXTRACTION_COMPLETED, EXTRACTION_FAILED, EXTRACTION_PROCESSING, EXTRACTION_BATCHED
+from utils.archive import ArchiveError, is_zip_upload, iter_zip_members, list_zip_members
+from utils.file_storage import store_stream, store_upload
+from utils.pagination import InvalidCursor, encode_cursor, decode_cursor
+from utils.normalize import parse_amount
+from utils.metrics import EXTRACTIONS_IN_PROGRESS
 from models.user import User
 from routers.auth import oauth2_scheme, get_user_by_email
 from jose import jwt # type: ignore
@@ -18,10 +41,11 @@ from jose import jwt # type: ignore
 # These models define what data we accept and return for invoices
 class InvoiceBase(BaseModel):
     # Base structure for invoice data - all fields optional so they can be updated individually
-    vendor: Optional[str] = None        # Company that issued the invoice
+    vendor: Optional[str] = None        # Company that issued the invoice, as written on it
     amount: Optional[float] = None      # How much money the invoice is for
     invoice_date: Optional[str] = None  # When the invoice was issued
     category: Optional[str] = None      # Type of expense (like "Utilities" or "Office Supplies")
+    currency: Optional[str] = None      # ISO currency code like "USD" (defaults to USD when there's an amount)
 
 class InvoiceCreate(InvoiceBase):
     # Used when creating new invoices - inherits everything from base
@@ -36,11 +60,132 @@ class InvoiceResponse(InvoiceBase):
     id: int                # Database ID for the invoice
     file_name: str         # Name of the uploaded file
     upload_date: datetime  # When the user uploaded it
+    extraction_status: Optional[str] = None  # pending, processing, completed or failed
+    duplicate_of_id: Optional[int] = None    # Set when this is a re-sent copy of another invoice
+    vendor_id: Optional[int] = None          # Canonical vendor - the same for every spelling of its name
     
     class Config:
         # Tells Pydantic to convert from database model to this model automatically
         from_attributes = True
 
+class InvoiceSearchResult(InvoiceResponse):
+    # One search hit - the invoice plus where the words matched
+    score: Optional[float] = None  # bm25 relevance, lower is better (None when sorted by date)
+    snippet: str = ""   # Matching bit of the PDF text with the hits in **bold**
+
+class InvoiceTextResponse(BaseModel):
+    # Text we extracted from an invoice's PDF - handy for debugging extractions
+    id: int
+    content_hash: str
+    page_count: int       # Pages in the PDF
+    pages_read: int       # Pages the text was taken from
+    has_text_layer: bool  # False for scanned PDFs
+    text: str
+
+class InvoiceStatusResponse(BaseModel):
+    # Progress of the background extraction job for one invoice
+    id: int
+    extraction_status: Optional[str] = None
+    extraction_attempts: int = 0
+    extraction_error: Optional[str] = None
+    next_attempt_at: Optional[datetime] = None  # When a failed attempt will be retried
+
+    class Config:
+        from_attributes = True
+
+class BulkUploadItem(BaseModel):
+    # Outcome for one file in a bulk upload
+    file_name: str
+    status: str                       # queued, completed, failed or rejected
+    invoice_id: Optional[int] = None
+    detail: Optional[str] = None      # Why the file was rejected or failed
+
+class BulkUploadResponse(BaseModel):
+    # Manifest for a whole bulk upload
+    total_files: int
+    accepted: int
+    rejected: int
+    elapsed_seconds: float
+    invoices_per_second: float        # Accepted invoices divided by elapsed time
+    results: List[BulkUploadItem]
+
+class BulkUpdateItem(InvoiceUpdate):
+    # One invoice's changes in PATCH /invoices/bulk
+    id: int
+
+class BulkUpdateRequest(BaseModel):
+    updates: List[BulkUpdateItem]
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class BulkChangeItem(BaseModel):
+    # Outcome for one id in a bulk update or delete
+    id: int
+    status: str                                # updated, deleted or not_found
+    invoice: Optional[InvoiceResponse] = None  # The invoice after the update
+
+class BulkChangeResponse(BaseModel):
+    succeeded: int
+    not_found: int
+    results: List[BulkChangeItem]
+
+class InvoiceFilters(BaseModel):
+    # Optional server-side filters shared by the list endpoints
+    vendor: Optional[str] = None
+    vendor_id: Optional[int] = None    # Canonical vendor, whatever the spelling
+    category: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    date_from: Optional[date] = None   # Invoice date, inclusive
+    date_to: Optional[date] = None     # Invoice date, inclusive
+
+def invoice_filters(
+    vendor: Optional[str] = None,
+    vendor_id: Optional[int] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> InvoiceFilters:
+    # Dependency that reads the filters from the query string
+    return InvoiceFilters(
+        vendor=vendor,
+        vendor_id=vendor_id,
+        category=category,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+def apply_invoice_filters(query, filters: InvoiceFilters):
+    # Each filter lines up with an (owner_id, column) index on Invoice.
+    # Amounts and dates are compared on the typed columns, not the raw values.
+    if filters.vendor is not None:
+        query = query.filter(Invoice.vendor == filters.vendor)
+    if filters.vendor_id is not None:
+        query = query.filter(Invoice.vendor_id == filters.vendor_id)
+    if filters.category is not None:
+        query = query.filter(Invoice.category == filters.category)
+    if filters.min_amount is not None:
+        query = query.filter(Invoice.amount_cents >= parse_amount(filters.min_amount)[0])
+    if filters.max_amount is not None:
+        query = query.filter(Invoice.amount_cents <= parse_amount(filters.max_amount)[0])
+    if filters.date_from is not None:
+        query = query.filter(Invoice.issued_on >= filters.date_from)
+    if filters.date_to is not None:
+        query = query.filter(Invoice.issued_on <= filters.date_to)
+    return query
+
+# Upper limits for one bulk request
+MAX_BULK_FILES = 1000
+MAX_BULK_CHANGES = 1000
+BULK_POLL_INTERVAL_SECONDS = 0.5
+# A comment line on idle event streams, so proxies don't close them and dead clients are noticed
+EVENTS_HEARTBEAT_SECONDS = 15
+
 # Set up the router with prefix and security
 router = APIRouter(
     prefix="/invoices",                        # All routes start with /invoices
@@ -48,8 +193,14 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
+# Like oauth2_scheme, but leaves a missing header to the route (see /events)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
 # Helper to get the current logged-in user from their token
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return user_from_token(token, db)
+
+def user_from_token(token, db):
     # Gets the user info from the login token
     from routers.auth import SECRET_KEY, ALGORITHM
     credentials_exception = HTTPException(
@@ -57,6 +208,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         # Decode the JWT token to get the user's email
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -72,8 +225,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
-# Get all invoices for the current user - GET /invoices/
-@router.post("/", response_model=InvoiceResponse)  # Changed from schemas.Invoice
+# Upload a new invoice - POST /invoices/
+# Returns 202 right away; the extraction worker pool fills in the fields later
+@router.post("/", response_model=InvoiceResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_invoice(
     file: UploadFile = File(...),
     invoice_data: str = Form("{}"),
@@ -83,6 +237,13 @@ async def create_invoice(
     # Parse the invoice_data JSON string
     try:
         invoice_metadata = json.loads(invoice_data)
+        if not isinstance(invoice_metadata, dict):
+            raise HTTPException(status_code=422, detail="invoice_data must be a JSON object")
+        # Only accept the editable fields - job columns like extraction_status are ours
+        invoice_metadata = {
+            key: value for key, value in invoice_metadata.items()
+            if key in ["amount", "vendor", "invoice_date", "category", "currency"]
+        }
         # Clean out empty strings (convert to None for nullable DB fields)
         for key in ["amount", "vendor", "invoice_date", "category"]:
             if key in invoice_metadata and invoice_metadata[key] == "":
@@ -91,48 +252,165 @@ async def create_invoice(
     except json.JSONDecodeError:
         invoice_metadata = {}
     
-    # Create the uploads directory if it doesn't exist
-    user_upload_dir = f"uploads/{current_user.id}"
-    os.makedirs(user_upload_dir, exist_ok=True)
-    
-    # Save the file
-    file_path = f"{user_upload_dir}/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Stream the file to content-addressed storage (identical PDFs are stored once)
+    stored = await store_upload(file)
     
     # Create invoice in DB - Changed user_id to owner_id to match your model
     db_invoice = Invoice(  # Direct import, not models.Invoice
         file_name=file.filename,
-        file_path=file_path,
+        file_path=stored.path,
+        content_hash=stored.sha256,
         owner_id=current_user.id,  # Changed from user_id to owner_id
         **invoice_metadata
     )
+    # Vendors are saved in their own transaction, so this goes before our first write
+    assign_vendor(db_invoice)
+    # Queue the invoice for extraction in the same commit that creates it
+    enqueue_extraction(db_invoice)
     db.add(db_invoice)
+    db.flush()
+    index_invoice(db, db_invoice)
+    bump_data_version(db, current_user.id)
     db.commit()
     db.refresh(db_invoice)
+    event_hub.publish(current_user.id, "uploaded", {"invoice_id": db_invoice.id, "file_name": db_invoice.file_name})
+
+    # Wake up an idle worker so extraction starts immediately
+    worker_pool.notify()
     
-    # Extract data automatically
+    return db_invoice
+
+def _plan_bulk_files(files):
+    # Works out which PDFs a bulk upload holds without storing anything, so
+    # an oversized batch is turned down before it leaves files on disk.
+    # Returns (accepted, rejected, pdf_count); accepted is a list of
+    # (file_name, upload, is_zip), rejected a list of BulkUploadItem
+    accepted, rejected, pdf_count = [], [], 0
+    for upload in files:
+        file_name = os.path.basename(upload.filename or "")
+        if is_zip_upload(file_name, upload.content_type):
+            try:
+                member_names = list_zip_members(upload.file)
+            except ArchiveError as e:
+                rejected.append(BulkUploadItem(file_name=file_name, status="rejected", detail=str(e)))
+                continue
+            for member_name in member_names:
+                if member_name.lower().endswith(".pdf"):
+                    pdf_count += 1
+                else:
+                    rejected.append(BulkUploadItem(file_name=member_name, status="rejected", detail="Only PDF files are accepted"))
+            accepted.append((file_name, upload, True))
+        elif file_name.lower().endswith(".pdf"):
+            pdf_count += 1
+            accepted.append((file_name, upload, False))
+        else:
+            rejected.append(BulkUploadItem(file_name=file_name, status="rejected", detail="Only PDF and ZIP files are accepted"))
+    return accepted, rejected, pdf_count
+
+def _stage_bulk_files(accepted, staged):
+    # Saves every accepted PDF (including ones inside ZIPs), appending
+    # (file_name, StoredFile) to staged as it goes so the caller can release
+    # what was stored if something fails halfway
+    for file_name, upload, is_zip in accepted:
+        if not is_zip:
+            staged.append((file_name, store_stream(upload.file)))
+            continue
+        upload.file.seek(0)
+        for member_name, open_member in iter_zip_members(upload.file):
+            if member_name.lower().endswith(".pdf"):
+                with open_member() as stream:
+                    staged.append((member_name, store_stream(stream)))
+
+def _release_staged(staged):
+    # Stored files no committed invoice points at; the cleaner removes them
+    # (after RECENT_UPLOAD_SECONDS, unless another upload claims the content)
+    file_cleaner.schedule((stored.sha256, stored.path) for _, stored in staged)
+
+# Upload many invoices at once - POST /invoices/bulk
+# Accepts several PDFs and/or ZIP archives of PDFs. All rows are created in a
+# single transaction and extraction is spread across the worker pool.
+@router.post("/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_invoices_bulk(
+    files: List[UploadFile] = File(...),
+    wait: bool = False,           # Wait for extraction to finish before responding
+    wait_timeout: float = 300,    # Give up waiting after this many seconds
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    started = time.perf_counter()
+
+    if len(files) > MAX_BULK_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_FILES} files per request.")
+
+    # Reading ZIP directories and saving files is blocking disk I/O, so keep it off the event loop
+    accepted, rejected, pdf_count = await run_in_threadpool(_plan_bulk_files, files)
+    if pdf_count > MAX_BULK_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_FILES} invoices per request.")
+
+    staged = []
     try:
-        # Extract text from PDF
-        invoice_text = extract_text_from_pdf(file_path)
-        
-        # Use OpenAI to extract structured data
-        extracted_data, token_count = extract_invoice_data_with_cache(invoice_text, db_invoice.id)
-        
-        # Update the invoice with extracted data
-        for key, value in extracted_data.items():
-            setattr(db_invoice, key, value)
-        
-        db.commit()
-        db.refresh(db_invoice)
-    except Exception as e:
-        # Log the error but don't fail the upload
-        print(f"Error during auto-extraction: {e}")
-        # Optionally set a flag that extraction needs to be retried
-        db_invoice.needs_extraction = True  # Note: You need to add this column to your model
+        await run_in_threadpool(_stage_bulk_files, accepted, staged)
+
+        # One transaction for the whole batch
+        invoices = []
+        for file_name, stored in staged:
+            db_invoice = Invoice(
+                file_name=file_name,
+                file_path=stored.path,
+                content_hash=stored.sha256,
+                owner_id=current_user.id,
+            )
+            enqueue_extraction(db_invoice)
+            invoices.append(db_invoice)
+        db.add_all(invoices)
+        db.flush()
+        for db_invoice in invoices:
+            index_invoice(db, db_invoice)
+        if invoices:
+            bump_data_version(db, current_user.id)
+        uploaded = [{"invoice_id": invoice.id, "file_name": invoice.file_name} for invoice in invoices]
         db.commit()
-    
-    return db_invoice
+    except BaseException:
+        db.rollback()
+        _release_staged(staged)
+        raise
+    for event in uploaded:
+        event_hub.publish(current_user.id, "uploaded", event)
+    worker_pool.notify()
+
+    invoice_ids = [event["invoice_id"] for event in uploaded]
+    statuses = {invoice_id: ("queued", None) for invoice_id in invoice_ids}
+
+    # Optionally block until the worker pool has finished the whole batch
+    if wait and invoice_ids:
+        deadline = time.perf_counter() + wait_timeout
+        while True:
+            rows = (
+                db.query(Invoice.id, Invoice.extraction_status, Invoice.extraction_error)
+                .filter(Invoice.id.in_(invoice_ids))
+                .all()
+            )
+            for invoice_id, extraction_status, extraction_error in rows:
+                if extraction_status in (EXTRACTION_COMPLETED, EXTRACTION_FAILED):
+                    statuses[invoice_id] = (extraction_status, extraction_error)
+            if all(state != "queued" for state, _ in statuses.values()) or time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(BULK_POLL_INTERVAL_SECONDS)
+
+    results = [
+        BulkUploadItem(file_name=file_name, status=statuses[invoice_id][0], invoice_id=invoice_id, detail=statuses[invoice_id][1])
+        for (file_name, _), invoice_id in zip(staged, invoice_ids)
+    ] + rejected
+
+    elapsed = time.perf_counter() - started
+    return BulkUploadResponse(
+        total_files=len(results),
+        accepted=len(invoice_ids),
+        rejected=len(rejected),
+        elapsed_seconds=round(elapsed, 3),
+        invoices_per_second=round(len(invoice_ids) / elapsed, 2) if elapsed > 0 else 0.0,
+        results=results,
+    )
 
 @router.post("/manual", response_model=InvoiceResponse)
 async def create_manual_invoice(
@@ -148,32 +426,202 @@ async def create_manual_invoice(
         file_name="(manual entry)",
         file_path=None,
         owner_id=current_user.id,
+        extraction_status=EXTRACTION_COMPLETED,  # Nothing to extract for manual entries
         **invoice_data.dict()
     )
+    assign_vendor(db_invoice)
     db.add(db_invoice)
+    db.flush()
+    index_invoice(db, db_invoice)
+    bump_data_version(db, current_user.id)
     db.commit()
     db.refresh(db_invoice)
     return db_invoice
 
 # Get all invoices for the current user - GET /invoices/
+# Pages are ordered by (upload_date, id). When there are more rows, the
+# X-Next-Cursor response header holds the cursor for the next page.
 @router.get("/", response_model=List[InvoiceResponse])
 async def read_invoices(
-    skip: int = 0, 
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    filters: InvoiceFilters = Depends(invoice_filters),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Find all invoices for this user, with pagination options
-    invoices = db.query(Invoice).filter(Invoice.owner_id == current_user.id).offset(skip).limit(limit).all()
+    # Nothing changed since the client's copy - skip the query
+    cached = not_modified(request, response, current_user)
+    if cached is not None:
+        return cached
+
+    query = apply_invoice_filters(db.query(Invoice).filter(Invoice.owner_id == current_user.id), filters)
+
+    # Continue after the last row of the previous page
+    if cursor:
+        try:
+            last_upload_date, last_id = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(Invoice.upload_date, Invoice.id) > tuple_(last_upload_date, last_id))
+
+    # Fetch one extra row to find out whether another page exists
+    invoices = query.order_by(Invoice.upload_date, Invoice.id).limit(limit + 1).all()
+    if len(invoices) > limit:
+        invoices = invoices[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(invoices[-1].upload_date, invoices[-1].id)
     return invoices
 
+# Full-text search - GET /invoices/search?q=...
+# Matches vendor, category, file name and the PDF text, best match first
+# (newest first when the words are too common for relevance to mean much).
+# Declared before /{invoice_id} so "search" isn't taken for an invoice ID.
+@router.get("/search", response_model=List[InvoiceSearchResult])
+async def search_invoices_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not search_available():
+        # No FTS5 (e.g. not on SQLite) - plain substring match on the short fields
+        pattern = f"%{q.strip()}%"
+        invoices = (
+            db.query(Invoice)
+            .filter(Invoice.owner_id == current_user.id)
+            .filter(or_(Invoice.vendor.ilike(pattern), Invoice.category.ilike(pattern), Invoice.file_name.ilike(pattern)))
+            .order_by(Invoice.upload_date.desc(), Invoice.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return invoices
+
+    try:
+        hits = search_invoices(db, current_user.id, q, limit, offset)
+    except InvalidSearchQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not hits:
+        return []
+
+    # The owner check again here, in case the index ever lags behind a change of owner
+    invoices = {
+        invoice.id: invoice
+        for invoice in db.query(Invoice).filter(Invoice.id.in_([invoice_id for invoice_id, _, _ in hits]), Invoice.owner_id == current_user.id)
+    }
+    return [
+        InvoiceSearchResult.model_validate(invoices[invoice_id]).model_copy(update={"score": score, "snippet": snippet or ""})
+        for invoice_id, score, snippet in hits
+        if invoice_id in invoices
+    ]
+
+async def _event_stream(request, owner_id, last_event_id):
+    subscriber = event_hub.subscribe(owner_id)
+    try:
+        # How long EventSource waits before reconnecting
+        yield "retry: 3000\n\n"
+
+        # Replay what a reconnecting client missed, or tell it to reload
+        last_seq = 0
+        if last_event_id:
+            missed, complete = event_hub.replay(owner_id, last_event_id)
+            if not complete:
+                resync = event_hub.resync_event()
+                last_seq = resync.seq
+                missed = [event for event in missed if event.seq > last_seq]
+                yield resync.encode()
+            for event in missed:
+                last_seq = event.seq
+                yield event.encode()
+
+        while not subscriber.closed:
+            if subscriber.overflowed:
+                # Fell too far behind - drop the backlog and have the client reload
+                subscriber.overflowed = False
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                resync = event_hub.resync_event()
+                last_seq = resync.seq
+                yield resync.encode()
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            if event is None:
+                break  # Shutting down
+            if event.seq > last_seq:  # Skip what the replay already sent
+                yield event.encode()
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+# Live extraction progress - GET /invoices/events (text/event-stream)
+# Sends uploaded, extraction_started, extraction_finished and
+# extraction_failed events for the current user's invoices. EventSource
+# can't set headers, so the token may also come as ?token=. Declared
+# before /{invoice_id}.
+@router.get("/events")
+async def invoice_events(
+    request: Request,
+    token: Optional[str] = None,
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+):
+    # Its own short session: a get_db session would stay checked out for as long as the stream is open
+    db = SessionLocal()
+    try:
+        user = user_from_token(header_token or token, db)
+    finally:
+        db.close()
+
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    return StreamingResponse(
+        _event_stream(request, user.id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # No buffering in nginx
+    )
+
+# Every matching invoice as one file - GET /invoices/export?format=csv|ndjson|parquet
+# Takes the same filters as GET /invoices/ and streams the rows in list order
+# as they're read, for pulling everything into a spreadsheet or warehouse.
+# Declared before /{invoice_id}.
+@router.get("/export")
+async def export_invoices(
+    export_format: str = Query("csv", alias="format"),
+    filters: InvoiceFilters = Depends(invoice_filters),
+    current_user: User = Depends(get_current_user),
+):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        check_format(export_format)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    statement = apply_invoice_filters(export_query(current_user.id), filters)
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        stream_export(statement, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="invoices.{extension}"'},
+    )
+
 # Get a specific invoice - GET /invoices/{invoice_id}
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
 async def read_invoice(
     invoice_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    cached = not_modified(request, response, current_user)
+    if cached is not None:
+        return cached
+
     # Find the invoice by ID, but only if it belongs to this user (security!)
     invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.owner_id == current_user.id).first()
     
@@ -183,6 +631,138 @@ async def read_invoice(
     
     return invoice
 
+# Check extraction progress - GET /invoices/{invoice_id}/status
+@router.get("/{invoice_id}/status", response_model=InvoiceStatusResponse)
+async def read_invoice_status(
+    invoice_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.owner_id == current_user.id).first()
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice
+
+# Stored PDF text - GET /invoices/{invoice_id}/text
+@router.get("/{invoice_id}/text", response_model=InvoiceTextResponse)
+async def read_invoice_text(
+    invoice_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.owner_id == current_user.id).first()
+    if invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    if not invoice.file_path:
+        raise HTTPException(status_code=404, detail="This invoice has no PDF")
+
+    try:
+        document, content_hash = await load_document(invoice.file_path, invoice.content_hash)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="PDF file not found")
+    except PdfLimitError as e:
+        raise HTTPException(status_code=422, detail=f"Could not read the PDF: {str(e)}")
+
+    return InvoiceTextResponse(id=invoice.id, content_hash=content_hash, **document._asdict())
+
+def _resolve_vendors(owner_id, changes):
+    # Vendors are saved in their own transaction, so this goes before the session's first write
+    for updates in changes:
+        if "vendor" in updates:
+            updates["vendor_id"] = vendor_directory.resolve(owner_id, updates["vendor"])
+
+def _apply_updates(db, invoice, updates):
+    # A user fixing fields the vendor rules extracted means the template is wrong.
+    # Returns True when a template was reset, so the caller can drop the
+    # owner's cached templates once that's committed
+    forgot = False
+    if invoice.extraction_method == "rules" and invoice.vendor:
+        corrected = [key for key in ("vendor", "amount", "invoice_date") if key in updates and updates[key] != getattr(invoice, key)]
+        if corrected:
+            template_store.forget(db, invoice.owner_id, invoice.vendor)
+            forgot = True
+
+    # Update only the fields that were provided
+    for key, value in updates.items():
+        setattr(invoice, key, value)
+    index_invoice(db, invoice)
+    return forgot
+
+def _delete_invoices(db, invoices):
+    # Deletes the rows and returns their (content_hash, file_path) for the file cleaner. The caller commits.
+    if not invoices:
+        return []
+    forget_invoices(db, invoices)  # A copy of a deleted invoice becomes the original
+    db.flush()
+    for invoice in invoices:
+        remove_invoice(db, invoice.id)
+    db.query(Invoice).filter(Invoice.id.in_([invoice.id for invoice in invoices])).delete(synchronize_session=False)
+    return [(invoice.content_hash, invoice.file_path) for invoice in invoices]
+
+# Update many invoices at once - PATCH /invoices/bulk
+# Every change is applied in one transaction; ids that don't exist or belong
+# to someone else come back as not_found. Declared before /{invoice_id}.
+@router.patch("/bulk", response_model=BulkChangeResponse)
+async def update_invoices_bulk(
+    request: BulkUpdateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if len(request.updates) > MAX_BULK_CHANGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_CHANGES} changes per request.")
+
+    changes = [(item.id, item.dict(exclude_unset=True, exclude={"id"})) for item in request.updates]
+    # One query checks the ownership of every id
+    invoices = {
+        invoice.id: invoice
+        for invoice in db.query(Invoice).filter(Invoice.id.in_({invoice_id for invoice_id, _ in changes}), Invoice.owner_id == current_user.id)
+    }
+    _resolve_vendors(current_user.id, [updates for invoice_id, updates in changes if invoice_id in invoices])
+    forgot = False
+    for invoice_id, updates in changes:
+        if invoice_id in invoices:
+            forgot = _apply_updates(db, invoices[invoice_id], updates) or forgot
+    if invoices:
+        bump_data_version(db, current_user.id)
+    db.commit()
+    if forgot:
+        template_store.invalidate(current_user.id)
+
+    # Reload the updated rows in one query rather than one refresh each
+    if invoices:
+        db.query(Invoice).filter(Invoice.id.in_(list(invoices))).all()
+    results = [
+        BulkChangeItem(id=invoice_id, status="updated", invoice=invoices[invoice_id])
+        if invoice_id in invoices else BulkChangeItem(id=invoice_id, status="not_found")
+        for invoice_id in dict.fromkeys(invoice_id for invoice_id, _ in changes)
+    ]
+    return BulkChangeResponse(succeeded=len(invoices), not_found=len(results) - len(invoices), results=results)
+
+# Delete many invoices at once - DELETE /invoices/bulk with {"ids": [...]}
+# One transaction; the PDFs are removed afterwards by the background file cleaner.
+@router.delete("/bulk", response_model=BulkChangeResponse)
+async def delete_invoices_bulk(
+    request: BulkDeleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if len(request.ids) > MAX_BULK_CHANGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_CHANGES} ids per request.")
+
+    invoices = db.query(Invoice).filter(Invoice.id.in_(set(request.ids)), Invoice.owner_id == current_user.id).all()
+    deleted = {invoice.id for invoice in invoices}
+    files = _delete_invoices(db, invoices)
+    if invoices:
+        bump_data_version(db, current_user.id)
+    db.commit()
+    file_cleaner.schedule(files)
+
+    results = [
+        BulkChangeItem(id=invoice_id, status="deleted" if invoice_id in deleted else "not_found")
+        for invoice_id in dict.fromkeys(request.ids)
+    ]
+    return BulkChangeResponse(succeeded=len(deleted), not_found=len(results) - len(deleted), results=results)
+
 # Update an invoice - PUT /invoices/{invoice_id}
 @router.put("/{invoice_id}", response_model=InvoiceResponse)
 async def update_invoice(
@@ -197,12 +777,15 @@ async def update_invoice(
     if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Update only the fields that were provided
-    for key, value in invoice_data.dict(exclude_unset=True).items():
-        setattr(invoice, key, value)
+    updates = invoice_data.dict(exclude_unset=True)
+    _resolve_vendors(current_user.id, [updates])
+    forgot = _apply_updates(db, invoice, updates)
+    bump_data_version(db, current_user.id)
     
     # Save changes
     db.commit()
+    if forgot:
+        template_store.invalidate(current_user.id)
     db.refresh(invoice)
     
     return invoice
@@ -220,13 +803,12 @@ async def delete_invoice(
     if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Delete the actual file from storage
-    if invoice.file_path and os.path.exists(invoice.file_path):
-        os.remove(invoice.file_path)
-    
-    # Delete the database record
-    db.delete(invoice)
+    # Delete the database record; the stored file goes in the background,
+    # unless another invoice shares the same content
+    files = _delete_invoices(db, [invoice])
+    bump_data_version(db, current_user.id)
     db.commit()
+    file_cleaner.schedule(files)
     
     # Return nothing (204 status code)
     return None
@@ -242,35 +824,50 @@ async def extract_invoice_data_endpoint(
     if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
+    # Claimed like a queue job, so a worker, batch job or re-extraction run
+    # can't write over this one (or the other way round)
+    previous_status = invoice.extraction_status
+    claimed_at = None
+    if previous_status not in (EXTRACTION_PROCESSING, EXTRACTION_BATCHED):
+        claimed_at = claim_invoice(db, invoice_id, previous_status)
+    if claimed_at is None:
+        raise HTTPException(status_code=409, detail="This invoice is being extracted right now")
+
+    invoice_text = ""
+    saved = False
     try:
-        # 1. Extract text from the PDF
-        invoice_text = extract_text_from_pdf(invoice.file_path)
+        # 1. Get the PDF's text - stored after the first parse, so this rarely opens the PDF
+        document, _ = await load_document(invoice.file_path, invoice.content_hash)
+        invoice_text = document.text
         print(f"\n📄 Extracted text from invoice {invoice_id}:\n{invoice_text[:500]}")
 
 
-        # 2. Extract data using OpenAI (with caching)
-        extracted_data, token_count = extract_invoice_data_with_cache(invoice_text, invoice_id)
+        # 2. Extract data with the vendor rules, falling back to OpenAI (with caching and shared rate limits)
+        with EXTRACTIONS_IN_PROGRESS.track():
+            extracted_data, method = await extract_invoice_fields(invoice_text, invoice_id, current_user.id)
 
-        # 3. Safely update fields only if they exist in response
-        invoice.vendor = extracted_data.get("vendor") or invoice.vendor
-
-        try:
-            amount_val = extracted_data.get("amount")
-            if isinstance(amount_val, (int, float, str)):
-                invoice.amount = float(amount_val)
-        except Exception as e:
-            print(f"⚠️ Failed to convert amount: {amount_val} — {e}")
+        # 3. Save the fields the way the workers do. Asked for a fresh
+        # extraction, so it's no longer treated as a copy.
+        saved = await run_in_threadpool(
+            save_job_result, invoice_id, extracted_data, method=method,
+            claimed_status=EXTRACTION_PROCESSING, claimed_at=claimed_at,
+        )
+        if not saved:
+            raise HTTPException(status_code=409, detail="The invoice was claimed by another extraction meanwhile")
 
-        invoice.invoice_date = extracted_data.get("invoice_date") or invoice.invoice_date
-        invoice.category = extracted_data.get("category") or invoice.category
-
-        # 4. Commit changes
-        db.commit()
         db.refresh(invoice)
-
         return invoice
 
+    except HTTPException:
+        raise
+    except PdfLimitError as e:
+        raise HTTPException(status_code=422, detail=f"Could not read the PDF: {str(e)}")
     except Exception as e:
         print(f"❌ Extraction failed for invoice {invoice_id}: {e}")
         print(f"🔍 Invoice text preview:\n{invoice_text[:500]}")
-        raise HTTPException(status_code=500, detail=f"Error processing invoice: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing invoice: {str(e)}")
+    finally:
+        if not saved:
+            # Give the invoice back in the state we found it
+            db.rollback()
+            release_invoice(db, invoice_id, previous_status, claimed_at)
\ No newline at end of file
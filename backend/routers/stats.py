@@ -0,0 +1,161 @@
+# backend/routers/stats.py
+from fastapi import APIRouter, Depends, Request, Response # type: ignore
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from pydantic import BaseModel
+
+from database import get_db
+from models.invoice import Invoice
+from models.vendor import Vendor
+from models.user import User
+from routers.invoice import get_current_user
+from services.data_version import not_modified
+
+# Aggregated spend for the dashboard charts. The grouping happens in SQL so
+# the response is a handful of rows no matter how many invoices a user has.
+router = APIRouter(
+    prefix="/invoices/stats",
+    tags=["stats"],
+)
+
+class CategoryStat(BaseModel):
+    category: str
+    invoice_count: int
+    total_amount: float
+
+class MonthStat(BaseModel):
+    month: str             # YYYY-MM
+    invoice_count: int
+    total_amount: float
+
+class VendorStat(BaseModel):
+    vendor: str
+    vendor_id: Optional[int] = None  # Canonical vendor, None for invoices without a vendor
+    invoice_count: int
+    total_amount: float
+
+# Totals are summed in integer cents and only converted at the end
+TOTAL_CENTS = func.sum(Invoice.amount_cents)
+
+def _owner_invoices(db, owner_id, date_from, date_to, *columns):
+    # Base query for one user's invoices, optionally limited to a date range.
+    # Re-sent copies of an invoice would count its amount twice, so they're skipped.
+    query = db.query(*columns).filter(Invoice.owner_id == owner_id, Invoice.duplicate_of_id.is_(None))
+    if date_from is not None:
+        query = query.filter(Invoice.issued_on >= date_from)
+    if date_to is not None:
+        query = query.filter(Invoice.issued_on <= date_to)
+    return query
+
+def _month_of(db, column):
+    # YYYY-MM for a date column - the function name differs per database
+    if db.bind.dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def _dollars(cents):
+    return round((cents or 0) / 100, 2)
+
+def _merge(rows, normalize):
+    # Combines groups whose labels only differ in case or spacing,
+    # e.g. "utilities" and "Utilities " - there are only a few rows here
+    merged = {}
+    for label, count, total_cents in rows:
+        key = normalize(label)
+        previous_count, previous_cents = merged.get(key, (0, 0))
+        merged[key] = (previous_count + count, previous_cents + (total_cents or 0))
+    return merged
+
+# Spend and invoice count per category - GET /invoices/stats/by-category
+@router.get("/by-category", response_model=List[CategoryStat])
+async def stats_by_category(
+    request: Request,
+    response: Response,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, current_user)
+    if cached is not None:
+        return cached
+
+    rows = (
+        _owner_invoices(db, current_user.id, date_from, date_to,
+                        Invoice.category, func.count(Invoice.id), TOTAL_CENTS)
+        .group_by(Invoice.category)
+        .all()
+    )
+
+    def normalize(category):
+        # Capitalize first letter, lowercase the rest (same as the dashboard does)
+        category = (category or "").strip() or "Uncategorized"
+        return category[0].upper() + category[1:].lower()
+
+    merged = _merge(rows, normalize)
+    return [
+        CategoryStat(category=category, invoice_count=count, total_amount=_dollars(total))
+        for category, (count, total) in sorted(merged.items(), key=lambda item: -item[1][1])
+    ]
+
+# Spend per calendar month - GET /invoices/stats/by-month
+@router.get("/by-month", response_model=List[MonthStat])
+async def stats_by_month(
+    request: Request,
+    response: Response,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, current_user)
+    if cached is not None:
+        return cached
+
+    # Reads only (owner_id, issued_on, amount_cents, duplicate_of_id), all covered by one index
+    month = _month_of(db, Invoice.issued_on)
+    rows = (
+        _owner_invoices(db, current_user.id, date_from, date_to,
+                        month, func.count(Invoice.id), TOTAL_CENTS)
+        .filter(Invoice.issued_on.isnot(None), Invoice.amount_cents.isnot(None))
+        .group_by(month)
+        .order_by(month)
+        .all()
+    )
+    return [
+        MonthStat(month=label, invoice_count=count, total_amount=_dollars(total))
+        for label, count, total in rows
+    ]
+
+# Spend per vendor - GET /invoices/stats/by-vendor
+@router.get("/by-vendor", response_model=List[VendorStat])
+async def stats_by_vendor(
+    request: Request,
+    response: Response,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = 50,  # Only the biggest vendors are worth a bar in the chart
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, current_user)
+    if cached is not None:
+        return cached
+
+    # Grouped by canonical vendor, so "ACME Corp" and "Acme Corporation" are one bar
+    rows = (
+        _owner_invoices(db, current_user.id, date_from, date_to,
+                        Invoice.vendor_id, func.count(Invoice.id), TOTAL_CENTS)
+        .group_by(Invoice.vendor_id)
+        .all()
+    )
+    ranked = sorted(rows, key=lambda row: -(row[2] or 0))[:limit]
+
+    vendor_ids = [vendor_id for vendor_id, _, _ in ranked if vendor_id is not None]
+    names = dict(db.query(Vendor.id, Vendor.name).filter(Vendor.id.in_(vendor_ids)).all()) if vendor_ids else {}
+    return [
+        VendorStat(vendor=names.get(vendor_id, "Unknown"), vendor_id=vendor_id, invoice_count=count, total_amount=_dollars(total))
+        for vendor_id, count, total in ranked
+    ]
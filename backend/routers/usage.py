@@ -0,0 +1,101 @@
+# backend/routers/usage.py
+import os
+from fastapi import APIRouter, Depends, HTTPException # type: ignore
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from pydantic import BaseModel
+
+from database import get_db
+from models.api_usage import ApiUsage
+from models.user import User
+from routers.invoice import get_current_user
+
+# OpenAI spend from the usage ledger (services/usage_ledger.py), rolled up
+# per day in SQL. Both queries are answered from a covering index on
+# api_usage, so they stay fast as the ledger grows. Entries still in the
+# ledger's buffer show up within a few seconds.
+router = APIRouter(
+    prefix="/usage",
+    tags=["usage"],
+)
+
+# Comma-separated emails allowed to see every user's spend
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+class DailyUsage(BaseModel):
+    day: date
+    requests: int          # Real API calls, batch answers included
+    cache_hits: int
+    failures: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+
+class UserDailyUsage(DailyUsage):
+    owner_id: Optional[int] = None  # None for invoices deleted before their usage was written
+
+def _rollup_columns():
+    return (
+        func.sum(case((ApiUsage.cache_status != "hit", 1), else_=0)),
+        func.sum(case((ApiUsage.cache_status == "hit", 1), else_=0)),
+        func.sum(case((ApiUsage.success.is_(False), 1), else_=0)),
+        func.sum(ApiUsage.prompt_tokens),
+        func.sum(ApiUsage.completion_tokens),
+        func.sum(ApiUsage.cost_micro_usd),
+    )
+
+def _in_range(query, date_from, date_to):
+    if date_from is not None:
+        query = query.filter(ApiUsage.day >= date_from)
+    if date_to is not None:
+        query = query.filter(ApiUsage.day <= date_to)
+    return query
+
+def _daily(day, requests, cache_hits, failures, prompt_tokens, completion_tokens, cost):
+    return dict(
+        day=day,
+        requests=requests or 0,
+        cache_hits=cache_hits or 0,
+        failures=failures or 0,
+        prompt_tokens=prompt_tokens or 0,
+        completion_tokens=completion_tokens or 0,
+        cost_usd=round((cost or 0) / 1_000_000, 6),
+    )
+
+# The current user's spend per day - GET /usage
+@router.get("", response_model=List[DailyUsage])
+async def my_usage(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    rows = (
+        _in_range(db.query(ApiUsage.day, *_rollup_columns()), date_from, date_to)
+        .filter(ApiUsage.owner_id == current_user.id)
+        .group_by(ApiUsage.day)
+        .order_by(ApiUsage.day)
+        .all()
+    )
+    return [DailyUsage(**_daily(*row)) for row in rows]
+
+# Every user's spend per day, for admins - GET /usage/users
+@router.get("/users", response_model=List[UserDailyUsage])
+async def usage_by_user(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if (current_user.email or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Only admins can see other users' usage")
+
+    rows = (
+        _in_range(db.query(ApiUsage.day, ApiUsage.owner_id, *_rollup_columns()), date_from, date_to)
+        .group_by(ApiUsage.day, ApiUsage.owner_id)
+        .order_by(ApiUsage.day, ApiUsage.owner_id)
+        .all()
+    )
+    return [UserDailyUsage(owner_id=owner_id, **_daily(day, *totals)) for day, owner_id, *totals in rows]
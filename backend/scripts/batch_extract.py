@@ -0,0 +1,240 @@
+# backend/scripts/batch_extract.py
+
+# Offline batch extraction for backfills and nightly imports.
+# Run from the backend folder:
+#
+#   python -m scripts.batch_extract grouped --group-size 5
+#   python -m scripts.batch_extract prepare batch.jsonl
+#   python -m scripts.batch_extract submit batch.jsonl
+#   python -m scripts.batch_extract fetch <batch_id> results.jsonl
+#   python -m scripts.batch_extract ingest results.jsonl --requests batch.jsonl
+#
+# Selected invoices are marked "batched" so the API's extraction workers
+# leave them alone. Anything that doesn't come back valid is retried with
+# one request per invoice; if that fails too, the normal job queue takes over.
+# Invoices that never get ingested go back to the queue after
+# BATCH_CLAIM_TIMEOUT_HOURS.
+
+import time
+import asyncio
+import argparse
+import datetime
+from dotenv import load_dotenv
+
+# Read .env before the app modules, which read their settings when imported
+load_dotenv()
+
+from sqlalchemy import func, update
+
+from database import SessionLocal, engine
+from migrations import run_migrations
+from models.invoice import Invoice, EXTRACTION_PENDING, EXTRACTION_FAILED, EXTRACTION_BATCHED
+from services.extraction_queue import save_job_result
+from services.data_version import bump_data_version
+from services.batch_extraction import (
+    DEFAULT_GROUP_SIZE,
+    run_grouped_extraction,
+    retry_individually,
+    write_batch_file,
+    read_batch_results,
+    read_batch_request_ids,
+    submit_batch_file,
+    download_batch_results,
+)
+from utils.pdf_processor import pdf_pool
+from services.document_text import load_document_text
+
+def select_invoices(statuses, owner_id=None, limit=None):
+    """Picks invoices to extract and marks them as batched. Returns their ids."""
+    db = SessionLocal()
+    try:
+        query = db.query(Invoice.id, Invoice.owner_id).filter(
+            Invoice.extraction_status.in_(statuses),
+            Invoice.file_path.isnot(None),
+        )
+        if owner_id is not None:
+            query = query.filter(Invoice.owner_id == owner_id)
+        candidates = query.order_by(Invoice.id).limit(limit).all()
+
+        # Claimed one by one with a conditional UPDATE, like claim_next_job, so
+        # an invoice a worker (or another batch run) took in the meantime is skipped
+        now = datetime.datetime.utcnow()
+        claimed = []
+        for invoice_id, invoice_owner_id in candidates:
+            result = db.execute(
+                update(Invoice)
+                .where(Invoice.id == invoice_id, Invoice.extraction_status.in_(statuses))
+                .values(
+                    extraction_status=EXTRACTION_BATCHED,
+                    claimed_at=now,
+                    extraction_attempts=func.coalesce(Invoice.extraction_attempts, 0) + 1,
+                    next_attempt_at=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed.append((invoice_id, invoice_owner_id))
+        for invoice_owner_id in {invoice_owner_id for _, invoice_owner_id in claimed}:
+            bump_data_version(db, invoice_owner_id)
+        db.commit()
+        return [invoice_id for invoice_id, _ in claimed]
+    finally:
+        db.close()
+
+def release_invoices(invoice_ids):
+    """Hands batched invoices that got no result back to the job queue. Returns how many."""
+    db = SessionLocal()
+    try:
+        owners = {
+            owner_id for (owner_id,) in db.query(Invoice.owner_id).filter(
+                Invoice.id.in_(invoice_ids), Invoice.extraction_status == EXTRACTION_BATCHED
+            )
+        }
+        # Only rows still batched - a worker may have taken over after the batch timeout
+        result = db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids), Invoice.extraction_status == EXTRACTION_BATCHED)
+            .values(extraction_status=EXTRACTION_PENDING, claimed_at=None, next_attempt_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        for owner_id in owners:
+            bump_data_version(db, owner_id)
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+async def _read_pdfs(rows):
+    # All PDFs at once - stored texts come straight from the DB and the
+    # PDF process pool spreads the rest over the cores
+    async def read(file_path, content_hash):
+        try:
+            return await load_document_text(file_path, content_hash)
+        except Exception as e:
+            return e
+    return await asyncio.gather(*[read(file_path, content_hash) for _, file_path, content_hash in rows])
+
+def load_texts(invoice_ids):
+    """Returns [(invoice_id, text)] for invoices with readable PDFs and records failures for the rest."""
+    db = SessionLocal()
+    try:
+        rows = db.query(Invoice.id, Invoice.file_path, Invoice.content_hash).filter(Invoice.id.in_(invoice_ids)).all()
+    finally:
+        db.close()
+
+    items = []
+    for (invoice_id, _, _), text in zip(rows, asyncio.run(_read_pdfs(rows))):
+        if isinstance(text, Exception):
+            save_job_result(invoice_id, error=text, claimed_status=EXTRACTION_BATCHED)
+            continue
+        if not text:
+            save_job_result(invoice_id, error=ValueError("No text could be extracted from the PDF"), claimed_status=EXTRACTION_BATCHED)
+            continue
+        items.append((invoice_id, text))
+    return items
+
+def save_results(results):
+    saved = failed = 0
+    for invoice_id, (data, error, method) in results.items():
+        # Invoices the workers took over after BATCH_CLAIM_TIMEOUT_HOURS are theirs now
+        if not save_job_result(invoice_id, data, error, method=method, claimed_status=EXTRACTION_BATCHED):
+            continue
+        if error is None:
+            saved += 1
+        else:
+            failed += 1
+    return saved, failed
+
+def run_grouped(args):
+    invoice_ids = select_invoices(args.status, args.owner, args.limit)
+    print(f"📦 Selected {len(invoice_ids)} invoices")
+    items = load_texts(invoice_ids)
+
+    started = time.perf_counter()
+    results, stats = asyncio.run(run_grouped_extraction(items, args.group_size))
+    elapsed = time.perf_counter() - started
+
+    saved, failed = save_results(results)
+    print(f"✅ {saved} extracted, {failed} failed in {elapsed:.1f}s — {stats}")
+
+def run_prepare(args):
+    invoice_ids = select_invoices(args.status, args.owner, args.limit)
+    items = load_texts(invoice_ids)
+    count = write_batch_file(items, args.path)
+    print(f"📝 Wrote {count} requests to {args.path}")
+
+def run_submit(args):
+    batch_id = submit_batch_file(args.path)
+    print(f"🚀 Submitted batch {batch_id}")
+
+def run_fetch(args):
+    status = download_batch_results(args.batch_id, args.path)
+    if status == "completed":
+        print(f"📥 Saved results of batch {args.batch_id} to {args.path}")
+    else:
+        print(f"⏳ Batch {args.batch_id} is {status}, try again later")
+
+def run_ingest(args):
+    results = read_batch_results(args.path)
+
+    # Failed or invalid answers get one more try as single requests
+    retry_ids = [invoice_id for invoice_id, (data, error, method) in results.items() if error is not None]
+    if retry_ids:
+        print(f"🔁 Retrying {len(retry_ids)} invoices individually")
+        results.update(asyncio.run(retry_individually(load_texts(retry_ids))))
+
+    saved, failed = save_results(results)
+    print(f"✅ Ingested {saved} invoices, {failed} failed")
+
+    # Requests the batch never answered (expired, or left out of the file)
+    if args.requests:
+        leftovers = [invoice_id for invoice_id in read_batch_request_ids(args.requests) if invoice_id not in results]
+        if leftovers:
+            print(f"↩️ {release_invoices(leftovers)} invoices without a result went back to the job queue")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch extraction of invoices")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_selection(command):
+        command.add_argument("--status", action="append", default=None,
+                             help="Extraction status to select (repeatable, default: pending and failed)")
+        command.add_argument("--owner", type=int, help="Only invoices of this user id")
+        command.add_argument("--limit", type=int, help="At most this many invoices")
+
+    grouped = commands.add_parser("grouped", help="Extract now, several invoices per request")
+    add_selection(grouped)
+    grouped.add_argument("--group-size", type=int, default=DEFAULT_GROUP_SIZE)
+    grouped.set_defaults(handler=run_grouped)
+
+    prepare = commands.add_parser("prepare", help="Write a Batch API JSONL file")
+    add_selection(prepare)
+    prepare.add_argument("path")
+    prepare.set_defaults(handler=run_prepare)
+
+    submit = commands.add_parser("submit", help="Upload a batch file and start the batch job")
+    submit.add_argument("path")
+    submit.set_defaults(handler=run_submit)
+
+    fetch = commands.add_parser("fetch", help="Download the results of a finished batch job")
+    fetch.add_argument("batch_id")
+    fetch.add_argument("path")
+    fetch.set_defaults(handler=run_fetch)
+
+    ingest = commands.add_parser("ingest", help="Apply a results JSONL file to the invoices")
+    ingest.add_argument("path")
+    ingest.add_argument("--requests", help="The file written by prepare - invoices in it without a result go back to the queue")
+    ingest.set_defaults(handler=run_ingest)
+
+    args = parser.parse_args()
+    if getattr(args, "status", None) is None:
+        args.status = [EXTRACTION_PENDING, EXTRACTION_FAILED]
+
+    run_migrations(engine)
+    try:
+        args.handler(args)
+    finally:
+        pdf_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# backend/scripts/reextract.py
+
+# Re-runs AI extraction over existing invoices, e.g. after the prompt in
+# services/openai_service.py or the model changed. Run from the backend folder:
+#
+#   python -m scripts.reextract start --stale-prompt
+#   python -m scripts.reextract start --missing vendor --missing amount --owner 3
+#   python -m scripts.reextract start --uploaded-after 2024-01-01 --uploaded-before 2024-07-01
+#   python -m scripts.reextract resume 4 [--retry-failed]
+#   python -m scripts.reextract status
+#
+# "start" snapshots the matching invoices into a run and works through them;
+# every finished invoice is checkpointed in the database, so after a crash
+# or Ctrl-C "resume" picks up the ones that are left. Invoices go straight
+# to the AI (the vendor rules and duplicate check are for new uploads), at
+# most --concurrency at a time and --requests-per-minute overall, on top of
+# the OpenAI limits the API server shares. Each invoice is claimed
+# ("processing") while it's re-extracted, so the workers leave it alone; one
+# that a worker or batch job took since the snapshot is skipped and recorded
+# as failed. A failed re-extraction leaves the invoice as it was and is only
+# recorded on the run. --missing runs skip the extraction cache, which would
+# only hand back the same incomplete answer.
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+from sqlalchemy import func, insert, literal, or_, select
+from dotenv import load_dotenv
+
+# Read .env before the app modules, which read their settings when imported
+load_dotenv()
+
+from database import SessionLocal, engine
+from migrations import run_migrations
+from models.invoice import Invoice, EXTRACTION_COMPLETED, EXTRACTION_FAILED, EXTRACTION_PROCESSING
+from models.reextraction import ReextractionRun, ReextractionItem, ITEM_PENDING, ITEM_DONE, ITEM_FAILED
+from services.document_text import load_document_text
+from services.extraction_queue import EXTRACTED_FIELDS, ExtractionError, claim_invoice, release_invoice, save_job_result
+from services.openai_service import EXTRACTION_VERSION, extract_invoice_data_with_cache_async
+from services.rate_limiter import TokenBucket
+from utils.pdf_processor import pdf_pool
+
+DEFAULT_CONCURRENCY = 4
+# Pending items read from the checkpoint table at a time
+PAGE_SIZE = 500
+PROGRESS_SECONDS = 1.0
+# Invoices a run may touch - anything else belongs to the workers or a batch job
+SELECTABLE_STATUSES = (EXTRACTION_COMPLETED, EXTRACTION_FAILED)
+
+def selection_condition(args):
+    """The WHERE clause for the invoices a new run covers."""
+    # Invoices the workers or a batch job own right now are left alone, and
+    # copies follow their original rather than being extracted themselves
+    conditions = [
+        Invoice.extraction_status.in_(SELECTABLE_STATUSES),
+        Invoice.file_path.isnot(None),
+        Invoice.duplicate_of_id.is_(None),
+    ]
+    if args.stale_prompt:
+        conditions.append(Invoice.extraction_method.in_(["llm", "cache"]))
+        conditions.append(or_(Invoice.prompt_version.is_(None), Invoice.prompt_version != EXTRACTION_VERSION))
+    if args.missing:
+        conditions.append(or_(*(getattr(Invoice, field).is_(None) for field in args.missing)))
+    if args.uploaded_after:
+        conditions.append(Invoice.upload_date >= args.uploaded_after)
+    if args.uploaded_before:
+        conditions.append(Invoice.upload_date < args.uploaded_before)
+    if args.owner is not None:
+        conditions.append(Invoice.owner_id == args.owner)
+    return conditions
+
+def create_run(args):
+    """Snapshots the selected invoices into a new run. Returns (run_id, total)."""
+    filters = {
+        key: str(value) if isinstance(value, datetime.date) else value
+        for key, value in vars(args).items()
+        if key in ("stale_prompt", "missing", "uploaded_after", "uploaded_before", "owner", "limit") and value
+    }
+    db = SessionLocal()
+    try:
+        run = ReextractionRun(filters=json.dumps(filters), extraction_version=EXTRACTION_VERSION)
+        db.add(run)
+        db.flush()
+        # One INSERT ... SELECT, so even a full backfill doesn't pull the ids through Python
+        selected = select(literal(run.id), Invoice.id).where(*selection_condition(args)).order_by(Invoice.id).limit(args.limit)
+        db.execute(insert(ReextractionItem).from_select(["run_id", "invoice_id"], selected))
+        run.total = db.query(func.count()).select_from(ReextractionItem).filter(ReextractionItem.run_id == run.id).scalar()
+        db.commit()
+        return run.id, run.total
+    finally:
+        db.close()
+
+def next_pending(run_id, after_id):
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ReextractionItem.invoice_id)
+            .filter(
+                ReextractionItem.run_id == run_id,
+                ReextractionItem.status == ITEM_PENDING,
+                ReextractionItem.invoice_id > after_id,
+            )
+            .order_by(ReextractionItem.invoice_id)
+            .limit(PAGE_SIZE)
+            .all()
+        )
+        return [invoice_id for (invoice_id,) in rows]
+    finally:
+        db.close()
+
+def count_items(run_id):
+    """{status: count} for a run."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ReextractionItem.status, func.count())
+            .filter(ReextractionItem.run_id == run_id)
+            .group_by(ReextractionItem.status)
+            .all()
+        )
+        return dict(rows)
+    finally:
+        db.close()
+
+def checkpoint(run_id, invoice_id, error=None):
+    db = SessionLocal()
+    try:
+        db.query(ReextractionItem).filter(
+            ReextractionItem.run_id == run_id, ReextractionItem.invoice_id == invoice_id
+        ).update(
+            {"status": ITEM_DONE if error is None else ITEM_FAILED, "error": None if error is None else str(error)[:500]},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def finish_run(run_id):
+    db = SessionLocal()
+    try:
+        db.query(ReextractionRun).filter(ReextractionRun.id == run_id).update(
+            {"finished_at": datetime.datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def claim_for_run(invoice_id):
+    """
+    Marks an invoice as being re-extracted (see claim_invoice). Returns
+    (file_path, content_hash, status, claimed_at), or None if the invoice is
+    gone; raises if it's no longer one a run may touch.
+    """
+    db = SessionLocal()
+    try:
+        row = db.query(Invoice.file_path, Invoice.content_hash, Invoice.extraction_status).filter(Invoice.id == invoice_id).first()
+        if row is None:
+            return None
+        file_path, content_hash, status = row
+        claimed_at = claim_invoice(db, invoice_id, status) if status in SELECTABLE_STATUSES else None
+        if claimed_at is None:
+            raise ExtractionError("Skipped: the invoice was queued for extraction since the run started")
+        return file_path, content_hash, status, claimed_at
+    finally:
+        db.close()
+
+def release_after_run(invoice_id, status, claimed_at):
+    db = SessionLocal()
+    try:
+        release_invoice(db, invoice_id, status, claimed_at)
+    finally:
+        db.close()
+
+async def reextract_invoice(invoice_id, refresh_cache=False):
+    """Extracts one invoice with the current prompt and saves the fields. Raises on failure."""
+    claim = await asyncio.to_thread(claim_for_run, invoice_id)
+    if claim is None:
+        return  # Deleted since the run started
+    file_path, content_hash, status, claimed_at = claim
+
+    try:
+        invoice_text = await load_document_text(file_path, content_hash)
+        if not invoice_text:
+            raise ExtractionError("No text could be extracted from the PDF")
+
+        extracted_data, token_count = await extract_invoice_data_with_cache_async(invoice_text, invoice_id, refresh=refresh_cache)
+        if all(extracted_data.get(key) is None for key in EXTRACTED_FIELDS):
+            raise ExtractionError("AI extraction returned no fields")
+    except BaseException:
+        # Includes Ctrl-C, so an interrupted run doesn't leave invoices "processing"
+        await asyncio.shield(asyncio.to_thread(release_after_run, invoice_id, status, claimed_at))
+        raise
+    await asyncio.to_thread(
+        save_job_result, invoice_id, extracted_data, method="cache" if token_count == 0 else "llm",
+        claimed_status=EXTRACTION_PROCESSING, claimed_at=claimed_at,
+    )
+
+class Progress:
+    """Counts finished invoices and prints throughput and the ETA."""
+
+    def __init__(self, total, already_finished):
+        self.total = total
+        self.finished = already_finished
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def record(self, error):
+        self.finished += 1
+        if error is None:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        rate = (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.finished
+        eta = str(datetime.timedelta(seconds=int(remaining / rate))) if rate > 0 else "?"
+        return (
+            f"🔁 {self.finished}/{self.total} — {self.done} re-extracted, {self.failed} failed"
+            f" — {rate:.1f}/s, ETA {eta}"
+        )
+
+    def print(self, final=False):
+        # Rewrites one line on a terminal, prints a line per report when piped to a log
+        if sys.stdout.isatty():
+            print("\r" + self.line().ljust(100), end="\n" if final else "", flush=True)
+        else:
+            print(self.line(), flush=True)
+
+async def run_items(run_id, concurrency, requests_per_minute, refresh_cache=False):
+    counts = await asyncio.to_thread(count_items, run_id)
+    progress = Progress(sum(counts.values()), counts.get(ITEM_DONE, 0) + counts.get(ITEM_FAILED, 0))
+    limit = TokenBucket(requests_per_minute, capacity=max(1, concurrency)) if requests_per_minute else None
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def feed():
+        after_id = 0
+        while True:
+            invoice_ids = await asyncio.to_thread(next_pending, run_id, after_id)
+            if not invoice_ids:
+                break
+            for invoice_id in invoice_ids:
+                await queue.put(invoice_id)
+            after_id = invoice_ids[-1]
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            invoice_id = await queue.get()
+            if invoice_id is None:
+                return
+            if limit is not None:
+                await limit.acquire()
+            try:
+                await reextract_invoice(invoice_id, refresh_cache)
+                error = None
+            except Exception as e:
+                error = e
+                print(f"⚠️ Re-extraction failed for invoice {invoice_id}: {e}")
+            await asyncio.to_thread(checkpoint, run_id, invoice_id, error)
+            progress.record(error)
+
+    async def report():
+        while True:
+            await asyncio.sleep(PROGRESS_SECONDS)
+            progress.print()
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(feed(), *(work() for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        progress.print(final=True)
+    return progress
+
+def run_and_report(run_id, args, filters):
+    # Invoices picked for missing fields would get the same incomplete answer from the cache
+    refresh_cache = bool(filters.get("missing"))
+    progress = asyncio.run(run_items(run_id, args.concurrency, args.requests_per_minute, refresh_cache))
+    if progress.finished >= progress.total:
+        finish_run(run_id)
+    print(f"✅ Run {run_id}: {progress.done} re-extracted, {progress.failed} failed this session")
+    if progress.failed:
+        print(f"   Retry them with: python -m scripts.reextract resume {run_id} --retry-failed")
+
+def run_start(args):
+    run_id, total = create_run(args)
+    print(f"📦 Run {run_id}: {total} invoices to re-extract with {EXTRACTION_VERSION}")
+    if total:
+        run_and_report(run_id, args, {"missing": args.missing})
+    else:
+        finish_run(run_id)
+
+def run_resume(args):
+    db = SessionLocal()
+    try:
+        run = db.query(ReextractionRun).filter(ReextractionRun.id == args.run_id).first()
+        if run is None:
+            print(f"❌ No run {args.run_id}")
+            return
+        if args.retry_failed:
+            db.query(ReextractionItem).filter(
+                ReextractionItem.run_id == run.id, ReextractionItem.status == ITEM_FAILED
+            ).update({"status": ITEM_PENDING, "error": None}, synchronize_session=False)
+            run.finished_at = None
+            db.commit()
+        if run.extraction_version != EXTRACTION_VERSION:
+            print(f"⚠️ Run {run.id} was started with {run.extraction_version}, continuing with {EXTRACTION_VERSION}")
+        filters = json.loads(run.filters or "{}")
+    finally:
+        db.close()
+
+    print(f"▶️ Resuming run {args.run_id}")
+    run_and_report(args.run_id, args, filters)
+
+def run_status(args):
+    db = SessionLocal()
+    try:
+        runs = db.query(ReextractionRun).order_by(ReextractionRun.id.desc()).limit(args.limit).all()
+        if not runs:
+            print("No re-extraction runs yet")
+        for run in runs:
+            counts = count_items(run.id)
+            state = "finished" if run.finished_at else "unfinished"
+            print(
+                f"#{run.id} {run.created_at:%Y-%m-%d %H:%M} {state} — {counts.get(ITEM_DONE, 0)} done,"
+                f" {counts.get(ITEM_FAILED, 0)} failed, {counts.get(ITEM_PENDING, 0)} pending of {run.total}"
+                f" — {run.extraction_version} {run.filters}"
+            )
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run AI extraction over existing invoices")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_limits(command):
+        command.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                             help="Invoices extracted at the same time")
+        command.add_argument("--requests-per-minute", type=int, default=None,
+                             help="Cap for this backfill, so it leaves room for new uploads")
+
+    start = commands.add_parser("start", help="Select invoices and re-extract them")
+    start.add_argument("--stale-prompt", action="store_true",
+                       help="AI-extracted invoices whose prompt or model is not the current one")
+    start.add_argument("--missing", action="append", choices=EXTRACTED_FIELDS,
+                       help="Invoices missing this field (repeatable, any of them)")
+    start.add_argument("--uploaded-after", type=datetime.date.fromisoformat, help="YYYY-MM-DD, inclusive")
+    start.add_argument("--uploaded-before", type=datetime.date.fromisoformat, help="YYYY-MM-DD, exclusive")
+    start.add_argument("--owner", type=int, help="Only invoices of this user id")
+    start.add_argument("--limit", type=int, help="At most this many invoices")
+    add_limits(start)
+    start.set_defaults(handler=run_start)
+
+    resume = commands.add_parser("resume", help="Continue an interrupted run")
+    resume.add_argument("run_id", type=int)
+    resume.add_argument("--retry-failed", action="store_true", help="Also retry the invoices that failed")
+    add_limits(resume)
+    resume.set_defaults(handler=run_resume)
+
+    status = commands.add_parser("status", help="List recent runs")
+    status.add_argument("--limit", type=int, default=20)
+    status.set_defaults(handler=run_status)
+
+    args = parser.parse_args()
+    run_migrations(engine)
+    try:
+        args.handler(args)
+    finally:
+        pdf_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
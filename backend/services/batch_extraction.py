@@ -0,0 +1,283 @@
+# backend/services/batch_extraction.py
+
+import json
+import time
+import hashlib
+import asyncio
+
+from services.openai_service import (
+    OPENAI_MODEL,
+    MAX_COMPLETION_TOKENS,
+    build_messages,
+    chat_completion_async,
+    get_client,
+    extract_invoice_data_with_cache_async,
+    extraction_cache_key,
+    validate_extracted_data,
+    SINGLE_PROMPT_MODE,
+)
+from services.extraction_cache import extraction_cache
+from services.prompt_compaction import prepare_invoice_text
+from services.usage_ledger import BATCH_PRICE_FACTOR, usage_ledger
+
+# Offline extraction for backfills and nightly imports, where latency doesn't
+# matter but per-request overhead does. Two modes:
+#
+# - grouped: several invoices share one chat request (and one system prompt)
+# - batch file: a JSONL file in OpenAI's Batch API format, submitted as a
+#   batch job and ingested once the results file is ready
+#
+# Either way every answer is checked with validate_extracted_data, and
+# invoices that didn't come back valid are retried one at a time.
+
+DEFAULT_GROUP_SIZE = 5
+# Completion budget per invoice in a grouped request
+GROUPED_TOKENS_PER_INVOICE = 120
+
+GROUPED_SYSTEM_PROMPT = """
+        You are an AI assistant that extracts key information from invoices.
+        You will receive several invoices. Each one starts with a line "### Invoice <id>".
+        For every invoice extract:
+        - Vendor name (the company issuing the invoice)
+        - Amount (the total amount due in numeric format without currency symbols)
+        - Date (in YYYY-MM-DD format)
+        - Category (one of: Services, Supplies, Utilities, Equipment, Travel, Consulting, Other)
+        - Currency (the ISO 4217 code of the amount, e.g. USD, EUR, GBP)
+
+        Format your response as a JSON object {"invoices": [...]} with one entry per invoice,
+        each with fields: invoice_id, vendor, amount, invoice_date, category, currency.
+        Only respond with the JSON object, nothing else.
+        """
+
+# Grouped answers are cached under their own prompt mode (see extraction_cache_key)
+GROUPED_PROMPT_MODE = "grouped-" + hashlib.sha256(GROUPED_SYSTEM_PROMPT.strip().encode()).hexdigest()[:12]
+
+BATCH_CUSTOM_ID_PREFIX = "invoice-"
+
+def build_grouped_messages(items):
+    """items is a list of (invoice_id, invoice_text). Each invoice is compacted on its own."""
+    sections = "\n\n".join(
+        f"### Invoice {invoice_id}\n{prepare_invoice_text(invoice_text).strip()}" for invoice_id, invoice_text in items
+    )
+    return [
+        {"role": "system", "content": GROUPED_SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": f"Extract information from these invoices:\n\n{sections}"},
+    ]
+
+def parse_grouped_response(result_text):
+    """Maps invoice id -> extracted fields from a grouped answer."""
+    payload = json.loads(result_text)
+    entries = payload.get("invoices", []) if isinstance(payload, dict) else payload
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or "invoice_id" not in entry:
+            continue
+        try:
+            invoice_id = int(entry.pop("invoice_id"))
+        except (TypeError, ValueError):
+            continue
+        results[invoice_id] = entry
+    return results
+
+async def _extract_group(items):
+    # One request for the whole group; a failed request fails every invoice in it
+    messages = build_grouped_messages(items)
+    started = time.perf_counter()
+    try:
+        response = await chat_completion_async(messages, max_tokens=GROUPED_TOKENS_PER_INVOICE * len(items))
+    except Exception as e:
+        print(f"⚠️ Grouped request for {len(items)} invoices failed: {e}")
+        record_group_usage(items, None, time.perf_counter() - started)
+        return {}
+    record_group_usage(items, response, time.perf_counter() - started)
+    try:
+        answers = parse_grouped_response(response.choices[0].message.content.strip())
+    except Exception as e:
+        print(f"⚠️ Grouped answer for {len(items)} invoices was unreadable: {e}")
+        return {}
+
+    texts = dict(items)
+    results = {}
+    for invoice_id, data in answers.items():
+        if invoice_id in texts and validate_extracted_data(data):
+            results[invoice_id] = data
+            await asyncio.to_thread(extraction_cache.set, extraction_cache_key(texts[invoice_id], GROUPED_PROMPT_MODE), data)
+    return results
+
+def _split(total, parts):
+    # Spreads a token count over the invoices of a group, adding up to the total
+    share, remainder = divmod(total, parts)
+    return [share + (1 if i < remainder else 0) for i in range(parts)]
+
+def record_group_usage(items, response, latency):
+    """Records a grouped request in the usage ledger, its tokens split evenly over the invoices."""
+    usage = getattr(response, "usage", None)
+    prompt = _split(usage.prompt_tokens if usage else 0, len(items))
+    completion = _split(usage.completion_tokens if usage else 0, len(items))
+    for (invoice_id, _), prompt_tokens, completion_tokens in zip(items, prompt, completion):
+        usage_ledger.record(
+            invoice_id, OPENAI_MODEL, prompt_tokens, completion_tokens, latency, success=response is not None
+        )
+
+async def retry_individually(items):
+    """
+    Extracts invoices one request each. Returns {invoice_id: (data, error,
+    method)}, where exactly one of data and error is set and method is
+    "cache" or "llm".
+    """
+    async def extract_one(invoice_id, invoice_text):
+        try:
+            data, token_count = await extract_invoice_data_with_cache_async(invoice_text, invoice_id)
+        except Exception as e:
+            return invoice_id, (None, e, "llm")
+        if not validate_extracted_data(data):
+            return invoice_id, (None, ValueError("AI extraction returned incomplete fields"), "llm")
+        return invoice_id, (data, None, "cache" if token_count == 0 else "llm")
+
+    return dict(await asyncio.gather(*[extract_one(invoice_id, text) for invoice_id, text in items]))
+
+async def run_grouped_extraction(items, group_size=DEFAULT_GROUP_SIZE):
+    """
+    Extracts (invoice_id, invoice_text) items N per request. The shared rate
+    limiter bounds how many groups are in flight. Returns
+    ({invoice_id: (data, error, method)}, stats).
+    """
+    results = {}
+    # Texts we've already extracted don't need to go out again. A single
+    # extraction's answer is preferred over one from a grouped request.
+    uncached = []
+    for invoice_id, invoice_text in items:
+        for prompt_mode in (SINGLE_PROMPT_MODE, GROUPED_PROMPT_MODE):
+            cached = await asyncio.to_thread(extraction_cache.get, extraction_cache_key(invoice_text, prompt_mode))
+            if cached is not None:
+                results[invoice_id] = (cached, None, "cache")
+                break
+        else:
+            uncached.append((invoice_id, invoice_text))
+
+    groups = [uncached[i:i + group_size] for i in range(0, len(uncached), group_size)]
+    group_results = await asyncio.gather(*[_extract_group(group) for group in groups])
+
+    for answers in group_results:
+        for invoice_id, data in answers.items():
+            results[invoice_id] = (data, None, "llm")
+
+    leftovers = [(invoice_id, text) for invoice_id, text in items if invoice_id not in results]
+    if leftovers:
+        print(f"🔁 Retrying {len(leftovers)} invoices individually")
+        results.update(await retry_individually(leftovers))
+
+    stats = {
+        "invoices": len(items),
+        "served_by_cache": len(items) - len(uncached),
+        "grouped_requests": len(groups),
+        "served_by_groups": len(uncached) - len(leftovers),
+        "retried_individually": len(leftovers),
+        "failed": sum(1 for data, error, method in results.values() if error is not None),
+    }
+    return results, stats
+
+def write_batch_file(items, path):
+    """
+    Writes one Batch API request per invoice to a JSONL file. Each line uses
+    the same prompt as a normal extraction; custom_id carries the invoice id.
+    """
+    with open(path, "w") as f:
+        for invoice_id, invoice_text in items:
+            f.write(json.dumps({
+                "custom_id": f"{BATCH_CUSTOM_ID_PREFIX}{invoice_id}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": OPENAI_MODEL,
+                    "messages": build_messages(invoice_text),
+                    "temperature": 0.3,
+                    "max_tokens": MAX_COMPLETION_TOKENS,
+                },
+            }) + "\n")
+    return len(items)
+
+def read_batch_request_ids(path):
+    """Returns the invoice ids in a batch file written by write_batch_file."""
+    invoice_ids = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            custom_id = json.loads(line).get("custom_id", "")
+            if custom_id.startswith(BATCH_CUSTOM_ID_PREFIX):
+                invoice_ids.append(int(custom_id[len(BATCH_CUSTOM_ID_PREFIX):]))
+    return invoice_ids
+
+def read_batch_results(path):
+    """
+    Parses a Batch API output (or error) JSONL file. Returns
+    {invoice_id: (data, error, method)}, with answers already validated. The
+    answers' token usage goes to the usage ledger at the Batch API price,
+    so read each results file once.
+    """
+    results = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id", "")
+            if not custom_id.startswith(BATCH_CUSTOM_ID_PREFIX):
+                continue
+            invoice_id = int(custom_id[len(BATCH_CUSTOM_ID_PREFIX):])
+
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or {"message": f"HTTP {response.get('status_code')}"}
+                results[invoice_id] = (None, RuntimeError(error.get("message", str(error))), "llm")
+                continue
+
+            usage = (response.get("body") or {}).get("usage") or {}
+            usage_ledger.record(
+                invoice_id, OPENAI_MODEL,
+                usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                cache_status="batch", price_factor=BATCH_PRICE_FACTOR
+            )
+
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                data = json.loads(content.strip())
+            except (KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+                results[invoice_id] = (None, ValueError(f"Unreadable answer: {e}"), "llm")
+                continue
+
+            if validate_extracted_data(data):
+                results[invoice_id] = (data, None, "llm")
+            else:
+                results[invoice_id] = (None, ValueError("AI extraction returned incomplete fields"), "llm")
+    return results
+
+def submit_batch_file(path):
+    """Uploads a batch file to OpenAI and starts the batch job. Returns the batch id."""
+    client = get_client()
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+def download_batch_results(batch_id, path):
+    """
+    Saves the results of a finished batch job to `path` (errors are appended
+    to the same file). Returns the batch status; nothing is written until
+    the batch has completed.
+    """
+    client = get_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status
+
+    with open(path, "wb") as f:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                f.write(client.files.content(file_id).read())
+    return batch.status
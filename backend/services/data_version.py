@@ -0,0 +1,49 @@
+# backend/services/data_version.py
+
+import hashlib
+from fastapi import Request, Response # type: ignore
+from sqlalchemy import update
+
+from models.user import User
+
+# Conditional GETs for the dashboard. Every user has a data_version counter
+# that goes up with each write to their invoices, whether it comes from the
+# API or from the extraction workers. List, detail and stats responses carry
+# an ETag made from it, so a client that sends it back in If-None-Match gets
+# a bodyless 304 as long as nothing changed - decided from the user row that
+# authentication already loaded, before the real query runs.
+
+def bump_data_version(db, owner_id):
+    """Marks the owner's data as changed. Call in the transaction that makes the change; the caller commits."""
+    if owner_id is None:
+        return
+    db.execute(
+        update(User)
+        .where(User.id == owner_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def data_etag(request: Request, user: User):
+    # The URL is part of the tag so a client can't reuse a tag across filters or pages
+    url_hash = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:10]
+    return f'W/"{user.id}-{user.data_version or 0}-{url_hash}"'
+
+def _matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match calls for
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+def not_modified(request: Request, response: Response, user: User):
+    """
+    Sets the ETag on the response and returns a 304 to send instead when the
+    client's copy is current, otherwise None.
+    """
+    etag = data_etag(request, user)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,72 @@
+# backend/services/document_text.py
+
+import os
+import zlib
+import asyncio
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.document_text import DocumentText
+from utils.pdf_processor import PdfDocument, pdf_pool
+from utils.file_storage import file_sha256
+
+# Every stored PDF is parsed once. Its text and page details are saved in
+# document_texts under the file's SHA-256, and later extractions (retries,
+# POST /extract, batch runs) and search read them from there. Stored files
+# never change, so a row only goes away when its file is deleted.
+
+def get_stored_document(content_hash):
+    db = SessionLocal()
+    try:
+        row = db.query(DocumentText).filter(DocumentText.content_hash == content_hash).first()
+        if row is None:
+            return None
+        return PdfDocument(
+            text=zlib.decompress(row.text_zlib).decode("utf-8"),
+            page_count=row.page_count,
+            pages_read=row.pages_read,
+            has_text_layer=row.has_text_layer,
+        )
+    finally:
+        db.close()
+
+def save_document(content_hash, document):
+    db = SessionLocal()
+    try:
+        db.add(DocumentText(
+            content_hash=content_hash,
+            text_zlib=zlib.compress(document.text.encode("utf-8")),
+            char_count=len(document.text),
+            page_count=document.page_count,
+            pages_read=document.pages_read,
+            has_text_layer=document.has_text_layer,
+        ))
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Another worker stored the same file first
+    finally:
+        db.close()
+
+async def load_document(file_path, content_hash=None):
+    """
+    Returns the PdfDocument for a stored file, parsing the PDF only the first
+    time. Returns (document, content_hash).
+    """
+    if content_hash is None:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"PDF file not found: {file_path}")
+        content_hash = await asyncio.to_thread(file_sha256, file_path)
+
+    document = await asyncio.to_thread(get_stored_document, content_hash)
+    if document is not None:
+        return document, content_hash
+
+    document = await pdf_pool.read(file_path)
+    # A PDF that couldn't be opened at all isn't worth remembering
+    if document.page_count > 0:
+        await asyncio.to_thread(save_document, content_hash, document)
+    return document, content_hash
+
+async def load_document_text(file_path, content_hash=None):
+    document, _ = await load_document(file_path, content_hash)
+    return document.text
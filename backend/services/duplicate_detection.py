@@ -0,0 +1,147 @@
+# backend/services/duplicate_detection.py
+
+import os
+from typing import NamedTuple
+
+from database import SessionLocal
+from models.invoice import Invoice, EXTRACTION_COMPLETED
+from models.invoice_fingerprint import InvoiceFingerprint
+from utils.normalize import AMOUNT_TOKEN, DATE_TOKEN, parse_amount, parse_invoice_date
+from utils.simhash import BANDS, simhash, hamming_distance, bands, to_signed, to_unsigned
+
+# Vendors re-send invoices, sometimes re-rendered with a new file name or a
+# printed-at timestamp. Before an upload goes to the rules or OpenAI, its
+# text is compared with the user's earlier invoices. A copy takes the
+# original's fields, points at it through duplicate_of_id and is left out
+# of the dashboard totals.
+#
+# Identical files are matched by content hash. For near duplicates the
+# SimHash has to be within NEAR_DUPLICATE_MAX_DISTANCE bits, and the
+# original's vendor, amount and date have to appear in the new text. The
+# SimHash only finds candidates: invoices that are mostly shared terms and
+# conditions fingerprint alike, and two monthly invoices from one vendor
+# differ only in the numbers. Very short invoices change too much with one
+# added line, so they are only caught as identical files.
+
+DUPLICATE_DETECTION_ENABLED = os.getenv("DUPLICATE_DETECTION", "1") != "0"
+# Must stay below BANDS so a near duplicate always shares a bucket with the original
+NEAR_DUPLICATE_MAX_DISTANCE = min(int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "3")), BANDS - 1)
+# Invoices from one vendor template can crowd a bucket; the newest are the likeliest originals
+MAX_CANDIDATES = 200
+
+# Fields a duplicate copies from its original
+COPIED_FIELDS = ("vendor", "amount", "invoice_date", "category", "currency")
+
+class Duplicate(NamedTuple):
+    invoice_id: int    # The original
+    distance: int      # SimHash bits apart, 0 for identical files
+    fields: dict       # The original's extracted fields
+
+def _fields_of(invoice):
+    return {key: getattr(invoice, key) for key in COPIED_FIELDS}
+
+def text_backs_up(text, invoice):
+    """True if the original's vendor, amount and date all appear in the text."""
+    if invoice.amount_cents is None or invoice.issued_on is None:
+        return False
+    if invoice.vendor and invoice.vendor.strip().lower() not in text.lower():
+        return False
+    has_amount = any(parse_amount(token)[0] == invoice.amount_cents for token in AMOUNT_TOKEN.findall(text))
+    return has_amount and any(parse_invoice_date(token) == invoice.issued_on for token in DATE_TOKEN.findall(text))
+
+def save_fingerprint(db, invoice, fingerprint):
+    db.query(InvoiceFingerprint).filter(InvoiceFingerprint.invoice_id == invoice.id).delete(synchronize_session=False)
+    db.add_all(
+        InvoiceFingerprint(owner_id=invoice.owner_id, bucket=bucket, invoice_id=invoice.id, simhash=to_signed(fingerprint))
+        for bucket in bands(fingerprint)
+    )
+
+def _is_original(query):
+    # Only finished invoices that aren't copies themselves can be an original
+    return query.filter(Invoice.extraction_status == EXTRACTION_COMPLETED, Invoice.duplicate_of_id.is_(None))
+
+def find_exact_duplicate(db, invoice):
+    if not invoice.content_hash:
+        return None
+    return (
+        _is_original(db.query(Invoice))
+        .filter(Invoice.owner_id == invoice.owner_id, Invoice.content_hash == invoice.content_hash, Invoice.id != invoice.id)
+        .order_by(Invoice.id)
+        .first()
+    )
+
+def find_near_duplicate(db, invoice, text, fingerprint):
+    """Returns (original, distance) for the closest matching earlier invoice, or None."""
+    candidates = (
+        db.query(InvoiceFingerprint.invoice_id, InvoiceFingerprint.simhash)
+        .filter(
+            InvoiceFingerprint.owner_id == invoice.owner_id,
+            InvoiceFingerprint.bucket.in_(bands(fingerprint)),
+            InvoiceFingerprint.invoice_id != invoice.id,
+        )
+        .order_by(InvoiceFingerprint.invoice_id.desc())
+        .limit(MAX_CANDIDATES * BANDS)
+        .all()
+    )
+    close = {}
+    for candidate_id, candidate_hash in candidates:
+        distance = hamming_distance(fingerprint, to_unsigned(candidate_hash))
+        if distance <= NEAR_DUPLICATE_MAX_DISTANCE:
+            close[candidate_id] = distance
+    if not close:
+        return None
+
+    for original in _is_original(db.query(Invoice)).filter(Invoice.id.in_(list(close))).order_by(Invoice.id):
+        if text_backs_up(text, original):
+            return original, close[original.id]
+    return None
+
+def check_duplicate(invoice_id, text):
+    """
+    Fingerprints an invoice's text and looks for an earlier copy of it.
+    Returns a Duplicate, or None when the invoice needs extracting.
+    """
+    if not DUPLICATE_DETECTION_ENABLED:
+        return None
+    db = SessionLocal()
+    try:
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        if invoice is None:
+            return None
+        fingerprint = simhash(text)
+        save_fingerprint(db, invoice, fingerprint)
+        db.commit()
+
+        original = find_exact_duplicate(db, invoice)
+        if original is not None:
+            return Duplicate(original.id, 0, _fields_of(original))
+        match = find_near_duplicate(db, invoice, text, fingerprint)
+        if match is not None:
+            original, distance = match
+            return Duplicate(original.id, distance, _fields_of(original))
+        return None
+    finally:
+        db.close()
+
+def forget_invoices(db, invoices):
+    """
+    Call before deleting invoices. Drops their fingerprints, and for each
+    one that was the original of some copies, the oldest copy that stays
+    takes its place. The caller commits.
+    """
+    deleted_ids = {invoice.id for invoice in invoices}
+    if not deleted_ids:
+        return
+    db.query(InvoiceFingerprint).filter(InvoiceFingerprint.invoice_id.in_(deleted_ids)).delete(synchronize_session=False)
+
+    copies = {}
+    for copy in (
+        db.query(Invoice)
+        .filter(Invoice.duplicate_of_id.in_(deleted_ids), Invoice.id.notin_(deleted_ids))
+        .order_by(Invoice.id)
+    ):
+        copies.setdefault(copy.duplicate_of_id, []).append(copy)
+    for promoted, *others in copies.values():
+        promoted.duplicate_of_id = None
+        for copy in others:
+            copy.duplicate_of_id = promoted.id
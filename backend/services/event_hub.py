@@ -0,0 +1,147 @@
+# backend/services/event_hub.py
+
+import json
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+# In-process pub/sub behind GET /invoices/events. The routes and the
+# extraction workers publish "uploaded", "extraction_started",
+# "extraction_finished" and "extraction_failed" events for an owner, and
+# every open event stream of that owner receives them - one connection per
+# browser tab instead of a polling loop per invoice.
+#
+# The last BUFFER_PER_OWNER events of each owner are kept so a client that
+# reconnects with Last-Event-ID gets what it missed. Event ids start with
+# an id for this process, so after a restart (or with more than one
+# uvicorn process) the client is told to "resync" - reload its list -
+# instead of silently missing events.
+
+BUFFER_PER_OWNER = 200
+# Owners whose recent events stay in memory, least recently active ones are dropped
+MAX_BUFFERED_OWNERS = 1000
+# Events a slow client may fall behind by before it's told to resync
+SUBSCRIBER_QUEUE_SIZE = 500
+
+class Event:
+    __slots__ = ("seq", "id", "type", "data")
+
+    def __init__(self, seq, event_id, event_type, data):
+        self.seq = seq
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def encode(self):
+        """The event in text/event-stream format."""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+class Subscriber:
+    """One open event stream. The hub fills the queue from the event loop."""
+
+    def __init__(self, owner_id):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+        self.closed = False
+
+class EventHub:
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._buffers = OrderedDict()   # owner id -> deque of recent events
+        self._evicted_seq = 0           # newest event in a buffer dropped for MAX_BUFFERED_OWNERS
+        self._subscribers = {}          # owner id -> set of Subscriber
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def start(self):
+        # Called from the app lifespan; publishing from worker threads needs the loop
+        self._loop = asyncio.get_running_loop()
+
+    def close(self):
+        """Ends every open stream, so shutdown doesn't wait on connected clients."""
+        self._loop = None
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.closed = True
+                try:
+                    subscriber.queue.put_nowait(None)  # Wakes the stream up
+                except asyncio.QueueFull:
+                    pass  # It's busy with events and will see closed next
+
+    def publish(self, owner_id, event_type, data):
+        """Records an event for the owner and sends it to their open streams. Safe to call from any thread."""
+        if owner_id is None:
+            return
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, f"{self.boot_id}-{self._seq}", event_type, data)
+            buffer = self._buffers.get(owner_id)
+            if buffer is None:
+                buffer = self._buffers[owner_id] = deque(maxlen=BUFFER_PER_OWNER)
+            buffer.append(event)
+            self._buffers.move_to_end(owner_id)
+            while len(self._buffers) > MAX_BUFFERED_OWNERS:
+                _, evicted = self._buffers.popitem(last=False)
+                self._evicted_seq = max(self._evicted_seq, evicted[-1].seq)
+
+        loop = self._loop
+        if loop is None or owner_id not in self._subscribers:
+            return  # Nobody is listening (or we're in a script) - the buffer is enough
+        try:
+            loop.call_soon_threadsafe(self._deliver, owner_id, event)
+        except RuntimeError:
+            pass  # The loop closed during shutdown
+
+    def _deliver(self, owner_id, event):
+        for subscriber in list(self._subscribers.get(owner_id, ())):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+
+    def subscribe(self, owner_id):
+        subscriber = Subscriber(owner_id)
+        self._subscribers.setdefault(owner_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.owner_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.owner_id]
+
+    def replay(self, owner_id, last_event_id):
+        """
+        Returns (events after last_event_id, complete). complete is False when
+        some events can't be replayed - another process or a restart made the
+        id, or they already fell out of the buffer.
+        """
+        boot_id, _, seq = (last_event_id or "").partition("-")
+        if boot_id != self.boot_id or not seq.isdigit():
+            return [], False
+        seq = int(seq)
+        with self._lock:
+            buffer = list(self._buffers.get(owner_id, ()))
+            evicted_seq = self._evicted_seq
+        missed = [event for event in buffer if event.seq > seq]
+        # Events in between belonged to other owners unless our buffer dropped some
+        complete = len(missed) < BUFFER_PER_OWNER or missed[0].seq == seq + 1
+        if seq < evicted_seq:
+            # Buffers were dropped since then - ours too, unless it still reaches back to seq
+            complete = complete and bool(buffer) and buffer[0].seq <= seq + 1
+        return missed, complete
+
+    def resync_event(self):
+        """Tells a client to reload instead of relying on events; carries the newest id so it can resume from here."""
+        with self._lock:
+            return Event(self._seq, f"{self.boot_id}-{self._seq}", "resync", {})
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+# Shared hub, started and closed by the app lifespan in main.py
+event_hub = EventHub()
@@ -0,0 +1,180 @@
+# backend/services/extraction_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Two tiers: a small in-process LRU in front of a single SQLite file shared by
+# every uvicorn worker. SQLite gives us atomic writes and cross-process
+# locking for free; WAL mode lets readers keep going while one process writes.
+CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "cache/extraction_cache.db")
+MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "1024"))
+MAX_DISK_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_AGE_SECONDS = int(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "90")) * 24 * 3600
+# Eviction needs a SUM over the table, so only run it every so many writes
+EVICT_EVERY_WRITES = 100
+
+class ExtractionCache:
+    """
+    Cache of AI extraction results keyed by content, not by invoice.
+
+    Keys are built by the caller from the normalized text hash, the prompt
+    version and the model, so the same invoice text uploaded twice is only
+    sent to OpenAI once.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_entries=MEMORY_ENTRIES,
+                 max_disk_bytes=MAX_DISK_BYTES, max_age_seconds=MAX_AGE_SECONDS):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age_seconds = max_age_seconds
+
+        self._memory = OrderedDict()  # {key: (created_at, value)}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # one SQLite connection per thread
+        self._writes = 0
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_accessed ON extraction_cache (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_created ON extraction_cache (created_at)")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _remember(self, key, value, created_at):
+        # Adds to the in-memory LRU, dropping the least recently used entry when full.
+        # created_at is the disk row's, so an entry expires at the same time in both tiers
+        with self._lock:
+            self._memory[key] = (created_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self.counters["memory_evictions"] += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                created_at, value = self._memory[key]
+                if created_at >= now - self.max_age_seconds:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return dict(value)
+                del self._memory[key]  # Expired - the disk copy is too, so this ends up a miss
+
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at FROM extraction_cache WHERE key = ? AND created_at >= ?",
+            (key, now - self.max_age_seconds),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        try:
+            value = json.loads(row[0])
+        except json.JSONDecodeError:
+            conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            self._count("misses")
+            return None
+
+        conn.execute("UPDATE extraction_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._remember(key, value, row[1])
+        self._count("disk_hits")
+        return dict(value)
+
+    def set(self, key, value):
+        payload = json.dumps(value)
+        now = time.time()
+        conn = self._connection()
+        # A single statement is its own transaction, so other processes
+        # see either the old entry or the new one, never half of it
+        conn.execute(
+            "INSERT OR REPLACE INTO extraction_cache (key, value, size, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(payload), now, now),
+        )
+        self._remember(key, value, now)
+
+        with self._lock:
+            self._writes += 1
+            run_eviction = self._writes % EVICT_EVERY_WRITES == 1
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones until under the size limit."""
+        conn = self._connection()
+        evicted = conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?",
+            (time.time() - self.max_age_seconds,),
+        ).rowcount
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+        while total > self.max_disk_bytes:
+            # Delete in batches of the oldest-accessed rows
+            rows = conn.execute(
+                "SELECT key, size FROM extraction_cache ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, size in rows:
+                    if total <= self.max_disk_bytes:
+                        break
+                    conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if evicted:
+            self._count("disk_evictions", evicted)
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["memory_entries"] = len(self._memory)
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        counters["hits"] = hits
+        counters["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return counters
+
+# Shared cache for the whole process
+extraction_cache = ExtractionCache()
@@ -0,0 +1,403 @@
+# backend/services/extraction_queue.py
+
+import os
+import time
+import random
+import asyncio
+import datetime
+from sqlalchemy import and_, or_, update
+
+from database import SessionLocal
+from models.invoice import (
+    Invoice,
+    EXTRACTION_PENDING,
+    EXTRACTION_PROCESSING,
+    EXTRACTION_COMPLETED,
+    EXTRACTION_FAILED,
+    EXTRACTION_BATCHED,
+)
+from utils.pdf_processor import PdfLimitError
+from utils.normalize import parse_amount
+from services.openai_service import EXTRACTION_VERSION, extract_invoice_data_with_cache_async, validate_extracted_data
+from services.document_text import load_document_text
+from services.rule_extractor import CONFIDENCE_THRESHOLD, extract_with_rules, template_store, extraction_stats
+from services.search_index import index_invoice
+from services.duplicate_detection import check_duplicate
+from services.vendor_directory import assign_vendor
+from services.data_version import bump_data_version
+from services.event_hub import event_hub
+from utils.metrics import EXTRACTION_FAILURES, EXTRACTIONS_IN_PROGRESS
+
+# Queue settings - can be tuned per deployment through environment variables
+WORKER_COUNT = int(os.getenv("EXTRACTION_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("EXTRACTION_MAX_ATTEMPTS", "5"))
+BASE_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 600
+POLL_INTERVAL_SECONDS = 5
+# A job stuck in "processing" this long belonged to a worker that died
+CLAIM_TIMEOUT_SECONDS = 900
+# Same for "batched": a Batch API job may take 24h, after that nobody is coming back for it
+BATCH_CLAIM_TIMEOUT_SECONDS = int(os.getenv("BATCH_CLAIM_TIMEOUT_HOURS", "48")) * 3600
+
+EXTRACTED_FIELDS = ("vendor", "amount", "invoice_date", "category", "currency")
+
+class ExtractionError(Exception):
+    """Raised when an extraction attempt produced nothing usable."""
+
+def enqueue_extraction(invoice):
+    """Marks an invoice as waiting for extraction. The caller commits."""
+    invoice.extraction_status = EXTRACTION_PENDING
+    invoice.extraction_attempts = 0
+    invoice.extraction_error = None
+    invoice.next_attempt_at = None
+    invoice.claimed_at = None
+
+def apply_extracted_data(invoice, extracted_data):
+    """Copies extracted fields onto the invoice, keeping existing values the AI left empty."""
+    for key in EXTRACTED_FIELDS:
+        value = extracted_data.get(key)
+        if value is None or value == "":
+            continue
+        if key == "amount" and parse_amount(value)[0] is None:
+            print(f"⚠️ Failed to convert amount: {value}")
+            continue
+        # The Invoice validators parse amount, date and currency into the typed columns
+        setattr(invoice, key, value)
+    if extracted_data.get("vendor"):
+        assign_vendor(invoice)
+
+def mark_extracted(invoice, method, duplicate_of_id=None):
+    """Records a successful extraction on the invoice: how it was done and with which prompt. The caller commits."""
+    invoice.extraction_status = EXTRACTION_COMPLETED
+    invoice.extraction_method = method
+    # Only AI answers depend on the prompt
+    invoice.prompt_version = EXTRACTION_VERSION if method in ("llm", "cache") else None
+    invoice.duplicate_of_id = duplicate_of_id
+    invoice.extraction_error = None
+    invoice.next_attempt_at = None
+    invoice.claimed_at = None
+
+def invoice_event(invoice):
+    """The data of an extraction_finished event - enough to update a list row without refetching."""
+    return {
+        "invoice_id": invoice.id,
+        "extraction_method": invoice.extraction_method,
+        "duplicate_of_id": invoice.duplicate_of_id,
+        "vendor": invoice.vendor,
+        "vendor_id": invoice.vendor_id,
+        "amount": invoice.amount,
+        "currency": invoice.currency,
+        "invoice_date": invoice.invoice_date,
+        "category": invoice.category,
+    }
+
+def retry_delay(attempts):
+    """Exponential backoff with a little jitter so retries don't arrive in lockstep."""
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay * 0.1)
+
+def _runnable_condition(now):
+    # Pending jobs whose backoff has expired, or processing and batched jobs
+    # abandoned by a dead worker or a batch run that never got ingested
+    return or_(
+        and_(
+            Invoice.extraction_status == EXTRACTION_PENDING,
+            or_(Invoice.next_attempt_at.is_(None), Invoice.next_attempt_at <= now),
+        ),
+        and_(
+            Invoice.extraction_status == EXTRACTION_PROCESSING,
+            Invoice.claimed_at < now - datetime.timedelta(seconds=CLAIM_TIMEOUT_SECONDS),
+        ),
+        and_(
+            Invoice.extraction_status == EXTRACTION_BATCHED,
+            # Rows batched before claimed_at was set for them count as abandoned
+            or_(
+                Invoice.claimed_at.is_(None),
+                Invoice.claimed_at < now - datetime.timedelta(seconds=BATCH_CLAIM_TIMEOUT_SECONDS),
+            ),
+        ),
+    )
+
+def claim_next_job():
+    """
+    Atomically claims the next runnable job. Returns (invoice_id, claimed_at),
+    or None; the worker passes claimed_at back to save_job_result.
+
+    The claim is a conditional UPDATE, so when several workers (or several
+    uvicorn processes) race for the same row only one of them wins.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        candidates = (
+            db.query(Invoice.id, Invoice.owner_id)
+            .filter(_runnable_condition(now))
+            .order_by(Invoice.id)
+            .limit(5)
+            .all()
+        )
+        for invoice_id, owner_id in candidates:
+            result = db.execute(
+                update(Invoice)
+                .where(Invoice.id == invoice_id, _runnable_condition(now))
+                .values(
+                    extraction_status=EXTRACTION_PROCESSING,
+                    claimed_at=now,
+                    extraction_attempts=Invoice.extraction_attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                # The invoice shows up as processing now, so cached lists are stale
+                bump_data_version(db, owner_id)
+            db.commit()
+            if result.rowcount == 1:
+                event_hub.publish(owner_id, "extraction_started", {"invoice_id": invoice_id})
+                return invoice_id, now
+        return None
+    finally:
+        db.close()
+
+def claim_invoice(db, invoice_id, status):
+    """
+    Claims an invoice for an extraction outside the queue (POST /extract,
+    scripts/reextract.py) if it's still in `status`, with a conditional
+    UPDATE like claim_next_job. Returns claimed_at, or None if someone else
+    has it. Commits.
+    """
+    now = datetime.datetime.utcnow()
+    result = db.execute(
+        update(Invoice)
+        .where(Invoice.id == invoice_id, Invoice.extraction_status == status)
+        .values(extraction_status=EXTRACTION_PROCESSING, claimed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        _bump_owner_version(db, invoice_id)
+    db.commit()
+    return now if result.rowcount == 1 else None
+
+def release_invoice(db, invoice_id, status, claimed_at):
+    """Puts back the status a failed claim_invoice extraction found, unless the invoice was claimed again since. Commits."""
+    result = db.execute(
+        update(Invoice)
+        .where(Invoice.id == invoice_id, Invoice.extraction_status == EXTRACTION_PROCESSING, Invoice.claimed_at == claimed_at)
+        .values(extraction_status=status, claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        _bump_owner_version(db, invoice_id)
+    db.commit()
+
+def _bump_owner_version(db, invoice_id):
+    owner_id = db.query(Invoice.owner_id).filter(Invoice.id == invoice_id).scalar()
+    bump_data_version(db, owner_id)
+
+def _record_failure(db, invoice, error):
+    # Returns the extraction_failed event; the caller commits and publishes it.
+    # Missing files and PDFs that broke the parser limits will never succeed,
+    # everything else gets retried with backoff
+    retryable = not isinstance(error, (FileNotFoundError, PdfLimitError))
+    invoice.extraction_error = str(error)[:500]
+    invoice.claimed_at = None
+    retrying = retryable and invoice.extraction_attempts < MAX_ATTEMPTS
+    EXTRACTION_FAILURES.inc(final=str(not retrying).lower())
+    if retrying:
+        delay = retry_delay(invoice.extraction_attempts)
+        invoice.extraction_status = EXTRACTION_PENDING
+        invoice.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        print(f"⚠️ Extraction attempt {invoice.extraction_attempts} failed for invoice {invoice.id}, retrying in {delay:.0f}s: {error}")
+    else:
+        invoice.extraction_status = EXTRACTION_FAILED
+        invoice.next_attempt_at = None
+        print(f"❌ Extraction failed for invoice {invoice.id} after {invoice.extraction_attempts} attempts: {error}")
+    bump_data_version(db, invoice.owner_id)
+    return {
+        "invoice_id": invoice.id,
+        "error": invoice.extraction_error,
+        "retrying": retrying,  # False once the job has given up
+    }
+
+def _load_file(invoice_id):
+    # (file_path, content_hash, owner_id), or None if the invoice is gone
+    db = SessionLocal()
+    try:
+        return db.query(Invoice.file_path, Invoice.content_hash, Invoice.owner_id).filter(Invoice.id == invoice_id).first()
+    finally:
+        db.close()
+
+def _still_claimed(db, invoice_id, claimed_status, claimed_at):
+    # A no-op conditional UPDATE in the same transaction as the result, so
+    # the check and the write happen together: a worker re-claiming the row
+    # after this waits for our commit and then misses
+    conditions = [Invoice.id == invoice_id, Invoice.extraction_status == claimed_status]
+    if claimed_at is not None:
+        conditions.append(Invoice.claimed_at == claimed_at)
+    result = db.execute(
+        update(Invoice).where(*conditions).values(claimed_at=Invoice.claimed_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def save_job_result(invoice_id, extracted_data=None, error=None, method=None, duplicate_of_id=None,
+                    claimed_status=None, claimed_at=None):
+    """
+    Saves the outcome of one extraction attempt: the extracted fields or the failure.
+
+    With claimed_status (and claimed_at, when the claimer knows it) the result
+    is only saved if the invoice is still in that claim. A job that timed out
+    and was claimed again belongs to the new claimer, so a late result from
+    the first one is dropped. Returns whether the result was saved.
+    """
+    db = SessionLocal()
+    try:
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        if invoice is None:
+            return False  # Deleted while we were working on it
+        owner_id = invoice.owner_id
+        # The invoice changes stay unflushed until after the claim check, which
+        # has to see the row as the claimer left it
+        with db.no_autoflush:
+            if error is not None:
+                event_type, event = "extraction_failed", _record_failure(db, invoice, error)
+            else:
+                # Saves a new vendor in its own transaction, so it goes before the claim check
+                apply_extracted_data(invoice, extracted_data)
+                mark_extracted(invoice, method, duplicate_of_id)
+                # The vendor and category are searchable, and the PDF text is stored by now
+                index_invoice(db, invoice)
+                # Dashboards polling with an ETag see the new fields on their next request
+                bump_data_version(db, owner_id)
+                event_type, event = "extraction_finished", invoice_event(invoice)
+
+            if claimed_status is not None and not _still_claimed(db, invoice_id, claimed_status, claimed_at):
+                db.rollback()
+                print(f"⏭️ Dropped a late result for invoice {invoice_id}: it was claimed again")
+                return False
+        db.commit()
+        event_hub.publish(owner_id, event_type, event)
+        return True
+    finally:
+        db.close()
+
+async def extract_invoice_fields(invoice_text, invoice_id, owner_id):
+    """
+    Extracts fields from invoice text, trying the owner's vendor templates
+    before OpenAI. Returns (extracted_data, method) where method is
+    "rules", "cache" or "llm".
+    """
+    started = time.perf_counter()
+
+    templates = await asyncio.to_thread(template_store.all, owner_id)
+    extracted_data, confidence = extract_with_rules(invoice_text, templates)
+    if extracted_data is not None and confidence >= CONFIDENCE_THRESHOLD:
+        extraction_stats.record("rules", time.perf_counter() - started)
+        print(f"⚡ Extracted invoice {invoice_id} with vendor rules (confidence {confidence:.2f})")
+        return extracted_data, "rules"
+
+    extracted_data, token_count = await extract_invoice_data_with_cache_async(invoice_text, invoice_id)
+    # Cache hits come back with a token count of 0, API calls always bill some
+    method = "cache" if token_count == 0 else "llm"
+    extraction_stats.record(method, time.perf_counter() - started)
+
+    # Fresh AI answers teach the templates (the text has to back them up, see learn_labels)
+    if method == "llm" and validate_extracted_data(extracted_data):
+        await asyncio.to_thread(template_store.learn, owner_id, invoice_text, extracted_data)
+    return extracted_data, method
+
+async def process_job(invoice_id, claimed_at):
+    """
+    Runs PDF parsing and extraction (vendor rules, then AI) for one claimed invoice.
+
+    PDF parsing runs in the PDF process pool (only the first time a file is
+    seen), DB access in threads, and the OpenAI call is async and goes
+    through the shared rate limiter. Results are saved only while the
+    claim made at claimed_at still holds.
+    """
+    claim = {"claimed_status": EXTRACTION_PROCESSING, "claimed_at": claimed_at}
+    stored_file = await asyncio.to_thread(_load_file, invoice_id)
+    if stored_file is None:
+        return
+    file_path, content_hash, owner_id = stored_file
+
+    try:
+        # Parsed once per file; retries and re-extractions read the stored text
+        invoice_text = await load_document_text(file_path, content_hash)
+        if not invoice_text:
+            raise ExtractionError("No text could be extracted from the PDF")
+
+        # A re-sent copy of an earlier invoice takes its fields without any extraction
+        started = time.perf_counter()
+        duplicate = await asyncio.to_thread(check_duplicate, invoice_id, invoice_text)
+        if duplicate is not None:
+            extraction_stats.record("duplicate", time.perf_counter() - started)
+            print(f"♻️ Invoice {invoice_id} is a copy of invoice {duplicate.invoice_id} ({duplicate.distance} bits apart)")
+            await asyncio.to_thread(
+                save_job_result, invoice_id, duplicate.fields, method="duplicate", duplicate_of_id=duplicate.invoice_id,
+                **claim
+            )
+            return
+
+        extracted_data, method = await extract_invoice_fields(invoice_text, invoice_id, owner_id)
+        if all(extracted_data.get(key) is None for key in EXTRACTED_FIELDS):
+            raise ExtractionError("AI extraction returned no fields")
+    except Exception as e:
+        await asyncio.to_thread(save_job_result, invoice_id, error=e, **claim)
+        return
+
+    await asyncio.to_thread(save_job_result, invoice_id, extracted_data, method=method, **claim)
+
+class ExtractionWorkerPool:
+    """
+    A fixed number of asyncio tasks that pull jobs from the invoices table.
+
+    The blocking work (PDF parsing, DB writes) runs in threads and the
+    OpenAI call is async, so the event loop keeps serving requests. The
+    worker count is the upper bound on concurrent extractions.
+    """
+
+    def __init__(self, worker_count=WORKER_COUNT):
+        self.worker_count = worker_count
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wakes idle workers right away instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                claimed = await asyncio.to_thread(claim_next_job)
+            except Exception as e:
+                print(f"❌ Could not claim extraction job: {e}")
+                claimed = None
+
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            invoice_id, claimed_at = claimed
+            try:
+                with EXTRACTIONS_IN_PROGRESS.track():
+                    await process_job(invoice_id, claimed_at)
+            except Exception as e:
+                print(f"❌ Extraction worker crashed on invoice {invoice_id}: {e}")
+
+# Shared pool, started and stopped by the app lifespan in main.py
+worker_pool = ExtractionWorkerPool()
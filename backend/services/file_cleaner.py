@@ -0,0 +1,86 @@
+# backend/services/file_cleaner.py
+
+import asyncio
+
+from database import SessionLocal
+from utils.file_storage import RECENT_UPLOAD_SECONDS, RELEASE_RECENT, release_file
+
+# Deleting an invoice used to remove its PDF inside the request, which is
+# blocking disk I/O on the event loop and one more thing a bulk delete has
+# to wait for. Now the routes hand (content_hash, file_path) pairs to this
+# cleaner once their transaction is committed, and a background task
+# removes the files that no invoice references anymore.
+#
+# Every file is counted again right before it's removed, and files whose
+# content was uploaded again in the last RECENT_UPLOAD_SECONDS are put back
+# in the queue for later rather than removed (utils/file_storage.py).
+#
+# The queue lives in memory: files queued when the process dies stay on
+# disk but are harmless, since nothing points at them.
+
+def _release(files):
+    # Returns the files to try again later
+    retry = []
+    db = SessionLocal()
+    try:
+        for content_hash, file_path in files:
+            db.rollback()  # No snapshot left over from the previous file
+            try:
+                if release_file(db, content_hash, file_path) == RELEASE_RECENT:
+                    retry.append((content_hash, file_path))
+            except OSError as e:
+                print(f"⚠️ Could not delete {file_path}: {e}")
+    finally:
+        db.close()
+    return retry
+
+class FileCleaner:
+    """A background task that deletes stored files of deleted invoices."""
+
+    def __init__(self):
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Finish what's queued; files waiting to be tried again stay on disk as harmless orphans
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    def schedule(self, files):
+        """Queues (content_hash, file_path) pairs. Call after the invoice rows are committed."""
+        files = list(dict.fromkeys((content_hash, file_path) for content_hash, file_path in files if file_path))
+        if not files:
+            return
+        if self._queue is None:
+            # Not running inside the app (scripts, tests) - just do it now; recent ones stay on disk
+            _release(files)
+            return
+        self._queue.put_nowait(files)
+
+    def _requeue(self, files):
+        if self._queue is not None:  # Dropped when the app stopped in the meantime
+            self._queue.put_nowait(files)
+
+    async def _run(self):
+        while True:
+            files = await self._queue.get()
+            try:
+                retry = await asyncio.to_thread(_release, files)
+                if retry:
+                    asyncio.get_running_loop().call_later(RECENT_UPLOAD_SECONDS, self._requeue, retry)
+            except Exception as e:
+                print(f"❌ File cleanup failed: {e}")
+            finally:
+                self._queue.task_done()
+
+# Started and stopped by the app lifespan in main.py
+file_cleaner = FileCleaner()
@@ -0,0 +1,164 @@
+# backend/services/invoice_export.py
+
+import io
+import csv
+import json
+import datetime
+from sqlalchemy import select
+
+from database import SessionLocal
+from models.invoice import Invoice
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # Parquet exports need it, CSV and NDJSON don't
+
+# Bulk exports for GET /invoices/export. Rows are read in batches of
+# EXPORT_BATCH_ROWS from a streaming cursor and each batch is encoded and
+# sent before the next one is fetched, so memory stays flat whether the
+# export has a hundred rows or millions. Plain column tuples are read instead
+# of Invoice objects - no ORM bookkeeping per row.
+
+EXPORT_BATCH_ROWS = 5000
+
+EXPORT_FORMATS = {
+    # format -> (media type, file extension)
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Exported columns, in order - the same fields as the invoice API returns
+EXPORT_COLUMNS = (
+    Invoice.id,
+    Invoice.file_name,
+    Invoice.upload_date,
+    Invoice.vendor,
+    Invoice.vendor_id,
+    Invoice.amount,
+    Invoice.currency,
+    Invoice.invoice_date,
+    Invoice.category,
+    Invoice.extraction_status,
+    Invoice.duplicate_of_id,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+class ExportUnavailable(Exception):
+    """The requested format needs a package that isn't installed."""
+
+def check_format(export_format):
+    if export_format == "parquet" and pyarrow is None:
+        raise ExportUnavailable("Parquet exports need pyarrow - pip install pyarrow")
+
+def export_query(owner_id):
+    """Every exported column of the owner's invoices, before filters, in list order."""
+    return select(*EXPORT_COLUMNS).where(Invoice.owner_id == owner_id)
+
+def _batches(statement):
+    # Its own session: the response is still streaming long after the request's get_db session would close
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            statement.order_by(Invoice.upload_date, Invoice.id).execution_options(yield_per=EXPORT_BATCH_ROWS)
+        )
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def _ndjson_chunks(batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_json_value) + "\n" for row in rows
+        ).encode()
+
+class _ChunkSink:
+    # A write-only file for the Parquet writer that hands back what was written so far
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("file_name", pyarrow.string()),
+        ("upload_date", pyarrow.timestamp("us")),
+        ("vendor", pyarrow.string()),
+        ("vendor_id", pyarrow.int64()),
+        ("amount", pyarrow.float64()),
+        ("currency", pyarrow.string()),
+        ("invoice_date", pyarrow.string()),
+        ("category", pyarrow.string()),
+        ("extraction_status", pyarrow.string()),
+        ("duplicate_of_id", pyarrow.int64()),
+    ])
+
+def _parquet_chunks(batches):
+    # One row group per batch, sent as soon as it's written; the footer comes last
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pyarrow.record_batch(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+def stream_export(statement, export_format):
+    """
+    Yields the rows of `statement` (from export_query, filters applied) as
+    chunks of a CSV, NDJSON or Parquet file. A plain generator - Starlette
+    runs it in the threadpool, so the blocking reads stay off the event loop.
+    """
+    encoders = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}
+    return encoders[export_format](_batches(statement))
@@ -1,21 +1,77 @@
 # backend/services/openai_service.py
 
 import os
+import re
 import json
+import time
+import random
+import asyncio
 import hashlib
 import datetime
-from dotenv import load_dotenv
-from openai import OpenAI
+from email.utils import parsedate_to_datetime
 
-# Load environment variables
-load_dotenv()
+from services.extraction_cache import extraction_cache
+from services.rate_limiter import RateLimiter
+from services.prompt_compaction import COMPACTION_SETTINGS, estimate_tokens, prepare_invoice_text
+from services.usage_ledger import usage_ledger
+from utils.metrics import LLM_CALL_SECONDS, LLM_REQUESTS_IN_FLIGHT, LLM_WAIT_SECONDS
 
-# Set up OpenAI client with API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# The OpenAI clients are built on first use: importing the SDK takes longer
+# than the rest of the app's startup, and most processes (auth-only
+# workers, tests, scripts that never call the API) don't need it. Tests may
+# assign their own client to async_client.
+client = None
+async_client = None
 
-# Ensure cache and logs directories exist
-os.makedirs("cache", exist_ok=True)
-os.makedirs("logs", exist_ok=True)
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return client
+
+def get_async_client():
+    global async_client
+    if async_client is None:
+        # Retries are handled below so they can respect our shared rate limits.
+        # OPENAI_BASE_URL points it at a stub server in tests.
+        from openai import AsyncOpenAI
+        async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return async_client
+
+# Shared limits for every async OpenAI call in this process
+rate_limiter = RateLimiter(
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+    requests_per_minute=int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "90000")),
+)
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+BASE_RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 60.0
+MAX_COMPLETION_TOKENS = 300
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = """
+        You are an AI assistant that extracts key information from invoices.
+        Extract the following fields:
+        - Vendor name (the company issuing the invoice)
+        - Amount (the total amount due in numeric format without currency symbols)
+        - Date (in YYYY-MM-DD format)
+        - Category (one of: Services, Supplies, Utilities, Equipment, Travel, Consulting, Other)
+        - Currency (the ISO 4217 code of the amount, e.g. USD, EUR, GBP)
+
+        Format your response as a JSON object with fields: vendor, amount, invoice_date, category, currency.
+        Only respond with the JSON object, nothing else.
+        """
+
+# Changes whenever the prompt text changes, so old cached answers aren't reused
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.strip().encode()).hexdigest()[:12]
+# Stored on invoices the AI extracted, so a new prompt or model can be backfilled (scripts/reextract.py)
+EXTRACTION_VERSION = f"{OPENAI_MODEL}:{PROMPT_VERSION}"
+# Part of the cache key: answers to other prompts (several invoices per
+# request in services/batch_extraction.py) are cached apart from these
+SINGLE_PROMPT_MODE = "single"
 
 def validate_extracted_data(data):
     """Ensure the extracted data contains all required fields in correct types."""
@@ -28,36 +84,51 @@ def validate_extracted_data(data):
         "category" in data and isinstance(data["category"], str)
     )
 
-def extract_invoice_data(invoice_text):
-    try:
-        system_prompt = """
-        You are an AI assistant that extracts key information from invoices.
-        Extract the following fields:
-        - Vendor name (the company issuing the invoice)
-        - Amount (the total amount due in numeric format without currency symbols)
-        - Date (in YYYY-MM-DD format)
-        - Category (one of: Services, Supplies, Utilities, Equipment, Travel, Consulting, Other)
+def build_messages(invoice_text, compact=None):
+    # Long invoices are cut down to their useful lines first (see prompt_compaction.py)
+    invoice_text = prepare_invoice_text(invoice_text, compact)
+    user_prompt = f"Extract information from this invoice:\n\n{invoice_text}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": user_prompt.strip()}
+    ]
 
-        Format your response as a JSON object with fields: vendor, amount, invoice_date, category.
-        Only respond with the JSON object, nothing else.
-        """
+def usage_of(response, messages):
+    """Prompt and completion tokens the API billed for a response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        # Some proxies drop usage - fall back to an estimate rather than claiming it was free
+        return {
+            "prompt_tokens": estimate_tokens("".join(message["content"] for message in messages)),
+            "completion_tokens": estimate_tokens(response.choices[0].message.content or ""),
+        }
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
 
-        user_prompt = f"Extract information from this invoice:\n\n{invoice_text}"
+NO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0}
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            temperature=0.3,
-            max_tokens=300
-        )
+def extract_invoice_data(invoice_text):
+    try:
+        messages = build_messages(invoice_text)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            with LLM_REQUESTS_IN_FLIGHT.track():
+                response = get_client().chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=MAX_COMPLETION_TOKENS
+                )
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
 
         result_text = response.choices[0].message.content.strip()
         print("🧠 RAW OpenAI RESPONSE:\n", result_text)
 
-        return json.loads(result_text), len(result_text.split())  # returning token count estimate
+        return json.loads(result_text), usage_of(response, messages)
 
     except Exception as e:
         print(f"❌ Error extracting data with OpenAI:\n\n{e}")
@@ -65,39 +136,170 @@ def extract_invoice_data(invoice_text):
             "vendor": None,
             "amount": None,
             "invoice_date": None,
-            "category": None
-        }, 0
+            "category": None,
+            "currency": None
+        }, NO_USAGE
+
+def retry_after_seconds(error):
+    """Reads Retry-After (or OpenAI's retry-after-ms) from an API error, if present."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+def backoff_seconds(attempt):
+    # "Full jitter" exponential backoff
+    return random.uniform(0, min(MAX_RETRY_SECONDS, BASE_RETRY_SECONDS * 2 ** attempt))
+
+def retryable_errors(openai):
+    # Errors worth retrying: rate limits, timeouts, dropped connections and 5xx
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+async def _timed_completion(messages, max_tokens):
+    # Times only the API call - waiting for the limits is measured separately
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        with LLM_REQUESTS_IN_FLIGHT.track():
+            return await get_async_client().chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
+    except Exception as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+async def chat_completion_async(messages, max_tokens=MAX_COMPLETION_TOKENS):
+    """
+    Sends one chat completion through the process-wide rate limiter.
+    Retries rate limits and transient errors with jittered exponential
+    backoff (or the server's Retry-After) and raises if every attempt fails.
+    """
+    import openai  # Loaded on first use, like the clients
+    estimated = estimate_tokens("".join(message["content"] for message in messages)) + max_tokens
+
+    for attempt in range(MAX_RETRIES + 1):
+        with LLM_WAIT_SECONDS.time():
+            await rate_limiter.wait_for_budget(estimated)
+        try:
+            async with rate_limiter.slot():
+                response = await _timed_completion(messages, max_tokens)
+        except retryable_errors(openai) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff_seconds(attempt)
+            if isinstance(e, openai.RateLimitError):
+                # Hold back every caller, not just this one
+                rate_limiter.pause(delay)
+            print(f"⏳ OpenAI {type(e).__name__}, retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        # Settle the token bucket with what the call actually used
+        if response.usage is not None:
+            rate_limiter.tokens.adjust(response.usage.total_tokens - estimated)
+        return response
+
+async def extract_invoice_data_async(invoice_text, compact=None):
+    """
+    Async version of extract_invoice_data that shares the process-wide
+    rate limiter. Raises if the API keeps failing, so callers can tell a
+    failure from an empty invoice. Returns (data, usage).
+    """
+    messages = build_messages(invoice_text, compact)
+    response = await chat_completion_async(messages)
+    result_text = response.choices[0].message.content.strip()
+    return json.loads(result_text), usage_of(response, messages)
+
+def extraction_cache_key(invoice_text, prompt_mode=SINGLE_PROMPT_MODE):
+    """
+    Cache key for an invoice's text: the same text, prompt, model and
+    compaction settings always give the same key, no matter which invoice
+    or user it came from.
+    """
+    normalized = re.sub(r"\s+", " ", invoice_text).strip()
+    text_hash = hashlib.sha256(normalized.encode()).hexdigest()
+    return f"{EXTRACTION_VERSION}:{prompt_mode}:{COMPACTION_SETTINGS}:{text_hash}"
 
 def extract_invoice_data_with_cache(invoice_text, invoice_id):
     """
     Extracts invoice data, using a cache to avoid repeated API calls.
     """
-    text_hash = hashlib.md5(invoice_text.encode()).hexdigest()
-    cache_file = os.path.join("cache", f"{invoice_id}_{text_hash[:10]}.json")
+    cache_key = extraction_cache_key(invoice_text)
 
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, "r") as f:
-                print(f"🧠 Using cached result for invoice {invoice_id}")
-                return json.load(f), 0
-        except json.JSONDecodeError:
-            print(f"⚠️ Corrupt cache for invoice {invoice_id}, re-extracting...")
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        print(f"🧠 Using cached result for invoice {invoice_id}")
+        usage_ledger.record(invoice_id, OPENAI_MODEL, cache_status="hit")
+        return cached, 0
 
-    extracted_data, token_count = extract_invoice_data(invoice_text)
+    started = time.perf_counter()
+    extracted_data, usage = extract_invoice_data(invoice_text)
+    latency = time.perf_counter() - started
 
-    with open(cache_file, "w") as f:
-        json.dump(extracted_data, f)
+    # Don't cache failed calls, otherwise a retry would just replay the failure
+    if any(value is not None for value in extracted_data.values()):
+        extraction_cache.set(cache_key, extracted_data)
+        print(f"💾 Cached result for invoice {invoice_id}")
 
-    print(f"💾 Cached result for invoice {invoice_id}")
-    log_api_usage(invoice_id, token_count, success=bool(extracted_data["vendor"]))
-    return extracted_data, token_count
+    usage_ledger.record(
+        invoice_id, OPENAI_MODEL, usage["prompt_tokens"], usage["completion_tokens"], latency,
+        success=bool(extracted_data["vendor"])
+    )
+    return extracted_data, usage["prompt_tokens"] + usage["completion_tokens"]
 
-def log_api_usage(invoice_id, token_count, success):
+async def extract_invoice_data_with_cache_async(invoice_text, invoice_id, refresh=False):
     """
-    Logs API usage to a local file for cost tracking and debugging.
+    Async version of extract_invoice_data_with_cache. Errors from the API
+    are raised instead of turning into an all-None result. With refresh
+    the cached answer is skipped and replaced by the new one.
     """
-    timestamp = datetime.datetime.now().isoformat()
-    log_entry = f"{timestamp},{invoice_id},{token_count},{'success' if success else 'fail'}\n"
+    cache_key = extraction_cache_key(invoice_text)
 
-    with open("logs/openai_usage.log", "a") as f:
-        f.write(log_entry)
+    # The cache is SQLite, so keep its I/O off the event loop
+    cached = None if refresh else await asyncio.to_thread(extraction_cache.get, cache_key)
+    if cached is not None:
+        print(f"🧠 Using cached result for invoice {invoice_id}")
+        usage_ledger.record(invoice_id, OPENAI_MODEL, cache_status="hit")
+        return cached, 0
+
+    # Latency includes waiting for the rate limits and retries - what the invoice actually waited
+    started = time.perf_counter()
+    try:
+        extracted_data, usage = await extract_invoice_data_async(invoice_text)
+    except Exception:
+        usage_ledger.record(invoice_id, OPENAI_MODEL, latency=time.perf_counter() - started, success=False)
+        raise
+    latency = time.perf_counter() - started
+
+    if any(value is not None for value in extracted_data.values()):
+        await asyncio.to_thread(extraction_cache.set, cache_key, extracted_data)
+        print(f"💾 Cached result for invoice {invoice_id}")
+
+    usage_ledger.record(
+        invoice_id, OPENAI_MODEL, usage["prompt_tokens"], usage["completion_tokens"], latency,
+        success=bool(extracted_data.get("vendor"))
+    )
+    return extracted_data, usage["prompt_tokens"] + usage["completion_tokens"]
@@ -0,0 +1,122 @@
+# backend/services/prompt_compaction.py
+
+import os
+import re
+
+from utils.normalize import AMOUNT_TOKEN, DATE_TOKEN
+
+# Trims invoice text down to the parts the model needs before it goes into
+# the prompt. Multi-page invoices often carry pages of terms and conditions,
+# repeated page headers and long item lists; none of that helps find the
+# vendor, total, date or category, but all of it costs input tokens.
+#
+# Every line gets a score (header, totals, dates and money count, boilerplate
+# doesn't), neighbours of strong lines get some of their score so labels on
+# the line above a value come along, and the best lines are kept in their
+# original order until the token budget is used up.
+
+COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION", "1") != "0"
+# Rough input tokens per invoice; text under the budget is sent as is
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "800"))
+
+# The vendor's name and address are almost always at the top
+HEADER_LINES = 12
+# Marks where lines were left out, so the model doesn't read two blocks as one
+GAP_MARKER = "[...]"
+# Compaction that keeps less than this sends the start of the original text instead
+MIN_COMPACTED_TOKENS = 50
+# Bump when the scoring changes what gets kept
+COMPACTION_REVISION = 2
+# Part of the extraction cache key: the same text compacted differently is a different prompt
+COMPACTION_SETTINGS = f"c{COMPACTION_REVISION}-{PROMPT_TOKEN_BUDGET}" if COMPACTION_ENABLED else "full"
+
+TOTAL_WORDS = re.compile(r"\b(total|amount due|balance due|amount payable|grand total)\b", re.IGNORECASE)
+FIELD_WORDS = re.compile(
+    r"\b(invoice|bill to|sold to|remit|from|vendor|supplier|tax|vat|gst|amount|balance|due|date|issued|currency|payment)\b",
+    re.IGNORECASE,
+)
+BOILERPLATE_WORDS = re.compile(
+    r"\b(terms|conditions|liabilit\w*|warrant\w*|indemn\w*|governing law|jurisdiction|arbitration"
+    r"|confidential\w*|privacy|hereby|herein|thereof|shall|page \d+ of \d+)\b",
+    re.IGNORECASE,
+)
+# Lines longer than this are usually prose
+PROSE_LENGTH = 120
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English text - used for budgets and rate limiting
+    return len(text) // 4 + 1
+
+def score_line(index, line):
+    """How likely a line is to hold the vendor, total, date or category."""
+    score = 0.0
+    if index < HEADER_LINES:
+        score += 3
+    if TOTAL_WORDS.search(line):
+        score += 4
+    if AMOUNT_TOKEN.search(line):
+        score += 2
+    if DATE_TOKEN.search(line):
+        score += 2
+    if FIELD_WORDS.search(line):
+        score += 1
+    if BOILERPLATE_WORDS.search(line):
+        score -= 3
+    if len(line) > PROSE_LENGTH:
+        score -= 2
+    return score
+
+def compact_invoice_text(invoice_text, budget=PROMPT_TOKEN_BUDGET):
+    """Returns the invoice text cut down to roughly `budget` tokens of its most useful lines."""
+    if estimate_tokens(invoice_text) <= budget:
+        return invoice_text
+
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in invoice_text.splitlines()]
+    lines = [line for line in lines if line]
+
+    scores = [score_line(i, line) for i, line in enumerate(lines)]
+    # A label is often on the line above its value (or the other way round)
+    blocks = [
+        max(score, 0.5 * max(scores[i - 1] if i > 0 else 0, scores[i + 1] if i + 1 < len(scores) else 0))
+        for i, score in enumerate(scores)
+    ]
+
+    kept = {}  # line index -> the text sent for it
+    seen = set()
+    used = 0
+    # Best lines first; earlier lines win ties since headers and first-page totals matter most
+    for i in sorted(range(len(lines)), key=lambda i: (-blocks[i], i)):
+        if blocks[i] <= 0:
+            break
+        # Page headers and footers repeat on every page
+        if lines[i] in seen:
+            continue
+        text = lines[i]
+        if used + estimate_tokens(text) > budget:
+            # A useful line that doesn't fit is cut to what's left rather than dropped,
+            # otherwise one huge line (a PDF without line breaks) leaves nothing at all
+            text = text[:(budget - used - 1) * 4]
+            if not text:
+                continue
+        kept[i] = text
+        seen.add(lines[i])
+        used += estimate_tokens(text)
+
+    # Nothing (or hardly anything) scored well, e.g. pages of terms - the
+    # start of the invoice is a better prompt than an empty one
+    if used < min(MIN_COMPACTED_TOKENS, budget):
+        return invoice_text[:budget * 4]
+
+    compacted = []
+    for i, line in enumerate(lines):
+        if i in kept:
+            compacted.append(kept[i])
+        elif compacted and compacted[-1] != GAP_MARKER:
+            compacted.append(GAP_MARKER)
+    return "\n".join(compacted)
+
+def prepare_invoice_text(invoice_text, enabled=None):
+    """The text that goes into the prompt: compacted unless PROMPT_COMPACTION=0."""
+    if enabled is None:
+        enabled = COMPACTION_ENABLED
+    return compact_invoice_text(invoice_text) if enabled else invoice_text
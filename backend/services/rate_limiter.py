@@ -0,0 +1,92 @@
+# backend/services/rate_limiter.py
+
+import time
+import asyncio
+import weakref
+
+def _for_running_loop(primitives, factory):
+    # primitives is a WeakKeyDictionary {loop: asyncio primitive}. A lock
+    # that ever made a task wait keeps a reference to its loop, so that key
+    # never dies on its own - closed loops are dropped when a new one shows up.
+    loop = asyncio.get_running_loop()
+    primitive = primitives.get(loop)
+    if primitive is None:
+        for closed in [other for other in primitives if other.is_closed()]:
+            del primitives[closed]
+        primitive = primitives[loop] = factory()
+    return primitive
+
+class TokenBucket:
+    """
+    Async token bucket. Holds up to `capacity` tokens and refills at
+    `rate_per_minute`. acquire(n) waits until n tokens are available.
+
+    Used for both of OpenAI's limits: one bucket counts requests per minute,
+    another counts tokens per minute.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        # One per event loop, created on first use inside it; weak so a closed loop can be collected
+        self._locks = weakref.WeakKeyDictionary()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def _lock(self):
+        # Like RateLimiter's semaphores - an asyncio.Lock only works in the loop it was first used in
+        return _for_running_loop(self._locks, asyncio.Lock)
+
+    async def acquire(self, amount=1):
+        # Requests bigger than the bucket would wait forever - let them through when it is full
+        amount = min(amount, self.capacity)
+        # The lock keeps waiters in FIFO order so big requests don't starve
+        async with self._lock():
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate_per_second)
+
+    def adjust(self, amount):
+        """Charges (positive) or refunds (negative) tokens once the real usage is known."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    def pause(self, seconds):
+        """Empties the bucket so nothing more is sent for roughly `seconds` (after a 429)."""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate_per_second)
+
+class RateLimiter:
+    """
+    Concurrency cap plus requests-per-minute and tokens-per-minute buckets,
+    shared by every caller in the process.
+    """
+
+    def __init__(self, max_concurrency, requests_per_minute, tokens_per_minute):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._semaphores = weakref.WeakKeyDictionary()  # One per event loop, like TokenBucket._locks
+
+    def _semaphore(self):
+        # asyncio primitives belong to one event loop; tests and CLIs may run several
+        return _for_running_loop(self._semaphores, lambda: asyncio.Semaphore(self.max_concurrency))
+
+    def slot(self):
+        """Async context manager that holds one of the concurrent request slots."""
+        return self._semaphore()
+
+    async def wait_for_budget(self, estimated_tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def pause(self, seconds):
+        self.requests.pause(seconds)
@@ -0,0 +1,297 @@
+# backend/services/rule_extractor.py
+
+import os
+import re
+import time
+import threading
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.vendor_template import VendorTemplate
+from utils.normalize import AMOUNT_TOKEN, DATE_TOKEN, parse_amount, parse_invoice_date
+from utils.metrics import EXTRACTION_SECONDS
+
+# Local extraction for recurring vendors. Most of our invoices come from a few
+# dozen vendors whose layouts never change, so once we've seen a vendor a
+# couple of times we know which line holds the total and which the date.
+# This runs before OpenAI and only answers when it's confident enough.
+
+CONFIDENCE_THRESHOLD = float(os.getenv("RULE_CONFIDENCE_THRESHOLD", "0.9"))
+# A template is only used after this many extractions agreed with it
+MIN_CONFIRMATIONS = int(os.getenv("RULE_MIN_CONFIRMATIONS", "2"))
+# The vendor's name has to show up in the first lines of the invoice
+HEADER_LINES = 15
+# Templates are cached per process; reloading picks up ones learned by other workers
+TEMPLATE_RELOAD_SECONDS = 60
+
+# Generic labels, used to double-check what a template found
+TOTAL_LABEL = re.compile(r"\b(total|amount due|balance due|amount payable)\b")
+SUBTOTAL_LABEL = re.compile(r"\bsub\s*-?\s*total\b")
+DATE_LABEL = re.compile(r"\b(date|issued|dated)\b")
+DUE_LABEL = re.compile(r"\bdue\b")
+
+def _lines(text):
+    return [re.sub(r"\s+", " ", line).strip() for line in text.splitlines() if line.strip()]
+
+def _normalize_label(text):
+    # Last few words before the value, minus anything with digits (invoice numbers, dates)
+    words = [word.strip(":#-–|*.,()") for word in text.lower().split()]
+    words = [word for word in words if word and not any(char.isdigit() for char in word)]
+    return " ".join(words[-4:])
+
+def labeled_values(lines, token_pattern):
+    """
+    Lists (label, token) for every value in the text. The label is the text
+    just before the value, or the line above when the value sits on its own line.
+    """
+    found = []
+    for i, line in enumerate(lines):
+        for match in token_pattern.finditer(line):
+            label = _normalize_label(line[:match.start()])
+            if not label and i > 0:
+                label = _normalize_label(lines[i - 1])
+            found.append((label, match.group(0)))
+    return found
+
+def _is_total(label):
+    return bool(TOTAL_LABEL.search(label)) and not SUBTOTAL_LABEL.search(label)
+
+def _is_invoice_date(label):
+    return bool(DATE_LABEL.search(label)) and not DUE_LABEL.search(label)
+
+def _pick(values, accept, last):
+    matches = [token for label, token in values if accept(label)]
+    if not matches:
+        return None
+    return matches[-1] if last else matches[0]
+
+def _pick_label(labels, preferred, last):
+    # Labels that look like a total (or an invoice date) beat any other line with the same value
+    labels = [label for label in labels if label]
+    if not labels:
+        return None
+    labels = [label for label in labels if preferred(label)] or labels
+    return labels[-1] if last else labels[0]
+
+def _header(lines):
+    return " ".join(lines[:HEADER_LINES]).lower()
+
+def _mentions(header, vendor):
+    # Whole words only, so "Acme" doesn't match "Acmeline". Lookarounds instead
+    # of \b because names can end in punctuation ("Acme Inc.")
+    return re.search(rf"(?<!\w){re.escape(vendor.lower())}(?!\w)", header) is not None
+
+def find_template(lines, templates):
+    """The confirmed template whose vendor name appears in the invoice header, if any."""
+    header = _header(lines)
+    candidates = [
+        template for template in templates
+        if template.confirmations >= MIN_CONFIRMATIONS and template.vendor and _mentions(header, template.vendor)
+    ]
+    if not candidates:
+        return None
+    # "Acme Tools Ltd" should win over "Acme"
+    return max(candidates, key=lambda template: (len(template.vendor), template.confirmations))
+
+def extract_with_rules(invoice_text, templates):
+    """
+    Extracts an invoice with a vendor template. Returns (data, confidence);
+    data is None when no template fits or the total or date can't be found.
+
+    Confidence adds up what we could verify: the vendor was recognised, the
+    total and date were found next to the template's labels, the generic
+    "Total" / "Date" rules agree, and how often the template was confirmed.
+    """
+    lines = _lines(invoice_text)
+    template = find_template(lines, templates)
+    if template is None:
+        return None, 0.0
+    confidence = 0.4
+
+    amounts = labeled_values(lines, AMOUNT_TOKEN)
+    labeled_amount = _pick(amounts, lambda label: label == template.amount_label, last=True)
+    generic_amount = _pick(amounts, _is_total, last=True)
+    cents, currency = parse_amount(labeled_amount or generic_amount)
+    if cents is None:
+        return None, confidence
+    if labeled_amount is None:
+        confidence += 0.15
+    elif generic_amount is not None and parse_amount(generic_amount)[0] != cents:
+        confidence += 0.1  # The template and the generic rule disagree
+    else:
+        confidence += 0.3
+
+    dates = labeled_values(lines, DATE_TOKEN)
+    labeled_date = _pick(dates, lambda label: label == template.date_label, last=False)
+    generic_date = _pick(dates, _is_invoice_date, last=False)
+    issued_on = parse_invoice_date(labeled_date or generic_date)
+    if issued_on is None:
+        return None, confidence
+    confidence += 0.2 if labeled_date is not None else 0.1
+
+    confidence += 0.1 * min(template.confirmations, 5) / 5
+
+    data = {
+        "vendor": template.vendor,
+        "amount": cents / 100,
+        "invoice_date": issued_on.isoformat(),
+        "category": template.category or "Other",
+        "currency": currency or template.currency,
+    }
+    return data, round(min(confidence, 1.0), 2)
+
+def learn_labels(invoice_text, data):
+    """
+    Finds where an extraction's total and date appear in the invoice text.
+    Returns (amount_label, date_label), or None if the text doesn't back up
+    the extraction (then it's not something we can learn from).
+    """
+    vendor = data.get("vendor")
+    cents = parse_amount(data.get("amount"))[0]
+    issued_on = parse_invoice_date(data.get("invoice_date"))
+    if not vendor or cents is None or issued_on is None:
+        return None
+
+    lines = _lines(invoice_text)
+    if not _mentions(_header(lines), vendor):
+        return None
+
+    amount_label = _pick_label(
+        [label for label, token in labeled_values(lines, AMOUNT_TOKEN) if parse_amount(token)[0] == cents],
+        _is_total, last=True,
+    )
+    date_label = _pick_label(
+        [label for label, token in labeled_values(lines, DATE_TOKEN) if parse_invoice_date(token) == issued_on],
+        _is_invoice_date, last=False,
+    )
+    if amount_label is None or date_label is None:
+        return None
+    return amount_label, date_label
+
+class TemplateStore:
+    """Each user's vendor templates, cached in memory and learned from AI extractions."""
+
+    def __init__(self, reload_seconds=TEMPLATE_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._templates = {}  # {owner_id: (loaded_at, [VendorTemplate])}
+        self._lock = threading.Lock()  # Guards the dict only - loading happens outside it
+
+    def all(self, owner_id):
+        """The templates learned from `owner_id`'s invoices."""
+        with self._lock:
+            cached = self._templates.get(owner_id)
+        if cached is not None and time.monotonic() - cached[0] <= self.reload_seconds:
+            return cached[1]
+
+        loaded_at = time.monotonic()
+        db = SessionLocal()
+        try:
+            templates = db.query(VendorTemplate).filter(VendorTemplate.owner_id == owner_id).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._templates[owner_id] = (loaded_at, templates)
+        return templates
+
+    def invalidate(self, owner_id=None):
+        """Drops `owner_id`'s cached templates, or everyone's without an owner."""
+        with self._lock:
+            if owner_id is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(owner_id, None)
+
+    def _replace(self, owner_id, template):
+        # Swaps a freshly saved template into the owner's cached list, if there is one
+        with self._lock:
+            cached = self._templates.get(owner_id)
+            if cached is not None:
+                loaded_at, templates = cached
+                templates = [t for t in templates if t.vendor != template.vendor] + [template]
+                self._templates[owner_id] = (loaded_at, templates)
+
+    def learn(self, owner_id, invoice_text, data):
+        """
+        Records an AI extraction of one of `owner_id`'s invoices. The same
+        labels seen again confirm the template; different labels mean the
+        layout changed, so it starts over.
+        """
+        labels = learn_labels(invoice_text, data)
+        if labels is None:
+            return False
+        amount_label, date_label = labels
+
+        db = SessionLocal()
+        try:
+            template = db.query(VendorTemplate).filter(
+                VendorTemplate.owner_id == owner_id, VendorTemplate.vendor == data["vendor"]
+            ).first()
+            if template is None:
+                template = VendorTemplate(owner_id=owner_id, vendor=data["vendor"], confirmations=0)
+                db.add(template)
+            if (template.amount_label, template.date_label) == (amount_label, date_label):
+                template.confirmations += 1
+            else:
+                template.amount_label, template.date_label = amount_label, date_label
+                template.confirmations = 1
+            template.category = data.get("category") or template.category
+            template.currency = data.get("currency") or template.currency
+            db.commit()
+            db.refresh(template)  # Loaded now, so the cached copy is usable once the session is closed
+        except IntegrityError:
+            # Another worker created the same vendor's template first - the next extraction will count
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+        self._replace(owner_id, template)
+        return True
+
+    def forget(self, db, owner_id, vendor):
+        """
+        A user corrected an invoice their template extracted - stop using it
+        until it's confirmed again. The caller commits, then calls
+        invalidate(owner_id) so the cache doesn't reload the old row first.
+        """
+        db.query(VendorTemplate).filter(VendorTemplate.owner_id == owner_id, VendorTemplate.vendor == vendor).update(
+            {VendorTemplate.confirmations: 0}, synchronize_session=False
+        )
+
+class ExtractionStats:
+    """Per-process counters of how invoices were extracted and how long each path took."""
+
+    PATHS = ("rules", "cache", "llm", "duplicate")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {path: 0 for path in self.PATHS}
+        self._seconds = {path: 0.0 for path in self.PATHS}
+        self._max_seconds = {path: 0.0 for path in self.PATHS}
+
+    def record(self, path, seconds):
+        EXTRACTION_SECONDS.observe(seconds, path=path)
+        with self._lock:
+            self._counts[path] += 1
+            self._seconds[path] += seconds
+            self._max_seconds[path] = max(self._max_seconds[path], seconds)
+
+    def stats(self):
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                "invoices": total,
+                "served_by_rules": round(self._counts["rules"] / total, 3) if total else 0.0,
+                "paths": {
+                    path: {
+                        "count": self._counts[path],
+                        "avg_ms": round(self._seconds[path] / self._counts[path] * 1000, 1) if self._counts[path] else None,
+                        "max_ms": round(self._max_seconds[path] * 1000, 1),
+                    }
+                    for path in self.PATHS
+                },
+            }
+
+# Shared by the extraction workers and the /extract route
+template_store = TemplateStore()
+extraction_stats = ExtractionStats()
@@ -0,0 +1,181 @@
+# backend/services/search_index.py
+
+import re
+import zlib
+from sqlalchemy import text
+
+from models.document_text import DocumentText
+
+# Full-text search over invoices with SQLite FTS5. One row per invoice
+# (rowid = invoice id) holding the vendor, category, file name and the PDF
+# text. Every row also carries an owner token like "u42"; search queries
+# require it, so FTS5 intersects posting lists instead of matching every
+# tenant's invoices and filtering afterwards.
+#
+# The routes and the extraction workers update rows as invoices change.
+# On other databases search falls back to LIKE on vendor, category and file name.
+
+SEARCH_TABLE = "invoice_search"
+# bm25 weights per column: owner, vendor, category, file_name, body
+RANK_FUNCTION = "bm25(0.0, 4.0, 2.0, 2.0, 1.0)"
+SNIPPET_TOKENS = 12
+MAX_QUERY_TERMS = 10
+# Queries matching more invoices than this are sorted newest first instead of by relevance
+RANK_CANDIDATES = 2000
+REBUILD_BATCH_SIZE = 1000
+
+# Set by create_search_index when the FTS5 table exists
+_available = False
+
+class InvalidSearchQuery(Exception):
+    """Raised when a search query has nothing to search for."""
+
+def search_available():
+    return _available
+
+def owner_token(owner_id):
+    return f"u{owner_id}"
+
+def _stored_body(db, content_hash):
+    row = db.query(DocumentText.text_zlib).filter(DocumentText.content_hash == content_hash).first()
+    return zlib.decompress(row[0]).decode("utf-8") if row is not None else None
+
+def index_invoice(db, invoice, body=None):
+    """
+    Adds or replaces an invoice's search row. The PDF text comes from
+    `body`, else the stored document text, else whatever was indexed
+    before. The caller commits.
+    """
+    if not _available or invoice.id is None:
+        return
+    if body is None and invoice.content_hash:
+        body = _stored_body(db, invoice.content_hash)
+    if body is None:
+        body = db.execute(
+            text(f"SELECT body FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": invoice.id}
+        ).scalar() or ""
+
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": invoice.id})
+    db.execute(
+        text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, owner, vendor, category, file_name, body)"
+            " VALUES (:id, :owner, :vendor, :category, :file_name, :body)"
+        ),
+        {
+            "id": invoice.id,
+            "owner": owner_token(invoice.owner_id),
+            "vendor": invoice.vendor or "",
+            "category": invoice.category or "",
+            "file_name": invoice.file_name or "",
+            "body": body,
+        },
+    )
+
+def remove_invoice(db, invoice_id):
+    """Drops an invoice's search row. The caller commits."""
+    if _available:
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {"id": invoice_id})
+
+def build_match_query(owner_id, query):
+    """
+    Turns what the user typed into an FTS5 query. Words are quoted so FTS
+    syntax can't leak in, all of them must match, and the last one also
+    matches as a prefix for search-as-you-type.
+    """
+    terms = re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        raise InvalidSearchQuery("Search query needs at least one word")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f"owner:{owner_token(owner_id)} AND {{vendor category file_name body}}: ({' '.join(quoted)})"
+
+def search_invoices(db, owner_id, query, limit, offset=0):
+    """
+    Returns [(invoice_id, score, snippet)] best match first. Scores are
+    bm25, lower is better; broad queries come back newest first with no
+    score. Snippets mark matches with **.
+    """
+    match = build_match_query(owner_id, query)
+    # bm25 costs a couple of microseconds per match, which adds up when a
+    # common word matches most of a big tenant. Walking the matches in rowid
+    # order scores nothing, so first check whether there are that many.
+    broad = db.execute(
+        text(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"
+            " ORDER BY rowid DESC LIMIT 1 OFFSET :skip"
+        ),
+        {"match": match, "skip": RANK_CANDIDATES - 1},
+    ).first() is not None
+
+    score = "NULL" if broad else "rank"
+    order = "rowid DESC" if broad else "rank"
+    rows = db.execute(
+        text(
+            f"SELECT rowid, {score}, snippet({SEARCH_TABLE}, 4, '**', '**', '…', {SNIPPET_TOKENS})"
+            f" FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"
+            f" ORDER BY {order} LIMIT :limit OFFSET :offset"
+        ),
+        {"match": match, "limit": limit, "offset": offset},
+    ).fetchall()
+    return [(invoice_id, score, snippet) for invoice_id, score, snippet in rows]
+
+def create_search_index(conn):
+    """Creates the FTS5 table on SQLite and fills it the first time. Safe to run on every startup."""
+    global _available
+    if conn.dialect.name != "sqlite":
+        return
+
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+    ).first()
+    if not exists:
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                " owner, vendor, category, file_name, body,"
+                " tokenize = 'porter unicode61', prefix = '2 3')"
+            ))
+        except Exception as e:
+            print(f"⚠️ SQLite has no FTS5, full-text search is disabled: {e}")
+            return
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', :rank)"), {"rank": RANK_FUNCTION})
+        _rebuild(conn)
+    _available = True
+
+def _rebuild(conn):
+    # Indexes every existing invoice, with its stored PDF text when there is one
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT invoices.id, invoices.owner_id, invoices.vendor, invoices.category,"
+                " invoices.file_name, document_texts.text_zlib"
+                " FROM invoices LEFT JOIN document_texts ON document_texts.content_hash = invoices.content_hash"
+                " WHERE invoices.id > :last_id ORDER BY invoices.id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": REBUILD_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, owner, vendor, category, file_name, body)"
+                " VALUES (:id, :owner, :vendor, :category, :file_name, :body)"
+            ),
+            [
+                {
+                    "id": invoice_id,
+                    "owner": owner_token(owner_id),
+                    "vendor": vendor or "",
+                    "category": category or "",
+                    "file_name": file_name or "",
+                    "body": zlib.decompress(text_zlib).decode("utf-8") if text_zlib else "",
+                }
+                for invoice_id, owner_id, vendor, category, file_name, text_zlib in rows
+            ],
+        )
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    if indexed:
+        print(f"🔎 Indexed {indexed} invoices for search")
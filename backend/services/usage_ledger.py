@@ -0,0 +1,142 @@
+# backend/services/usage_ledger.py
+
+import os
+import atexit
+import asyncio
+import datetime
+import threading
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models.api_usage import ApiUsage
+from models.invoice import Invoice
+
+# The usage ledger replaces logs/openai_usage.log. Every extraction that
+# reaches the OpenAI step records its model, real token counts, latency and
+# whether the cache answered, priced in micro-dollars. Entries wait in memory
+# and are written FLUSH_SIZE at a time (or every FLUSH_SECONDS) with one
+# INSERT, so the extraction path never waits on the database for this.
+#
+# Entries still buffered when the process is killed are lost; a clean
+# shutdown (or a script exiting) flushes them.
+
+FLUSH_SIZE = 200
+FLUSH_SECONDS = 5.0
+# Entries kept while the database is unavailable, the oldest are dropped beyond this
+MAX_BUFFERED = 20000
+
+# USD per million tokens (prompt, completion). OPENAI_PRICE_PROMPT/OPENAI_PRICE_COMPLETION
+# override the price of the model in use.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# The Batch API bills half
+BATCH_PRICE_FACTOR = 0.5
+
+def price_of(model):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (
+        float(os.getenv("OPENAI_PRICE_PROMPT", prompt_price)),
+        float(os.getenv("OPENAI_PRICE_COMPLETION", completion_price)),
+    )
+
+def cost_micro_usd(model, prompt_tokens, completion_tokens, factor=1.0):
+    # USD per million tokens times tokens is exactly micro-dollars
+    prompt_price, completion_price = price_of(model)
+    return round((prompt_tokens * prompt_price + completion_tokens * completion_price) * factor)
+
+class UsageLedger:
+    def __init__(self, flush_size=FLUSH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task = None
+        self._wakeup = None
+        self._loop = None
+
+    def record(self, invoice_id, model, prompt_tokens=0, completion_tokens=0, latency=0.0,
+               cache_status="miss", success=True, price_factor=1.0):
+        """Adds an entry. Cheap and non-blocking when the background flusher runs."""
+        now = datetime.datetime.utcnow()
+        entry = {
+            "created_at": now,
+            "day": now.date(),
+            "invoice_id": invoice_id,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency * 1000),
+            "cache_status": cache_status,
+            "success": success,
+            "cost_micro_usd": cost_micro_usd(model, prompt_tokens, completion_tokens, price_factor),
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.flush_size
+        if not full:
+            return
+        if self._loop is None:
+            self.flush()  # No flusher (scripts) - write from the caller
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self):
+        """Writes everything buffered in one INSERT. Returns the number of entries written."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            if not entries:
+                return 0
+            db = None
+            try:
+                db = SessionLocal()
+                # Owners are looked up once per batch rather than on the extraction path
+                invoice_ids = {entry["invoice_id"] for entry in entries if entry["invoice_id"] is not None}
+                owners = dict(db.query(Invoice.id, Invoice.owner_id).filter(Invoice.id.in_(invoice_ids))) if invoice_ids else {}
+                for entry in entries:
+                    entry["owner_id"] = owners.get(entry["invoice_id"])
+                db.execute(insert(ApiUsage), entries)
+                db.commit()
+                return len(entries)
+            except Exception as e:
+                if db is not None:
+                    db.rollback()
+                # Put them back for the next flush, newest entries win if it keeps failing
+                with self._lock:
+                    self._buffer = (entries + self._buffer)[-MAX_BUFFERED:]
+                print(f"⚠️ Could not write {len(entries)} usage entries, will retry: {e}")
+                return 0
+            finally:
+                if db is not None:
+                    db.close()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+# Shared ledger, started and stopped by the app lifespan in main.py
+usage_ledger = UsageLedger()
+# Scripts never start the flusher; whatever is left goes out when they exit
+atexit.register(usage_ledger.flush)
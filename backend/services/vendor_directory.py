@@ -0,0 +1,210 @@
+# backend/services/vendor_directory.py
+
+import os
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.invoice import Invoice
+from models.vendor import Vendor, VendorAlias
+
+# Canonical vendors. The AI writes the vendor however the invoice spells it,
+# so "ACME Corp", "Acme Corporation" and "ACME CORP." would be three vendors
+# in the charts. Every spelling is normalized to a key (lowercase, no
+# punctuation, no legal suffix) and looked up in the user's aliases: first
+# exactly, then by trigram similarity to catch typos and small variations.
+# A spelling that matches nothing starts a new vendor.
+#
+# Each process keeps a trigram index of the aliases per user in memory, so
+# a lookup never scans the vendor list or touches the database once the
+# spelling is known.
+
+# Dice similarity of trigram sets needed to treat two spellings as one vendor
+MATCH_THRESHOLD = float(os.getenv("VENDOR_MATCH_THRESHOLD", "0.75"))
+# Picks up vendors and aliases added by other processes
+RELOAD_SECONDS = 300
+# Users whose indexes stay in memory, least recently used ones are dropped
+MAX_CACHED_OWNERS = 1000
+
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "llc", "ltd", "limited",
+    "plc", "gmbh", "ag", "sa", "sarl", "srl", "bv", "nv", "pty", "lp", "llp",
+}
+
+def vendor_key(name):
+    """"ACME Corp." -> "acme". Empty for names without letters or digits."""
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    name = re.sub(r"['’]", "", name.lower()).replace("&", " and ")  # "Hanson's" -> "hansons"
+    words = re.findall(r"[a-z0-9]+", name)
+    if words and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class OwnerVendors:
+    """The trigram index of one user's vendor aliases."""
+
+    def __init__(self):
+        self.vendor_ids = {}   # alias -> vendor id
+        self.grams = {}        # alias -> its trigrams
+        self.postings = {}     # trigram -> aliases containing it
+        self.loaded_at = time.monotonic()
+
+    def add(self, alias, vendor_id):
+        if alias in self.vendor_ids:
+            return
+        grams = frozenset(trigrams(alias))
+        self.vendor_ids[alias] = vendor_id
+        self.grams[alias] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(alias)
+
+    def match(self, key, threshold=MATCH_THRESHOLD):
+        """
+        Returns the vendor id for the alias most similar to key, or None when
+        nothing is close enough.
+        """
+        vendor_id = self.vendor_ids.get(key)
+        if vendor_id is not None:
+            return vendor_id
+
+        grams = trigrams(key)
+        # An alias similar enough shares at least `needed` of our trigrams, so
+        # it has to contain one of our len - needed + 1 rarest ones. Only those
+        # posting lists are read; common trigrams like "  a" are skipped.
+        needed = math.ceil(threshold * len(grams) / (2 - threshold))
+        rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))[:len(grams) - needed + 1]
+        candidates = set().union(*(self.postings.get(gram, ()) for gram in rarest))
+
+        best_id, best_score = None, threshold
+        for alias in candidates:
+            alias_grams = self.grams[alias]
+            score = 2 * len(grams & alias_grams) / (len(grams) + len(alias_grams))
+            if score >= best_score:
+                best_id, best_score = self.vendor_ids[alias], score
+        return best_id
+
+def _load_owner(db, owner_id):
+    owner = OwnerVendors()
+    for alias, vendor_id in db.query(VendorAlias.alias, VendorAlias.vendor_id).filter(VendorAlias.owner_id == owner_id):
+        owner.add(alias, vendor_id)
+    return owner
+
+def _save_alias(db, owner_id, name, key, vendor_id):
+    # Records a new spelling for vendor_id, or for a new vendor when it's None. Flushes, doesn't commit.
+    if vendor_id is None:
+        vendor = Vendor(owner_id=owner_id, name=name.strip())
+        db.add(vendor)
+        db.flush()
+        vendor_id = vendor.id
+    db.add(VendorAlias(owner_id=owner_id, alias=key, vendor_id=vendor_id))
+    db.flush()
+    return vendor_id
+
+class VendorDirectory:
+    """Per-process cache of every user's vendor index, filled on first use."""
+
+    def __init__(self, reload_seconds=RELOAD_SECONDS, max_owners=MAX_CACHED_OWNERS):
+        self.reload_seconds = reload_seconds
+        self.max_owners = max_owners
+        self._owners = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _owner(self, owner_id):
+        with self._lock:
+            owner = self._owners.get(owner_id)
+            if owner is not None and time.monotonic() - owner.loaded_at < self.reload_seconds:
+                self._owners.move_to_end(owner_id)
+                return owner
+        db = SessionLocal()
+        try:
+            owner = _load_owner(db, owner_id)
+        finally:
+            db.close()
+        with self._lock:
+            self._owners[owner_id] = owner
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+        return owner
+
+    def resolve(self, owner_id, name):
+        """Returns the canonical vendor id for a spelling, creating the vendor if it's new. None for empty names."""
+        key = vendor_key(name)
+        if not key or owner_id is None:
+            return None
+        owner = self._owner(owner_id)
+        # The lock only guards the in-memory index; the DB work below runs
+        # without it so one slow write doesn't stall every other lookup
+        with self._lock:
+            vendor_id = owner.vendor_ids.get(key)
+            if vendor_id is not None:
+                return vendor_id
+            match = owner.match(key)
+
+        # A new spelling. The unique (owner_id, alias) constraint decides when
+        # two threads or processes save the same one at once.
+        db = SessionLocal()
+        try:
+            vendor_id = _save_alias(db, owner_id, name, key, match)
+            db.commit()
+        except IntegrityError:
+            # Someone else saved this spelling first - use theirs
+            db.rollback()
+            vendor_id = db.query(VendorAlias.vendor_id).filter(VendorAlias.owner_id == owner_id, VendorAlias.alias == key).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            owner.add(key, vendor_id)
+        return vendor_id
+
+    def invalidate(self, owner_id=None):
+        with self._lock:
+            if owner_id is None:
+                self._owners.clear()
+            else:
+                self._owners.pop(owner_id, None)
+
+vendor_directory = VendorDirectory()
+
+def assign_vendor(invoice):
+    """Points invoice.vendor_id at the canonical vendor for invoice.vendor."""
+    invoice.vendor_id = vendor_directory.resolve(invoice.owner_id, invoice.vendor)
+
+def backfill_vendor_ids(conn):
+    """Gives invoices saved before vendors existed their vendor_id. Safe to run on every startup."""
+    db = Session(bind=conn)
+    owners = {}
+    rows = (
+        db.query(Invoice.owner_id, Invoice.vendor)
+        .filter(Invoice.vendor_id.is_(None), Invoice.vendor.isnot(None), Invoice.owner_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    for owner_id, name in rows:
+        key = vendor_key(name)
+        if not key:
+            continue
+        if owner_id not in owners:
+            owners[owner_id] = _load_owner(db, owner_id)
+        owner = owners[owner_id]
+        vendor_id = owner.vendor_ids.get(key)
+        if vendor_id is None:
+            vendor_id = _save_alias(db, owner_id, name, key, owner.match(key))
+            owner.add(key, vendor_id)
+        db.query(Invoice).filter(
+            Invoice.owner_id == owner_id, Invoice.vendor == name, Invoice.vendor_id.is_(None)
+        ).update({Invoice.vendor_id: vendor_id}, synchronize_session=False)
+    db.flush()
+    if rows:
+        print(f"🏷️ Matched {len(rows)} vendor spellings to canonical vendors")
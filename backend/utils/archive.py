@@ -0,0 +1,55 @@
+# backend/utils/archive.py
+
+import os
+import zipfile
+
+# Guards against zip bombs and archives we have no business unpacking
+MAX_ARCHIVE_ENTRIES = 1000
+MAX_ARCHIVE_UNCOMPRESSED_BYTES = 500 * 1024 * 1024
+
+class ArchiveError(Exception):
+    """Raised when an uploaded ZIP can't be read or breaks the size limits."""
+
+def is_zip_upload(file_name, content_type=None):
+    return (file_name or "").lower().endswith(".zip") or content_type in (
+        "application/zip",
+        "application/x-zip-compressed",
+    )
+
+def _open_archive(fileobj):
+    try:
+        return zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Not a valid ZIP archive: {e}")
+
+def _checked_members(archive):
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+    ]
+    if len(members) > MAX_ARCHIVE_ENTRIES:
+        raise ArchiveError(f"ZIP archive has more than {MAX_ARCHIVE_ENTRIES} files")
+    if sum(info.file_size for info in members) > MAX_ARCHIVE_UNCOMPRESSED_BYTES:
+        raise ArchiveError("ZIP archive is too large once uncompressed")
+    return members
+
+def list_zip_members(fileobj):
+    """
+    Returns the file names iter_zip_members would yield, reading only the
+    archive's directory - nothing is decompressed.
+    """
+    with _open_archive(fileobj) as archive:
+        return [os.path.basename(info.filename) for info in _checked_members(archive)]
+
+def iter_zip_members(fileobj):
+    """
+    Yields (file_name, open_member) for every file in a ZIP archive.
+
+    open_member is a zero-argument callable returning a readable stream for
+    that entry, so members are decompressed one at a time. Folders and macOS
+    metadata entries are skipped.
+    """
+    with _open_archive(fileobj) as archive:
+        for info in _checked_members(archive):
+            # Drop any folder structure - we only care about the file name
+            yield os.path.basename(info.filename), (lambda info=info: archive.open(info))
@@ -0,0 +1,175 @@
+# backend/utils/file_storage.py
+
+import os
+import time
+import uuid
+import zlib
+import hashlib
+import threading
+from typing import NamedTuple
+from fastapi.concurrency import run_in_threadpool  # type: ignore
+
+from models.invoice import Invoice
+from models.document_text import DocumentText
+from utils.metrics import UPLOAD_WRITE_SECONDS
+
+# Uploaded PDFs are stored once per unique content:
+#   uploads/objects/ab/cd/abcd1234...pdf
+# Files are streamed through a temp file while the SHA-256 is computed, then
+# moved into place, so memory use doesn't depend on the file size.
+UPLOAD_ROOT = "uploads"
+OBJECTS_DIR = os.path.join(UPLOAD_ROOT, "objects")
+TMP_DIR = os.path.join(UPLOAD_ROOT, "tmp")
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# A stored file is shared by every invoice with the same content, so deleting
+# it has to be careful about an upload of that content happening right now:
+# the upload finds the file already stored, keeps it, and commits its invoice
+# row a moment later. Storing and releasing the same content is serialized
+# within a process by the locks below. Across processes, an upload touches
+# the file it reuses, and a release leaves files stored or touched in the last
+# RECENT_UPLOAD_SECONDS alone (the cleaner tries them again later).
+RECENT_UPLOAD_SECONDS = 60
+_LOCKS = [threading.Lock() for _ in range(64)]
+
+# What release_file did
+RELEASE_DELETED = "deleted"
+RELEASE_IN_USE = "in_use"     # Still referenced (or already gone) - nothing to do
+RELEASE_RECENT = "recent"     # Stored again very recently - try again later
+
+class StoredFile(NamedTuple):
+    path: str      # Where the content lives on disk
+    sha256: str    # Hex digest of the content
+    size: int      # Size in bytes
+
+def content_path(sha256):
+    """Sharded location for a content hash - two levels keep directories small."""
+    return os.path.join(OBJECTS_DIR, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+def file_sha256(file_path):
+    """Hash of a file on disk - for invoices uploaded before content hashes were stored."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _open_temp_file():
+    os.makedirs(TMP_DIR, exist_ok=True)
+    temp_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}.part")
+    return temp_path, open(temp_path, "wb")
+
+def _lock_for(key):
+    # Striped, so the number of locks doesn't grow with the number of files
+    return _LOCKS[zlib.crc32(key.encode()) % len(_LOCKS)]
+
+def _finalize(temp_path, digest, size):
+    # Moves the temp file into its content-addressed home, or drops it if
+    # the same content is already stored
+    final_path = content_path(digest)
+    with _lock_for(digest):
+        if os.path.exists(final_path):
+            try:
+                # Marks the content as just uploaded, so a release elsewhere leaves it alone
+                os.utime(final_path)
+                os.remove(temp_path)
+                return StoredFile(final_path, digest, size)
+            except FileNotFoundError:
+                pass  # Released in the meantime - store our copy instead
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)  # atomic, so readers never see a partial file
+    return StoredFile(final_path, digest, size)
+
+def store_stream(stream):
+    """Stores a readable binary stream. Blocking - run it in a thread from async code."""
+    with UPLOAD_WRITE_SECONDS.time():
+        return _store_stream(stream)
+
+def _store_stream(stream):
+    temp_path, f = _open_temp_file()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return _finalize(temp_path, sha256.hexdigest(), size)
+
+async def store_upload(upload):
+    """Stores a FastAPI UploadFile, reading it chunk by chunk."""
+    with UPLOAD_WRITE_SECONDS.time():
+        return await _store_upload(upload)
+
+async def _store_upload(upload):
+    temp_path, f = _open_temp_file()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return await run_in_threadpool(_finalize, temp_path, sha256.hexdigest(), size)
+
+def _references(db, content_hash, file_path):
+    if content_hash:
+        return db.query(Invoice.id).filter(Invoice.content_hash == content_hash).count()
+    # Files uploaded before content addressing are matched by path
+    return db.query(Invoice.id).filter(Invoice.file_path == file_path).count()
+
+def _recently_stored(path):
+    return os.path.getmtime(path) > time.time() - RECENT_UPLOAD_SECONDS
+
+def release_file(db, content_hash, file_path):
+    """
+    Deletes a stored file once no invoice references it anymore. Returns
+    RELEASE_DELETED, RELEASE_IN_USE or RELEASE_RECENT (see above).
+
+    Call this after the invoice row is committed as gone, from a session
+    without an open transaction, so the reference count is current.
+    """
+    if not file_path:
+        return RELEASE_IN_USE
+
+    with _lock_for(content_hash or file_path):
+        if _references(db, content_hash, file_path) or not os.path.exists(file_path):
+            return RELEASE_IN_USE
+        if _recently_stored(file_path):
+            return RELEASE_RECENT
+        # Extracted text is stored under the content hash even for old files
+        text_hash = content_hash or file_sha256(file_path)
+
+        # Move it out of the way, then look once more: an upload in another
+        # process may have touched it or committed its row just before the move
+        tombstone = f"{file_path}.{uuid.uuid4().hex}.deleting"
+        os.replace(file_path, tombstone)
+        db.rollback()  # A fresh snapshot for the second count
+        if _recently_stored(tombstone) or _references(db, content_hash, file_path):
+            # Same content, so putting it back is safe even if the upload stored its own copy meanwhile
+            os.replace(tombstone, file_path)
+            return RELEASE_RECENT
+        os.remove(tombstone)
+
+    _forget_document_text(db, text_hash)
+    return RELEASE_DELETED
+
+def _forget_document_text(db, content_hash):
+    # The stored text goes with the last invoice using that content
+    if db.query(Invoice.id).filter(Invoice.content_hash == content_hash).first() is None:
+        db.query(DocumentText).filter(DocumentText.content_hash == content_hash).delete(synchronize_session=False)
+        db.commit()
@@ -0,0 +1,220 @@
+# backend/utils/metrics.py
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Prometheus metrics for GET /metrics, in the text exposition format.
+# Like the other /stats counters they live in this process's memory, so
+# with several uvicorn workers each one reports its own numbers. Recording
+# is a lock and a couple of additions - cheap enough to leave on.
+#
+# The metrics themselves are defined at the bottom of this file so the whole
+# list is in one place; the code being measured imports the one it needs.
+
+# Seconds - from a quick disk write up to a slow OpenAI call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value (or histogram state)
+        if not self.labelnames:
+            # Metrics without labels are exported as zero from the start
+            self._values[()] = self._zero()
+        # A metric registered again under the same name (e.g. by a second create_app()) replaces the old one
+        REGISTRY[:] = [metric for metric in REGISTRY if metric.name != name]
+        REGISTRY.append(self)
+
+    def _zero(self):
+        return 0
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self):
+        # [(suffix, label string, value)]
+        with self._lock:
+            return [("", _labels(self.labelnames, key), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_number(value)}" for suffix, labels, value in self._samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _zero(self):
+        # Per-bucket counts (the last one is +Inf) and the sum
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, seconds, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._zero()
+            state[0][index] += 1
+            state[1] += seconds
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative))
+            samples.append(("_sum", _labels(self.labelnames, key), total))
+            samples.append(("_count", _labels(self.labelnames, key), cumulative))
+        return samples
+
+class CallbackMetric(Metric):
+    """A counter or gauge read from existing state when scraped, e.g. the cache's own counters."""
+
+    def __init__(self, name, help, kind, function, labelnames=()):
+        self.kind = kind
+        self.function = function  # Returns a number, or {label values: number}
+        super().__init__(name, help, labelnames)
+
+    def _samples(self):
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            ("", _labels(self.labelnames, key if isinstance(key, tuple) else (key,)), value)
+            for key, value in values.items()
+        ]
+
+def render_metrics():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+def instrument_commits(session_factory):
+    """Times every commit (flush included) of sessions made by session_factory. Safe to call more than once."""
+    from sqlalchemy import event
+
+    if not event.contains(session_factory, "before_commit", _commit_started):
+        event.listen(session_factory, "before_commit", _commit_started)
+        event.listen(session_factory, "after_commit", _commit_finished)
+
+class RequestTimingMiddleware:
+    """ASGI middleware that records every request's duration by route template and status class."""
+
+    def __init__(self, app, skip_paths=()):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The matched route's template ("/invoices/{invoice_id}"), so ids don't explode the label count
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=f"{status // 100}xx"
+            )
+
+# ----- The pipeline's metrics -----
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "End-to-end request time", ["method", "route", "status"]
+)
+UPLOAD_WRITE_SECONDS = Histogram("invoice_upload_write_seconds", "Streaming an uploaded PDF to storage")
+PDF_PARSE_SECONDS = Histogram("invoice_pdf_parse_seconds", "Parsing a PDF in the PDF worker pool")
+LLM_WAIT_SECONDS = Histogram("invoice_llm_rate_limit_wait_seconds", "Waiting for the shared OpenAI rate limits")
+LLM_CALL_SECONDS = Histogram("invoice_llm_call_seconds", "One OpenAI chat completion call", ["outcome"])
+DB_COMMIT_SECONDS = Histogram("invoice_db_commit_seconds", "Session commits, flush included")
+EXTRACTION_SECONDS = Histogram("invoice_extraction_seconds", "Extracting the fields of one invoice", ["path"])
+
+EXTRACTION_FAILURES = Counter(
+    "invoice_extraction_failures_total", "Failed extraction attempts; final is true when the job gave up", ["final"]
+)
+
+EXTRACTIONS_IN_PROGRESS = Gauge("invoice_extractions_in_progress", "Invoices being extracted right now")
+LLM_REQUESTS_IN_FLIGHT = Gauge("invoice_llm_requests_in_flight", "OpenAI calls waiting for an answer")
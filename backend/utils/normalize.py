@@ -0,0 +1,142 @@
+# backend/utils/normalize.py
+
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Turns the free-form values we get from the AI (or from users) into typed
+# values we can index: a real date and an amount in integer cents.
+
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "USD")
+
+# Tried in order - US style (month first) wins over day first for ambiguous dates
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d",
+    "%m/%d/%Y", "%m-%d-%Y", "%m/%d/%y",
+    "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y",
+    "%B %d, %Y", "%B %d %Y", "%b %d, %Y", "%b %d %Y", "%b. %d, %Y",
+    "%d %B %Y", "%d %b %Y", "%d %B, %Y", "%d %b, %Y",
+]
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+
+# Active ISO 4217 codes. Invoices are full of other three-letter words next
+# to numbers ("VAT 20.00", "NET 30"), so only these count as a currency.
+ISO_CURRENCY_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND
+    BOB BRL BSD BTN BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF
+    DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD
+    HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW
+    KWD KYD KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR
+    MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN
+    PYG QAR RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN
+    SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES
+    VND VUV WST XAF XCD XCG XOF XPF YER ZAR ZMW ZWG
+""".split())
+# Three capitals right before or after a number ("USD 980.00", "12,50 EUR")
+CURRENCY_CODE = re.compile(r"\b([A-Z]{3})(?=\s*-?[\d.,]*\d)|(?:(?<=\d)|(?<=\d\s))([A-Z]{3})\b")
+
+# Currencies usually written with a decimal comma and dots between thousands,
+# so "1.234" means one thousand two hundred thirty-four
+DECIMAL_COMMA_CURRENCIES = {"EUR", "BRL", "DKK", "NOK", "SEK", "TRY", "IDR", "ARS", "CLP", "COP", "VND"}
+
+# Spotting amounts and dates inside free invoice text (services/rule_extractor.py
+# and services/prompt_compaction.py). Amounts need cents ("1,234.56",
+# "1.234,56", "42.00") or a symbol ("$1,200") so invoice numbers don't count.
+AMOUNT_TOKEN = re.compile(
+    r"(?<![\d.,])(?:[$€£¥₹]\s?)?(?:\d{1,3}(?:[,.]\d{3})+[.,]\d{2}|\d+[.,]\d{2})(?!\d)"
+    r"|[$€£¥₹]\s?\d[\d,]*"
+)
+MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+DATE_TOKEN = re.compile(
+    r"\b\d{4}[-/.]\d{1,2}[-/.]\d{1,2}\b"
+    r"|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b"
+    rf"|\b{MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}\b"
+    rf"|\b\d{{1,2}}(?:st|nd|rd|th)?\s+{MONTH},?\s+\d{{4}}\b",
+    re.IGNORECASE,
+)
+
+def parse_invoice_date(value):
+    """Returns a date for the common invoice date formats, or None if it can't tell."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip()
+    if not text:
+        return None
+    # Drop a time part from ISO timestamps and ordinal suffixes like "3rd"
+    text = re.sub(r"^(\d{4}-\d{2}-\d{2})[T ].*$", r"\1", text)
+    text = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", text)
+    text = re.sub(r"\s+", " ", text)
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def normalize_currency(value):
+    """Returns an ISO 4217 code for a code or symbol, or None."""
+    if not value:
+        return None
+    text = str(value).strip()
+    if text in CURRENCY_SYMBOLS:
+        return CURRENCY_SYMBOLS[text]
+    if text.upper() in ISO_CURRENCY_CODES:
+        return text.upper()
+    return None
+
+def parse_amount(value):
+    """
+    Returns (amount_in_cents, currency) for numbers and strings like
+    "$1,234.56", "USD 980.00" or "1.234,56 €". Either part may be None.
+    """
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, (int, float, Decimal)):
+        number, currency = Decimal(str(value)), None
+    else:
+        text = str(value).strip()
+        currency = None
+        # Only treat three capitals as a currency code when they sit next to
+        # the number and are a real code - "VAT 20.00" isn't in any currency
+        for code in CURRENCY_CODE.finditer(text):
+            if (code.group(1) or code.group(2)) in ISO_CURRENCY_CODES:
+                currency = code.group(1) or code.group(2)
+                break
+        else:
+            for symbol, symbol_code in CURRENCY_SYMBOLS.items():
+                if symbol in text:
+                    currency = symbol_code
+                    break
+
+        digits = re.sub(r"[^\d.,\-]", "", text)
+        if not re.search(r"\d", digits):
+            return None, currency
+        # A comma followed by exactly two digits at the end is a decimal comma
+        if re.search(r",\d{2}$", digits):
+            digits = digits.replace(".", "").replace(",", ".")
+        elif re.fullmatch(r"-?[1-9]\d{0,2}(?:\.\d{3})+", digits):
+            # "1.234.567" can only be thousands. A single "1.234" is thousands
+            # where the currency (or our default one) writes them that way;
+            # anywhere else it's ambiguous, so we'd rather not guess.
+            if digits.count(".") == 1 and (currency or DEFAULT_CURRENCY) not in DECIMAL_COMMA_CURRENCIES:
+                return None, currency
+            digits = digits.replace(".", "")
+        else:
+            digits = digits.replace(",", "")
+        try:
+            number = Decimal(digits)
+        except InvalidOperation:
+            return None, currency
+
+    if not number.is_finite():
+        return None, None
+    cents = int((number * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    return cents, currency
@@ -0,0 +1,26 @@
+# backend/utils/pagination.py
+
+import json
+import base64
+from datetime import datetime
+
+# Keyset pagination cursors. A cursor is the sort key of the last row on a
+# page, so the next page starts with "WHERE (upload_date, id) > cursor" and
+# costs the same however deep the client has paged.
+# Cursors are base64 JSON - opaque to clients, but nothing secret is in them.
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor string can't be decoded."""
+
+def encode_cursor(upload_date, invoice_id):
+    payload = json.dumps({"u": upload_date.isoformat(), "i": invoice_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Returns (upload_date, invoice_id) for a cursor made by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["u"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
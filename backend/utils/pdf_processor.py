@@ -1,16 +1,182 @@
-import fitz  # PyMuPDF
 import os
+import sys
+import signal
+import asyncio
+import threading
+import multiprocessing
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-def extract_text_from_pdf(file_path):
+from utils.metrics import PDF_PARSE_SECONDS
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# PDF parsing runs in its own processes: a huge or malicious PDF can only
+# burn its own worker's time and memory, a crash in the native library
+# doesn't take the API down, and bulk ingestion gets every core.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "30"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_MEMORY_LIMIT_MB = int(os.getenv("PDF_MEMORY_LIMIT_MB", "1024"))
+# Workers are replaced after this many documents so leaks in the native library don't pile up
+PDF_TASKS_PER_WORKER = int(os.getenv("PDF_TASKS_PER_WORKER", "100"))
+# How long past the timeout we wait for a worker stuck inside native code before killing it
+KILL_GRACE_SECONDS = 5
+
+class PdfLimitError(Exception):
+    """The PDF took too long, used too much memory or crashed the parser - retrying won't help."""
+
+class PdfDocument(NamedTuple):
+    text: str
+    page_count: int       # Pages in the PDF (0 if it couldn't be opened)
+    pages_read: int       # Pages we took text from, at most max_pages
+    has_text_layer: bool  # False for scans, which have no text to extract
+
+def read_pdf(file_path, max_pages=None):
+    """Extracts a PDF's text and page details. Unreadable PDFs come back empty with 0 pages."""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"PDF file not found: {file_path}")
-    
+
+    # PyMuPDF is only needed where PDFs are parsed (the pool's workers), so
+    # the API process and scripts don't pay for loading it at startup
+    import fitz  # PyMuPDF
+
     try:
-        text = ""
         with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text()
-        return text.strip()
+            page_count = doc.page_count
+            pages_read = page_count
+            if max_pages is not None and page_count > max_pages:
+                print(f"⚠️ {file_path} has {page_count} pages, only reading the first {max_pages}")
+                pages_read = max_pages
+            # One join at the end - adding page by page copies the whole text every time
+            pages = [doc[i].get_text() for i in range(pages_read)]
+            return PdfDocument(
+                text="".join(pages).strip(),
+                page_count=page_count,
+                pages_read=pages_read,
+                has_text_layer=any(page.strip() for page in pages),
+            )
+    except (PdfLimitError, MemoryError):
+        raise
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        return ""
+        return PdfDocument("", 0, 0, False)
+
+def extract_text_from_pdf(file_path, max_pages=None):
+    return read_pdf(file_path, max_pages).text
+
+def _init_worker(limit_mb):
+    # Runs once in each worker. PyMuPDF is loaded here so the first document
+    # doesn't spend part of its timeout importing it.
+    import fitz  # noqa: F401
+    # Linux doesn't enforce RLIMIT_RSS, so we cap the address space instead;
+    # allocations past it fail with MemoryError.
+    if resource is not None and limit_mb > 0:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _on_timeout(signum, frame):
+    raise PdfLimitError("PDF parsing timed out")
+
+def _extract_in_worker(file_path, max_pages, timeout):
+    # The alarm fires between pages; a single page stuck in native code is
+    # handled by the parent killing the worker
+    has_alarm = hasattr(signal, "SIGALRM")
+    if has_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return read_pdf(file_path, max_pages)
+    except MemoryError:
+        raise PdfLimitError(f"PDF parsing needed more than {PDF_MEMORY_LIMIT_MB} MB of memory")
+    finally:
+        if has_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+class PdfProcessPool:
+    """
+    Process pool for PDF text extraction with a per-document timeout, a
+    page limit, a memory cap per worker and worker recycling. The pool is
+    started on first use and replaced if a worker hangs or crashes.
+
+    Workers are spawned, so they import the parent's __main__ module:
+    scripts using the pool need the usual `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(self, workers=PDF_WORKERS, timeout=PDF_TIMEOUT_SECONDS, max_pages=PDF_MAX_PAGES,
+                 memory_limit_mb=PDF_MEMORY_LIMIT_MB, tasks_per_worker=PDF_TASKS_PER_WORKER):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.memory_limit_mb = memory_limit_mb
+        self.tasks_per_worker = tasks_per_worker
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                options = {}
+                if sys.version_info >= (3, 11):
+                    options["max_tasks_per_child"] = self.tasks_per_worker
+                # spawn, not fork: forking a process that runs threads and DB connections isn't safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb,),
+                    **options,
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Kills a pool with a stuck or crashed worker; the next call starts a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return  # Someone else already replaced it
+            self._executor = None
+        # There's no public way to kill a busy worker, so go through the process table
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def read(self, file_path):
+        """Reads a PDF (a PdfDocument) in a worker process. Raises PdfLimitError if the PDF breaks a limit."""
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"PDF file not found: {file_path}")
+        with PDF_PARSE_SECONDS.time():
+            return await self._read(file_path)
+
+    async def _read(self, file_path):
+        loop = asyncio.get_running_loop()
+        # A crash fails every document in flight, so each one gets a second try on a fresh pool
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = loop.run_in_executor(executor, _extract_in_worker, file_path, self.max_pages, self.timeout)
+                return await asyncio.wait_for(future, self.timeout + KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                print(f"❌ PDF worker stuck on {file_path}, restarting the pool")
+                self._discard(executor)
+                raise PdfLimitError(f"PDF parsing took longer than {self.timeout:g}s")
+            except BrokenProcessPool:
+                self._discard(executor)
+                if attempt == 1:
+                    raise PdfLimitError("PDF parser crashed")
+                print(f"⚠️ PDF worker crashed while reading {file_path}, retrying")
+
+    async def extract_text(self, file_path):
+        return (await self.read(file_path)).text
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Shared by the extraction workers, the /extract route and the batch scripts
+pdf_pool = PdfProcessPool()
@@ -0,0 +1,49 @@
+# backend/utils/simhash.py
+
+import re
+import hashlib
+from collections import Counter
+
+# 64-bit SimHash fingerprints for invoice text. Similar texts get
+# fingerprints that differ in only a few bits, so a re-rendered copy of an
+# invoice (new timestamp, different page footer) lands within a small
+# Hamming distance of the original while unrelated invoices don't.
+
+BITS = 64
+# Fingerprints are split into this many bands for lookups. Two fingerprints
+# at most BANDS - 1 bits apart always agree on at least one whole band.
+BANDS = 4
+BAND_BITS = BITS // BANDS
+SHINGLE_WORDS = 3
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash(text):
+    """Returns the fingerprint of a text as an unsigned 64-bit int."""
+    words = re.findall(r"\w+", text.lower())
+    # Word shingles keep some of the layout, and a changed word only touches a few features
+    shingles = Counter(
+        " ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+    )
+    weights = [0] * BITS
+    for shingle, count in shingles.items():
+        feature = _feature_hash(shingle)
+        for bit in range(BITS):
+            weights[bit] += count if feature >> bit & 1 else -count
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & (2 ** BITS - 1)).count("1")
+
+def bands(fingerprint):
+    """Splits a fingerprint into BANDS keys; the band number is part of each key."""
+    mask = 2 ** BAND_BITS - 1
+    return [(band << BAND_BITS) | (fingerprint >> (band * BAND_BITS) & mask) for band in range(BANDS)]
+
+def to_signed(fingerprint):
+    # Databases store 64-bit integers signed
+    return fingerprint - 2 ** BITS if fingerprint >= 2 ** (BITS - 1) else fingerprint
+
+def to_unsigned(value):
+    return value + 2 ** BITS if value < 0 else value
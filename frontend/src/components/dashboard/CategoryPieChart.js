@@ -5,15 +5,10 @@ import { Chart, ArcElement, Tooltip, Legend } from 'chart.js';
 
 Chart.register(ArcElement, Tooltip, Legend);
 
-const CategoryPieChart = ({ invoices }) => {
-  const categoryCounts = invoices.reduce((acc, invoice) => {
-    const rawCategory = invoice.category || "Uncategorized";
-
-    // 🧼 Normalize: Capitalize first letter, lowercase the rest
-    const category =
-      rawCategory.charAt(0).toUpperCase() + rawCategory.slice(1).toLowerCase();
-
-    acc[category] = (acc[category] || 0) + 1;
+// stats comes from GET /invoices/stats/by-category (already normalized server-side)
+const CategoryPieChart = ({ stats }) => {
+  const categoryCounts = stats.reduce((acc, row) => {
+    acc[row.category] = row.invoice_count;
     return acc;
   }, {});
 
@@ -3,21 +3,10 @@
 import React from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { Typography, Box } from '@mui/material';
-import dayjs from 'dayjs';
 
-const MonthlySpendingChart = ({ invoices }) => {
-  // Group invoices by month and sum amounts
-  const monthlyTotals = invoices.reduce((acc, invoice) => {
-    if (!invoice.invoice_date || !invoice.amount) return acc;
-    const month = dayjs(invoice.invoice_date).format('YYYY-MM');
-    acc[month] = (acc[month] || 0) + parseFloat(invoice.amount);
-    return acc;
-  }, {});
-
-  // Convert into array of objects sorted by month
-  const chartData = Object.entries(monthlyTotals)
-    .map(([month, total]) => ({ month, total }))
-    .sort((a, b) => new Date(a.month) - new Date(b.month));
+// stats comes from GET /invoices/stats/by-month, already grouped and sorted by month
+const MonthlySpendingChart = ({ stats }) => {
+  const chartData = stats.map(({ month, total_amount }) => ({ month, total: total_amount }));
 
   return (
     <Box sx={{ width: '100%', height: 400, mt: 5 }}>
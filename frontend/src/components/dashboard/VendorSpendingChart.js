@@ -9,27 +9,9 @@ import {
   ResponsiveContainer,
 } from 'recharts';
 
-// Utility to group and sum spending by vendor
-const getVendorSpendData = (invoices) => {
-  const grouped = {};
-
-  invoices.forEach((inv) => {
-    const vendor = (inv.vendor || 'Unknown').trim();
-
-    if (!grouped[vendor]) {
-      grouped[vendor] = 0;
-    }
-    grouped[vendor] += Number(inv.amount) || 0;
-  });
-
-  return Object.entries(grouped).map(([vendor, total]) => ({
-    vendor,
-    total: parseFloat(total.toFixed(2)),
-  }));
-};
-
-const VendorSpendingChart = ({ invoices }) => {
-  const data = getVendorSpendData(invoices);
+// stats comes from GET /invoices/stats/by-vendor, already grouped per vendor
+const VendorSpendingChart = ({ stats }) => {
+  const data = stats.map(({ vendor, total_amount }) => ({ vendor, total: total_amount }));
 
   return (
     <div style={{ width: '100%', height: 300, marginBottom: '2rem' }}>
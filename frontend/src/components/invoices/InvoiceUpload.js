@@ -10,10 +10,15 @@ import {
   Paper,
 } from "@mui/material";
 import axios from "axios";
+import { bulkUploadInvoices } from "../../services/api";
+
+// PDFs go one at a time, ZIP archives (and multiple files) go to the bulk endpoint
+const isAcceptedFile = (file) =>
+  file.type === "application/pdf" || file.name.toLowerCase().endsWith(".zip");
 
 const InvoiceUpload = ({ onUploadSuccess }) => {
   const [manualEntry, setManualEntry] = useState(false);
-  const [selectedFile, setSelectedFile] = useState(null);
+  const [selectedFiles, setSelectedFiles] = useState([]);
   const [metadata, setMetadata] = useState({
     vendor: "",
     amount: "",
@@ -25,27 +30,30 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
 
   const fileInputRef = useRef();
 
-  const handleFileDrop = (e) => {
-    e.preventDefault();
-    const file = e.dataTransfer.files[0];
-    if (file && file.type === "application/pdf") {
-      setSelectedFile(file);
+  const selectFiles = (fileList) => {
+    const files = Array.from(fileList || []);
+    if (files.length > 0 && files.every(isAcceptedFile)) {
+      setSelectedFiles(files);
     } else {
-      setMessage("Only PDF files allowed");
+      setMessage("Only PDF or ZIP files allowed");
     }
   };
 
+  const handleFileDrop = (e) => {
+    e.preventDefault();
+    selectFiles(e.dataTransfer.files);
+  };
+
   const handleFileSelect = (e) => {
-    const file = e.target.files[0];
-    if (file && file.type === "application/pdf") {
-      setSelectedFile(file);
-    } else {
-      setMessage("Only PDF files allowed");
-    }
+    selectFiles(e.target.files);
   };
 
+  const isBulkUpload =
+    selectedFiles.length > 1 ||
+    (selectedFiles.length === 1 && !selectedFiles[0].name.toLowerCase().endsWith(".pdf"));
+
   const handleUpload = async () => {
-    if (!selectedFile && !manualEntry) {
+    if (selectedFiles.length === 0 && !manualEntry) {
       setMessage("Please select a PDF invoice or enable manual entry.");
       return;
     }
@@ -67,6 +75,18 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
 
       let response;
 
+      if (!manualEntry && isBulkUpload) {
+        // 📦 Bulk upload — every file is queued for extraction on the server
+        const manifest = await bulkUploadInvoices(selectedFiles);
+        setMessage(
+          `✅ Queued ${manifest.accepted} invoice(s)` +
+            (manifest.rejected ? `, ${manifest.rejected} file(s) rejected` : "")
+        );
+        setSelectedFiles([]);
+        if (onUploadSuccess) onUploadSuccess();
+        return;
+      }
+
       if (manualEntry) {
         // 📝 Manual entry — send JSON to /invoices/manual
         response = await axios.post(
@@ -82,7 +102,7 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
       } else {
         // 📎 PDF upload — send multipart form to /invoices/
         const formData = new FormData();
-        formData.append("file", selectedFile);
+        formData.append("file", selectedFiles[0]);
         formData.append("invoice_data", JSON.stringify(safeMetadata));
 
         response = await axios.post(
@@ -97,9 +117,10 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
         );
       }
 
-      if (response.status === 200 || response.status === 201) {
-        setMessage("✅ Upload successful!");
-        setSelectedFile(null);
+      if (response.status === 200 || response.status === 201 || response.status === 202) {
+        // 202 means the PDF was accepted and is being extracted in the background
+        setMessage(response.status === 202 ? "✅ Upload successful! Extracting invoice data..." : "✅ Upload successful!");
+        setSelectedFiles([]);
         setMetadata({ vendor: "", amount: "", invoice_date: "", category: "" });
         if (onUploadSuccess) onUploadSuccess();
       } else {
@@ -127,13 +148,15 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
         backgroundColor: "#fafafa",
       }}
     >
-      <Typography variant="h6">Upload Invoice (PDF only)</Typography>
+      <Typography variant="h6">Upload Invoices (PDF or ZIP)</Typography>
 
       {!manualEntry && (
         <Box mt={2}>
           <input
             ref={fileInputRef}
             type="file"
+            accept=".pdf,.zip"
+            multiple
             hidden
             onChange={handleFileSelect}
           />
@@ -141,10 +164,13 @@ const InvoiceUpload = ({ onUploadSuccess }) => {
             Select File
           </Button>
           <Typography variant="body2" mt={1}>
-            Or drag & drop a PDF here
+            Or drag & drop PDFs or a ZIP here
           </Typography>
-          {selectedFile && (
-            <Typography mt={1}>Selected File: {selectedFile.name}</Typography>
+          {selectedFiles.length === 1 && (
+            <Typography mt={1}>Selected File: {selectedFiles[0].name}</Typography>
+          )}
+          {selectedFiles.length > 1 && (
+            <Typography mt={1}>Selected Files: {selectedFiles.length}</Typography>
           )}
         </Box>
       )}
@@ -10,7 +10,13 @@ import DeleteIcon from '@mui/icons-material/Delete';
 import IconButton from '@mui/material/IconButton';
 import { Divider } from '@mui/material';
 import React, { useEffect, useState } from 'react';
-import { getInvoices, deleteInvoice } from '../services/api';
+import {
+  getInvoices,
+  deleteInvoice,
+  getCategoryStats,
+  getMonthlyStats,
+  getVendorStats,
+} from '../services/api';
 import {
   Container,
   Typography,
@@ -21,18 +27,35 @@ import {
 
 const DashboardPage = () => {
   const [invoices, setInvoices] = useState([]);
+  const [stats, setStats] = useState({ categories: [], months: [], vendors: [] });
   const [loading, setLoading] = useState(true);
 
   const handleDelete = async (id) => {
     try {
       await deleteInvoice(id);
       setInvoices((prev) => prev.filter((inv) => inv.id !== id));
+      loadStats();
     } catch (err) {
       console.error('Failed to delete invoice:', err);
     }
   };
 
+  // Chart data is aggregated by the server, so it covers every invoice
+  const loadStats = async () => {
+    try {
+      const [categories, months, vendors] = await Promise.all([
+        getCategoryStats(),
+        getMonthlyStats(),
+        getVendorStats(),
+      ]);
+      setStats({ categories, months, vendors });
+    } catch (error) {
+      console.error('Failed to load stats:', error);
+    }
+  };
+
   const loadInvoices = async () => {
+    loadStats();
     try {
       const data = await getInvoices();
       setInvoices(data);
@@ -75,14 +98,16 @@ const DashboardPage = () => {
             <Grid item xs={12} sm={6} md={4}>
               <Paper sx={{ p: 2, minWidth: 200, textAlign: 'center', boxShadow: 3 }}>
                 <Typography variant="h6">Total Invoices</Typography>
-                <Typography variant="h4">{invoices.length}</Typography>
+                <Typography variant="h4">
+                {stats.categories.reduce((sum, row) => sum + row.invoice_count, 0)}
+                </Typography>
               </Paper>
             </Grid>
             <Grid item xs={12} sm={6} md={4}>
               <Paper sx={{ p: 2, minWidth: 200, textAlign: 'center', boxShadow: 3 }}>
                 <Typography variant="h6">Total Spend</Typography>
                 <Typography variant="h4">
-                ${invoices.reduce((sum, inv) => sum + (Number(inv.amount) || 0), 0).toFixed(2)}
+                ${stats.categories.reduce((sum, row) => sum + row.total_amount, 0).toFixed(2)}
                 </Typography>
               </Paper>
             </Grid>
@@ -96,16 +121,16 @@ const DashboardPage = () => {
             
             
             <Box sx={{ mb: 5 }}>
-            <CategoryPieChart invoices={invoices} />
+            <CategoryPieChart stats={stats.categories} />
 </Box>
 
 
             <Box sx={{ mb: 5 }}>
-  <MonthlySpendingChart invoices={invoices} />
+  <MonthlySpendingChart stats={stats.months} />
 </Box>
 
 <Box sx={{ mb: 5 }}>
-  <VendorSpendingChart invoices={invoices} />
+  <VendorSpendingChart stats={stats.vendors} />
 </Box>
           </Box>
 
@@ -52,6 +52,31 @@ export const uploadInvoice = async (file, metadata = {}) => {
   return response.data;
 };
 
+// Dashboard aggregations - computed on the server, optional { date_from, date_to }
+export const getCategoryStats = async (params = {}) => {
+  const response = await api.get('/invoices/stats/by-category', { params });
+  return response.data;
+};
+
+export const getMonthlyStats = async (params = {}) => {
+  const response = await api.get('/invoices/stats/by-month', { params });
+  return response.data;
+};
+
+export const getVendorStats = async (params = {}) => {
+  const response = await api.get('/invoices/stats/by-vendor', { params });
+  return response.data;
+};
+
+// Upload many PDFs (or ZIP archives of PDFs) in one request
+export const bulkUploadInvoices = async (files) => {
+  const formData = new FormData();
+  files.forEach((file) => formData.append('files', file));
+
+  const response = await api.post('/invoices/bulk', formData);
+  return response.data;
+};
+
 export const updateInvoice = async (id, data) => {
   const response = await api.put(`/invoices/${id}`, data);
   return response.data;
@@ -0,0 +1,168 @@
+# openai_stub_server.py
+
+# A tiny local stand-in for the OpenAI chat completions API.
+# It answers like the real thing, but lets us add latency and send 429s on
+# purpose, so we can test retries and rate limiting without spending money.
+#
+# Run it on its own:   python openai_stub_server.py --port 8765 --rate-limit-every 5
+# Then point the backend at it:   OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# What the fake model "extracts" from every invoice
+CANNED_EXTRACTION = {
+    "vendor": "Stub Vendor Inc",
+    "amount": 123.45,
+    "invoice_date": "2025-03-01",
+    "category": "Services",
+    "currency": "USD",
+}
+
+
+def canned_answer(request):
+    """
+    The fake model's answer. Grouped requests (several "### Invoice <id>"
+    sections) get one entry per invoice, everything else a single object.
+    """
+    user_message = request.get("messages", [{}])[-1].get("content", "")
+    invoice_ids = re.findall(r"^### Invoice (\d+)$", user_message, re.MULTILINE)
+    if invoice_ids:
+        return {"invoices": [dict(CANNED_EXTRACTION, invoice_id=int(i)) for i in invoice_ids]}
+    return CANNED_EXTRACTION
+
+
+def canned_batch_output(batch_path, output_path, failing_ids=()):
+    """
+    Writes what the Batch API would return for a batch input file.
+    Invoices in failing_ids get an error line instead of an answer.
+    """
+    with open(batch_path) as source, open(output_path, "w") as output:
+        for number, line in enumerate(source):
+            request = json.loads(line)
+            invoice_id = int(request["custom_id"].split("-")[-1])
+            if invoice_id in failing_ids:
+                record = {"id": f"batch_req_{number}", "custom_id": request["custom_id"], "response": None,
+                          "error": {"code": "server_error", "message": "Simulated failure"}}
+            else:
+                record = {"id": f"batch_req_{number}", "custom_id": request["custom_id"], "error": None,
+                          "response": {"status_code": 200, "body": {
+                              "object": "chat.completion",
+                              "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                                  "role": "assistant", "content": json.dumps(canned_answer(request["body"]))}}],
+                          }}}
+            output.write(json.dumps(record) + "\n")
+
+
+class StubOpenAIServer:
+    """
+    Fake OpenAI server running in a background thread
+
+    latency           - seconds to wait before answering each request
+    rate_limit_every  - answer every Nth request with a 429 (0 = never)
+    retry_after       - value of the Retry-After header on 429s
+    """
+
+    def __init__(self, latency=0.05, rate_limit_every=0, retry_after=0.2, port=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass  # keep test output readable
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+
+                with stub._lock:
+                    stub.requests += 1
+                    limited = stub.rate_limit_every and stub.requests % stub.rate_limit_every == 0
+                    if limited:
+                        stub.rate_limited += 1
+
+                if limited:
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": str(stub.retry_after)},
+                    )
+                    return
+
+                time.sleep(stub.latency)
+                prompt_tokens = sum(len(m.get("content", "")) // 4 for m in request.get("messages", []))
+                content = json.dumps(canned_answer(request))
+                with stub._lock:
+                    stub.completed += 1
+                self._send_json(200, {
+                    "id": f"chatcmpl-stub-{stub.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-3.5-turbo"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt_tokens + len(content) // 4,
+                    },
+                })
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI API for local testing")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(args.latency, args.rate_limit_every, args.retry_after, args.port)
+    print(f"Stub OpenAI server listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,108 @@
+# test_batch_extraction.py
+
+# Runs both offline batch modes end to end against local fakes:
+# grouped requests go to the stub server, and the batch file is "answered"
+# with canned JSONL. No API key or network needed.
+#
+# Run it from the repo root:   python tests/test_batch_extraction.py
+
+import os
+import sys
+import asyncio
+import tempfile
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "backend"))
+
+from openai import AsyncOpenAI
+from openai_stub_server import StubOpenAIServer, CANNED_EXTRACTION, canned_batch_output
+
+
+def make_invoices(label):
+    # Distinct texts per test, so one test's answers don't come back from the extraction cache
+    return [(invoice_id, f"{label} invoice {invoice_id}\nTotal due: $123.45") for invoice_id in range(1, 13)]
+
+
+def load_services(base_url):
+    """Import the services and point the async OpenAI client at the stub"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    from services import openai_service, batch_extraction
+    from services.extraction_cache import ExtractionCache
+    openai_service.async_client = AsyncOpenAI(base_url=base_url, api_key="sk-stub", max_retries=0)
+    # A fresh cache per test, so answers from earlier runs don't skip the stub
+    cache = ExtractionCache(path=os.path.join(tempfile.mkdtemp(), "extraction_cache.db"))
+    openai_service.extraction_cache = batch_extraction.extraction_cache = cache
+    return batch_extraction
+
+
+def test_grouped_extraction():
+    """12 invoices in groups of 5 should take 3 requests"""
+    stub = StubOpenAIServer(latency=0.01)
+    batch = load_services(stub.start())
+    try:
+        invoices = make_invoices("Grouped")
+        results, stats = asyncio.run(batch.run_grouped_extraction(invoices, group_size=5))
+        print(f"✅ Grouped extraction: {stats}")
+        assert stats["grouped_requests"] == 3
+        assert stats["retried_individually"] == 0
+        assert stub.requests == 3
+        assert all(error is None and data == CANNED_EXTRACTION for data, error, method in results.values())
+        assert sorted(results) == [invoice_id for invoice_id, _ in invoices]
+    finally:
+        stub.stop()
+
+
+def test_grouped_answers_are_cached_apart():
+    """A second grouped run is served by the cache, saved as "cache", and single extractions don't see it"""
+    stub = StubOpenAIServer(latency=0.01)
+    batch = load_services(stub.start())
+    try:
+        invoices = make_invoices("Cached group")
+        asyncio.run(batch.run_grouped_extraction(invoices, group_size=5))
+        results, stats = asyncio.run(batch.run_grouped_extraction(invoices, group_size=5))
+        print(f"✅ Grouped extraction again: {stats}")
+        assert stats["served_by_cache"] == len(invoices) and stub.requests == 3
+        assert all(method == "cache" for data, error, method in results.values())
+        # The grouped prompt's answer isn't one the single prompt gave
+        invoice_text = invoices[0][1]
+        assert batch.extraction_cache.get(batch.extraction_cache_key(invoice_text)) is None
+        assert batch.extraction_cache.get(batch.extraction_cache_key(invoice_text, batch.GROUPED_PROMPT_MODE)) == CANNED_EXTRACTION
+    finally:
+        stub.stop()
+
+
+def test_batch_file_round_trip():
+    """Failed lines in the results file get retried one request each"""
+    stub = StubOpenAIServer(latency=0.01)
+    batch = load_services(stub.start())
+    try:
+        invoices = make_invoices("Batch file")
+        with tempfile.TemporaryDirectory() as folder:
+            batch_path = os.path.join(folder, "batch.jsonl")
+            output_path = os.path.join(folder, "results.jsonl")
+
+            assert batch.write_batch_file(invoices, batch_path) == len(invoices)
+            canned_batch_output(batch_path, output_path, failing_ids={3, 7})
+
+            results = batch.read_batch_results(output_path)
+            failed = [invoice_id for invoice_id, (data, error, method) in results.items() if error is not None]
+            assert sorted(failed) == [3, 7]
+
+            texts = dict(invoices)
+            retried = asyncio.run(batch.retry_individually([(invoice_id, texts[invoice_id]) for invoice_id in failed]))
+            results.update(retried)
+
+        print(f"✅ Batch file: {len(results)} results, {len(failed)} retried individually")
+        assert all(error is None and data == CANNED_EXTRACTION for data, error, method in results.values())
+        assert stub.requests == len(failed)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    print("===== TESTING BATCH EXTRACTION =====")
+    test_grouped_extraction()
+    test_grouped_answers_are_cached_apart()
+    test_batch_file_round_trip()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,52 @@
+# test_data_version.py
+
+# Checks the ETags behind conditional GETs - no database, no server.
+#
+# Run it from the repo root:   python tests/test_data_version.py
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi import Response # type: ignore
+from starlette.requests import Request # type: ignore
+
+from services.data_version import data_etag, not_modified
+
+def make_request(path="/invoices/", query="", if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+USER = SimpleNamespace(id=7, data_version=3)
+
+def test_tag_changes_with_version_user_and_url():
+    tag = data_etag(make_request(), USER)
+    assert tag != data_etag(make_request(), SimpleNamespace(id=7, data_version=4))
+    assert tag != data_etag(make_request(), SimpleNamespace(id=8, data_version=3))
+    assert tag != data_etag(make_request(query="category=Travel"), USER)
+    print(f"✅ ETag {tag}")
+
+def test_matching_tag_gives_304():
+    tag = data_etag(make_request(), USER)
+    for header in (tag, tag.removeprefix("W/"), f'"other", {tag}', "*"):
+        cached = not_modified(make_request(if_none_match=header), Response(), USER)
+        assert cached is not None and cached.status_code == 304, header
+        assert cached.headers["etag"] == tag
+    print("✅ Matching If-None-Match returns 304")
+
+def test_stale_tag_sets_header_and_continues():
+    response = Response()
+    stale = data_etag(make_request(), SimpleNamespace(id=7, data_version=2))
+    assert not_modified(make_request(if_none_match=stale), response, USER) is None
+    assert response.headers["etag"] == data_etag(make_request(), USER)
+    assert not_modified(make_request(), Response(), USER) is None
+    print("✅ Stale or missing If-None-Match gets the full response")
+
+if __name__ == "__main__":
+    print("===== TESTING CONDITIONAL GETS =====")
+    test_tag_changes_with_version_user_and_url()
+    test_matching_tag_gives_304()
+    test_stale_tag_sets_header_and_continues()
+    print("===== TEST COMPLETED =====")
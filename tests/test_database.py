@@ -0,0 +1,44 @@
+# test_database.py
+
+# Checks the engine settings from database.make_engine on throwaway SQLite
+# databases - no server needed.
+#
+# Run it from the repo root:   python tests/test_database.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import text
+
+from database import SQLITE_BUSY_TIMEOUT_MS, make_engine
+
+def test_sqlite_file_gets_wal_and_pragmas():
+    engine = make_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pragmas.db')}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT_MS
+        assert conn.execute(text("PRAGMA mmap_size")).scalar() > 0
+    assert engine.pool.size() > 5, "The pool should be bigger than SQLAlchemy's default"
+    engine.dispose()
+    print("✅ SQLite files use WAL with the tuned pragmas")
+
+def test_memory_database_is_shared():
+    # With a normal pool every connection would get its own empty database
+    engine = make_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE things (id INTEGER)"))
+        conn.execute(text("INSERT INTO things VALUES (1)"))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM things")).scalar() == 1
+    engine.dispose()
+    print("✅ In-memory databases are shared by all connections")
+
+if __name__ == "__main__":
+    print("===== TESTING DATABASE SETTINGS =====")
+    test_sqlite_file_gets_wal_and_pragmas()
+    test_memory_database_is_shared()
+    print("===== TEST COMPLETED =====")
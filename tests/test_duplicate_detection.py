@@ -0,0 +1,62 @@
+# test_duplicate_detection.py
+
+# Checks the SimHash fingerprints and the checks that decide whether an
+# upload is a copy of an earlier invoice - no database, no server and no
+# OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_duplicate_detection.py
+
+import os
+import sys
+import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.duplicate_detection import text_backs_up
+from utils.simhash import BANDS, bands, hamming_distance, simhash, to_signed, to_unsigned
+
+TERMS = "\n".join([
+    "Payment is due within thirty days of the invoice date.",
+    "Late payments incur interest of 1.5% per month.",
+    "Goods remain our property until paid in full.",
+    "Please quote the invoice number with your payment.",
+] * 5)
+
+def northwind_invoice(number, date, total):
+    items = "\n".join(f"Item {name} {qty} x {qty * 7}.00" for qty, name in enumerate(["paper", "toner", "pens", "folders", "staples"] * 4, 1))
+    return f"Northwind Supplies\nInvoice #{number}\nInvoice Date: {date}\n{items}\nTotal Due: {total}\n{TERMS}"
+
+ORIGINAL = northwind_invoice("NW-1001", "03/15/2024", "$1,080.00")
+ORIGINAL_FIELDS = SimpleNamespace(vendor="Northwind Supplies", amount_cents=108000, issued_on=datetime.date(2024, 3, 15))
+
+def test_resent_copy_stays_close():
+    resent = ORIGINAL + "\nPrinted 2024-05-01 10:22:31 by the billing system"
+    distance = hamming_distance(simhash(ORIGINAL), simhash(resent))
+    print(f"✅ Re-sent copy is {distance} bits away")
+    assert distance < BANDS
+
+    # Close fingerprints share at least one bucket, which is what the lookup relies on
+    assert set(bands(simhash(ORIGINAL))) & set(bands(simhash(resent)))
+    assert text_backs_up(resent, ORIGINAL_FIELDS)
+
+def test_next_month_is_not_a_copy():
+    # Same vendor and layout, so the fingerprints may well be close - the numbers decide
+    next_month = northwind_invoice("NW-1042", "04/15/2024", "$1,080.00")
+    assert not text_backs_up(next_month, ORIGINAL_FIELDS)
+
+    other_vendor = ORIGINAL.replace("Northwind Supplies", "Contoso Ltd")
+    assert not text_backs_up(other_vendor, ORIGINAL_FIELDS)
+    print("✅ Different dates or vendors aren't copies")
+
+def test_fingerprints_round_trip_through_signed_storage():
+    fingerprint = simhash(ORIGINAL)
+    assert to_unsigned(to_signed(fingerprint)) == fingerprint
+    assert -2 ** 63 <= to_signed(fingerprint) < 2 ** 63
+
+if __name__ == "__main__":
+    print("===== TESTING DUPLICATE DETECTION =====")
+    test_resent_copy_stays_close()
+    test_next_month_is_not_a_copy()
+    test_fingerprints_round_trip_through_signed_storage()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,89 @@
+# test_event_hub.py
+
+# Checks the pub/sub hub behind GET /invoices/events: delivery to the
+# right owner, Last-Event-ID replay and the resync cases - no server.
+#
+# Run it from the repo root:   python tests/test_event_hub.py
+
+import os
+import sys
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services import event_hub as hub_module
+from services.event_hub import EventHub
+
+def test_events_reach_only_their_owner():
+    async def run():
+        hub = EventHub()
+        hub.start()
+        mine, theirs = hub.subscribe(1), hub.subscribe(2)
+        # Workers publish from threads
+        thread = threading.Thread(target=hub.publish, args=(1, "extraction_finished", {"invoice_id": 5}))
+        thread.start()
+        thread.join()
+        event = await asyncio.wait_for(mine.queue.get(), timeout=1)
+        assert event.type == "extraction_finished" and event.data == {"invoice_id": 5}
+        assert theirs.queue.empty()
+        assert event.encode().startswith(f"id: {hub.boot_id}-1\nevent: extraction_finished\ndata: ")
+
+        hub.unsubscribe(mine)
+        hub.unsubscribe(theirs)
+        assert hub.subscriber_count() == 0
+    asyncio.run(run())
+    print("✅ Events go to their owner's streams only")
+
+def test_replay_after_last_event_id():
+    hub = EventHub()
+    for invoice_id in range(1, 6):
+        hub.publish(1, "uploaded", {"invoice_id": invoice_id})
+        hub.publish(2, "uploaded", {"invoice_id": invoice_id})
+    # The client saw owner 1's first event; owner 2's events in between don't count as missing
+    missed, complete = hub.replay(1, f"{hub.boot_id}-1")
+    assert complete and [event.data["invoice_id"] for event in missed] == [2, 3, 4, 5]
+    print("✅ Missed events are replayed")
+
+def test_unknown_or_dropped_ids_need_a_resync():
+    hub = EventHub()
+    hub.publish(1, "uploaded", {"invoice_id": 1})
+    # An id from before a restart
+    assert hub.replay(1, "0000abcd-1") == ([], False)
+    assert hub.replay(1, "garbage")[1] is False
+
+    for invoice_id in range(hub_module.BUFFER_PER_OWNER + 10):
+        hub.publish(1, "uploaded", {"invoice_id": invoice_id})
+    missed, complete = hub.replay(1, f"{hub.boot_id}-1")
+    assert not complete and len(missed) == hub_module.BUFFER_PER_OWNER
+    print("✅ Ids the buffer can't serve ask for a resync")
+
+def test_evicted_owner_needs_a_resync():
+    hub = EventHub()
+    original = hub_module.MAX_BUFFERED_OWNERS
+    hub_module.MAX_BUFFERED_OWNERS = 2
+    try:
+        hub.publish(1, "uploaded", {"invoice_id": 1})
+        hub.publish(1, "uploaded", {"invoice_id": 2})
+        # Two busier owners push owner 1's buffer out
+        hub.publish(2, "uploaded", {"invoice_id": 3})
+        hub.publish(3, "uploaded", {"invoice_id": 4})
+        assert hub.replay(1, f"{hub.boot_id}-1") == ([], False)
+
+        # A new buffer for owner 1 doesn't bring back the dropped event either
+        hub.publish(1, "uploaded", {"invoice_id": 5})
+        assert hub.replay(1, f"{hub.boot_id}-1")[1] is False
+        # A client that had seen everything before the new buffer is fine
+        missed, complete = hub.replay(1, f"{hub.boot_id}-4")
+        assert complete and [event.data["invoice_id"] for event in missed] == [5]
+    finally:
+        hub_module.MAX_BUFFERED_OWNERS = original
+    print("✅ Owners whose buffer was dropped ask for a resync")
+
+if __name__ == "__main__":
+    print("===== TESTING EVENT HUB =====")
+    test_events_reach_only_their_owner()
+    test_replay_after_last_event_id()
+    test_unknown_or_dropped_ids_need_a_resync()
+    test_evicted_owner_needs_a_resync()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,43 @@
+# test_extraction_cache.py
+
+# Checks the two-tier extraction cache on a throwaway SQLite file - no
+# server, no OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_extraction_cache.py
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.extraction_cache import ExtractionCache
+
+DATA = {"vendor": "Northwind Supplies", "amount": 1080.0, "invoice_date": "2024-03-15"}
+
+def make_cache(max_age_seconds):
+    return ExtractionCache(path=os.path.join(tempfile.mkdtemp(), "extraction_cache.db"), max_age_seconds=max_age_seconds)
+
+def test_memory_tier_serves_fresh_entries():
+    cache = make_cache(max_age_seconds=3600)
+    cache.set("key", DATA)
+    assert cache.get("key") == DATA
+    assert cache.stats()["memory_hits"] == 1
+    print("✅ A fresh entry comes from memory")
+
+def test_memory_tier_expires_with_the_disk_tier():
+    cache = make_cache(max_age_seconds=0.05)
+    cache.set("key", DATA)
+    time.sleep(0.1)
+    # Still in the LRU, but older than the disk tier would serve
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert stats["memory_hits"] == 0 and stats["misses"] == 1 and stats["memory_entries"] == 0
+    print("✅ An expired entry isn't served from memory")
+
+if __name__ == "__main__":
+    print("===== TESTING EXTRACTION CACHE =====")
+    test_memory_tier_serves_fresh_entries()
+    test_memory_tier_expires_with_the_disk_tier()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,89 @@
+# test_extraction_queue.py
+
+# Checks the job queue's claims: a worker whose job timed out and was
+# claimed again can't overwrite the new claimer's result. Uses a throwaway
+# SQLite database, no server and no OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_extraction_queue.py
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from migrations import run_migrations
+from models.invoice import Invoice, EXTRACTION_COMPLETED, EXTRACTION_PENDING, EXTRACTION_PROCESSING
+from models.user import User
+from services import extraction_queue
+from services.extraction_queue import claim_invoice, claim_next_job, save_job_result
+
+# No vendor, so the vendor directory (and its own database) stays out of it
+FIELDS = {"amount": 42.5, "invoice_date": "2024-05-01", "category": "Supplies", "currency": "USD"}
+
+def make_queue():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'queue.db')}")
+    run_migrations(engine)
+    sessions = sessionmaker(bind=engine)
+    extraction_queue.SessionLocal = sessions
+    db = sessions()
+    db.add(User(id=1, email="queue@example.com", hashed_password="x"))
+    invoice = Invoice(owner_id=1, file_path="uploads/x.pdf", extraction_status=EXTRACTION_PENDING, extraction_attempts=0)
+    db.add(invoice)
+    db.commit()
+    return db, invoice.id
+
+def test_reclaimed_job_ignores_the_stale_result():
+    db, invoice_id = make_queue()
+    original_timeout = extraction_queue.CLAIM_TIMEOUT_SECONDS
+    try:
+        first = claim_next_job()
+        assert first[0] == invoice_id
+        # The first worker takes too long (OpenAI retries), so the job is handed out again
+        extraction_queue.CLAIM_TIMEOUT_SECONDS = 0
+        time.sleep(0.01)
+        second = claim_next_job()
+        assert second[0] == invoice_id and second[1] != first[1]
+    finally:
+        extraction_queue.CLAIM_TIMEOUT_SECONDS = original_timeout
+
+    claim = {"claimed_status": EXTRACTION_PROCESSING}
+    assert save_job_result(invoice_id, FIELDS, method="llm", claimed_at=second[1], **claim)
+    # The first worker finally gives up - its failure must not replace the result
+    assert not save_job_result(invoice_id, error=RuntimeError("timed out"), claimed_at=first[1], **claim)
+
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).one()
+    assert invoice.extraction_status == EXTRACTION_COMPLETED and invoice.amount == 42.5
+    assert invoice.extraction_error is None
+    print("✅ A late result from a reclaimed job is dropped")
+
+def test_claiming_changes_the_data_version():
+    db, invoice_id = make_queue()
+    user = db.query(User).filter(User.id == 1).one()
+    versions = [user.data_version]
+    for claim in (lambda: claim_next_job(), lambda: claim_invoice(db, invoice_id, EXTRACTION_COMPLETED)):
+        claim()
+        db.refresh(user)
+        versions.append(user.data_version)
+    # The worker's claim shows the invoice as processing; a claim that found nothing changes nothing
+    assert versions[1] == versions[0] + 1 and versions[2] == versions[1]
+    print("✅ Claiming a job bumps the owner's data version")
+
+def test_claimed_invoice_cannot_be_claimed_twice():
+    db, invoice_id = make_queue()
+    assert claim_invoice(db, invoice_id, EXTRACTION_PENDING) is not None
+    # A manual extract (or a worker) finding it processing gets nothing
+    assert claim_invoice(db, invoice_id, EXTRACTION_PENDING) is None
+    assert claim_next_job() is None
+    print("✅ A claimed invoice isn't handed out again")
+
+if __name__ == "__main__":
+    print("===== TESTING EXTRACTION QUEUE =====")
+    test_reclaimed_job_ignores_the_stale_result()
+    test_claiming_changes_the_data_version()
+    test_claimed_invoice_cannot_be_claimed_twice()
+    print("===== TEST COMPLETED =====")
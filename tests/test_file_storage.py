@@ -0,0 +1,87 @@
+# test_file_storage.py
+
+# Checks that a shared stored PDF is only deleted when no invoice needs it,
+# including when the same content is uploaded again while it's being
+# released. Uses a throwaway folder and SQLite database.
+#
+# Run it from the repo root:   python tests/test_file_storage.py
+
+import io
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from migrations import run_migrations
+from models.invoice import Invoice
+from utils import file_storage
+from utils.file_storage import (
+    RECENT_UPLOAD_SECONDS, RELEASE_DELETED, RELEASE_IN_USE, RELEASE_RECENT, release_file, store_stream,
+)
+
+def make_storage():
+    folder = tempfile.mkdtemp()
+    file_storage.OBJECTS_DIR = os.path.join(folder, "objects")
+    file_storage.TMP_DIR = os.path.join(folder, "tmp")
+    engine = create_engine(f"sqlite:///{os.path.join(folder, 'storage.db')}")
+    run_migrations(engine)
+    return sessionmaker(bind=engine)()
+
+def store(content):
+    return store_stream(io.BytesIO(content))
+
+def age(path):
+    # Pretend the file was stored long ago
+    old = time.time() - RECENT_UPLOAD_SECONDS - 10
+    os.utime(path, (old, old))
+
+def test_unreferenced_file_is_deleted():
+    db = make_storage()
+    stored = store(b"%PDF-1.4 only copy")
+    age(stored.path)
+    assert release_file(db, stored.sha256, stored.path) == RELEASE_DELETED
+    assert not os.path.exists(stored.path)
+    print("✅ A file no invoice references is deleted")
+
+def test_referenced_file_is_kept():
+    db = make_storage()
+    stored = store(b"%PDF-1.4 shared copy")
+    age(stored.path)
+    db.add(Invoice(owner_id=1, file_path=stored.path, content_hash=stored.sha256))
+    db.commit()
+    assert release_file(db, stored.sha256, stored.path) == RELEASE_IN_USE
+    assert os.path.exists(stored.path)
+    print("✅ A file another invoice references is kept")
+
+def test_upload_of_same_content_keeps_file():
+    db = make_storage()
+    stored = store(b"%PDF-1.4 deleted, then uploaded again")
+    age(stored.path)
+    # The same content is uploaded again; its invoice row isn't committed yet
+    again = store(b"%PDF-1.4 deleted, then uploaded again")
+    assert again.path == stored.path
+    assert release_file(db, stored.sha256, stored.path) == RELEASE_RECENT
+    assert os.path.exists(stored.path), "The new upload still needs the file"
+    print("✅ Content uploaded again during a release is kept for later")
+
+def test_upload_after_release_stores_a_fresh_copy():
+    db = make_storage()
+    stored = store(b"%PDF-1.4 released first")
+    age(stored.path)
+    assert release_file(db, stored.sha256, stored.path) == RELEASE_DELETED
+    again = store(b"%PDF-1.4 released first")
+    assert os.path.exists(again.path)
+    print("✅ An upload after the release stores its own copy")
+
+if __name__ == "__main__":
+    print("===== TESTING FILE STORAGE =====")
+    test_unreferenced_file_is_deleted()
+    test_referenced_file_is_kept()
+    test_upload_of_same_content_keeps_file()
+    test_upload_after_release_stores_a_fresh_copy()
+    print("===== TEST COMPLETED =====")
@@ -7,6 +7,7 @@
 import requests  # For making HTTP requests to our API
 import json  # For handling JSON data
 import os  # For file operations
+import time  # For polling the extraction status
 
 # Our API settings - where the server lives and login details
 API_BASE = "http://localhost:8000"  # This is just on my local computer for testing
@@ -84,7 +85,7 @@ def test_upload(token, file_path, metadata):
         )
     
     # Check if upload worked and show results
-    if response.status_code in (200, 201):
+    if response.status_code in (200, 201, 202):
         print(f"✅ Upload successful (Status: {response.status_code})")
         result = response.json()
         print(f"   Invoice ID: {result.get('id')}")
@@ -95,6 +96,37 @@ def test_upload(token, file_path, metadata):
         return None
 
 
+def test_extraction_status(token, invoice_id, timeout=60):
+    """
+    Poll the extraction status until the background worker finishes
+    Uploads return right away now, so the fields fill in a little later
+    """
+    print(f"\nWaiting for extraction of invoice ID: {invoice_id}")
+    
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(
+            f"{API_BASE}/invoices/{invoice_id}/status",
+            headers=headers
+        )
+        if response.status_code != 200:
+            print(f"❌ Status check failed (Status: {response.status_code})")
+            print(f"   Error: {response.text}")
+            return None
+        
+        job = response.json()
+        if job.get("extraction_status") in ("completed", "failed"):
+            print(f"✅ Extraction {job['extraction_status']} after {job.get('extraction_attempts')} attempt(s)")
+            if job.get("extraction_error"):
+                print(f"   Last error: {job['extraction_error']}")
+            return job
+        time.sleep(1)
+    
+    print(f"❌ Extraction still running after {timeout} seconds")
+    return None
+
+
 def test_listing(token):
     """
     Get a list of all invoices for our user
@@ -256,14 +288,18 @@ def run_tests():
         print("❌ No invoices were uploaded successfully - cannot continue tests")
         return
     
-    # Step 4: List all invoices to make sure uploads worked
+    # Step 4: Wait for the background extraction of each upload to finish
+    for invoice_id in uploaded_ids:
+        test_extraction_status(token, invoice_id)
+    
+    # Step 5: List all invoices to make sure uploads worked
     test_listing(token)
     
-    # Step 5: Get details for one specific invoice
+    # Step 6: Get details for one specific invoice
     if uploaded_ids:
         test_get_invoice(token, uploaded_ids[0])
     
-    # Step 6: Update an invoice with new information
+    # Step 7: Update an invoice with new information
     if len(uploaded_ids) >= 2:
         update_data = {
             "vendor": "Office Supplies Inc. (Updated)",
@@ -271,15 +307,15 @@ def run_tests():
         }
         test_update(token, uploaded_ids[1], update_data)
     
-    # Step 7: List again to verify the update worked
+    # Step 8: List again to verify the update worked
     print("\nListing invoices after update:")
     test_listing(token)
     
-    # Step 8: Delete an invoice
+    # Step 9: Delete an invoice
     if len(uploaded_ids) >= 3:
         test_delete(token, uploaded_ids[2])
     
-    # Step 9: List again to confirm deletion worked
+    # Step 10: List again to confirm deletion worked
     print("\nListing invoices after deletion:")
     test_listing(token)
     
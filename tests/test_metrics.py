@@ -0,0 +1,65 @@
+# test_metrics.py
+
+# Checks the Prometheus text output of utils/metrics.py - no server.
+#
+# Run it from the repo root:   python tests/test_metrics.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from utils.metrics import REGISTRY, CallbackMetric, Counter, Gauge, Histogram
+
+def unregister(*metrics):
+    for metric in metrics:
+        REGISTRY.remove(metric)
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_step_seconds", "A step", ["step"], buckets=(0.1, 1.0))
+    try:
+        for seconds in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(seconds, step="parse")
+        lines = histogram.render().splitlines()
+        assert lines[:2] == ["# HELP test_step_seconds A step", "# TYPE test_step_seconds histogram"]
+        assert 'test_step_seconds_bucket{step="parse",le="0.1"} 2' in lines
+        assert 'test_step_seconds_bucket{step="parse",le="1.0"} 3' in lines
+        assert 'test_step_seconds_bucket{step="parse",le="+Inf"} 4' in lines
+        assert 'test_step_seconds_count{step="parse"} 4' in lines
+        assert 'test_step_seconds_sum{step="parse"} 3.65' in lines
+    finally:
+        unregister(histogram)
+    print("✅ Histogram buckets count everything at or below their bound")
+
+def test_counters_gauges_and_callbacks():
+    counter = Counter("test_failures_total", "Failures", ["final"])
+    gauge = Gauge("test_in_progress", "In progress")
+    callback = CallbackMetric("test_hits_total", "Hits", "counter", lambda: {("disk",): 3}, labelnames=["where"])
+    try:
+        counter.inc(final="true")
+        counter.inc(2, final="true")
+        assert 'test_failures_total{final="true"} 3' in counter.render()
+        assert "test_in_progress 0" in gauge.render()  # Unlabeled metrics start at zero
+        with gauge.track():
+            assert "test_in_progress 1" in gauge.render()
+        assert "test_in_progress 0" in gauge.render()
+        assert 'test_hits_total{where="disk"} 3' in callback.render()
+    finally:
+        unregister(counter, gauge, callback)
+    print("✅ Counters, gauges and callback metrics render")
+
+def test_label_values_are_escaped():
+    counter = Counter("test_escape_total", "Escaping", ["route"])
+    try:
+        counter.inc(route='a"b\\c\nd')
+        assert 'route="a\\"b\\\\c\\nd"' in counter.render()
+    finally:
+        unregister(counter)
+    print("✅ Label values are escaped")
+
+if __name__ == "__main__":
+    print("===== TESTING METRICS =====")
+    test_histogram_buckets_are_cumulative()
+    test_counters_gauges_and_callbacks()
+    test_label_values_are_escaped()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,48 @@
+# test_normalize.py
+
+# Checks how amounts written in different styles are turned into cents -
+# no database, no server.
+#
+# Run it from the repo root:   python tests/test_normalize.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from utils.normalize import normalize_currency, parse_amount
+
+def test_common_amount_styles():
+    assert parse_amount("$1,234.56") == (123456, "USD")
+    assert parse_amount("1.234,56 €") == (123456, "EUR")
+    assert parse_amount("USD 980.00") == (98000, "USD")
+    assert parse_amount(12.5) == (1250, None)
+    print("✅ US and European amounts with cents are parsed")
+
+def test_dot_thousands_follow_the_currency():
+    # Written the European way, "1.234" is one thousand two hundred thirty-four
+    assert parse_amount("1.234 €") == (123400, "EUR")
+    assert parse_amount("EUR 12.500") == (1250000, "EUR")
+    assert parse_amount("1.234.567") == (123456700, None)
+    # For a dollar amount it could be either, so we don't guess
+    assert parse_amount("$1.234") == (None, "USD")
+    assert parse_amount("0.125") == (13, None)
+    print("✅ A dot before three digits is thousands only where the currency writes it that way")
+
+def test_tax_labels_are_not_currencies():
+    # Three capitals next to a number are only a currency when they're an ISO code
+    assert parse_amount("VAT 20.00") == (2000, None)
+    assert parse_amount("TAX 5.00") == (500, None)
+    assert parse_amount("NET 30") == (3000, None)
+    assert parse_amount("VAT 20.00 EUR") == (2000, "EUR")
+    assert parse_amount("VAT $3.00") == (300, "USD")
+    assert normalize_currency("VAT") is None
+    assert normalize_currency("eur") == "EUR"
+    print("✅ VAT, TAX and NET labels don't become currencies")
+
+if __name__ == "__main__":
+    print("===== TESTING AMOUNT PARSING =====")
+    test_common_amount_styles()
+    test_dot_thousands_follow_the_currency()
+    test_tax_labels_are_not_currencies()
+    print("===== TEST COMPLETED =====")
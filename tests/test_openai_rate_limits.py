@@ -0,0 +1,115 @@
+# test_openai_rate_limits.py
+
+# Tests the async OpenAI extraction path against the local stub server
+# (openai_stub_server.py), so no API key or network is needed.
+# Checks that 429s get retried and that we never go over the concurrency limit.
+#
+# Run it from the repo root:   python tests/test_openai_rate_limits.py
+
+import os
+import sys
+import time
+import asyncio
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "backend"))
+
+from openai import AsyncOpenAI
+from openai_stub_server import StubOpenAIServer, CANNED_EXTRACTION
+
+INVOICE_COUNT = 40
+
+
+def load_openai_service(base_url):
+    """Import the service and point its async client at the stub"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    from services import openai_service
+    openai_service.async_client = AsyncOpenAI(base_url=base_url, api_key="sk-stub", max_retries=0)
+    return openai_service
+
+
+def test_retries_rate_limits():
+    """Every 5th request gets a 429 - every extraction should still succeed"""
+    stub = StubOpenAIServer(latency=0.05, rate_limit_every=5, retry_after=0.1)
+    service = load_openai_service(stub.start())
+    try:
+        async def run_all():
+            return await asyncio.gather(*[
+                service.extract_invoice_data_async(f"Invoice {i} total $123.45")
+                for i in range(INVOICE_COUNT)
+            ])
+
+        started = time.perf_counter()
+        results = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+
+        print(f"✅ {len(results)} extractions in {elapsed:.2f}s "
+              f"({stub.requests} requests, {stub.rate_limited} rate limited)")
+        assert all(data == CANNED_EXTRACTION for data, _ in results)
+        assert stub.rate_limited > 0
+        assert stub.completed == INVOICE_COUNT
+    finally:
+        stub.stop()
+
+
+def test_respects_concurrency_limit():
+    """With 4 slots and 0.2s latency, 20 calls need at least 5 rounds"""
+    stub = StubOpenAIServer(latency=0.2)
+    service = load_openai_service(stub.start())
+    original_limiter = service.rate_limiter
+    service.rate_limiter = service.RateLimiter(max_concurrency=4, requests_per_minute=10000, tokens_per_minute=10_000_000)
+    try:
+        async def run_all():
+            return await asyncio.gather(*[service.extract_invoice_data_async(f"Invoice {i}") for i in range(20)])
+
+        started = time.perf_counter()
+        asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+
+        print(f"✅ 20 extractions with 4 slots took {elapsed:.2f}s")
+        assert elapsed >= 5 * 0.2
+    finally:
+        service.rate_limiter = original_limiter
+        stub.stop()
+
+
+def test_bucket_works_in_several_event_loops():
+    """A CLI or test may call asyncio.run more than once with the same limiter"""
+    from services.rate_limiter import TokenBucket
+    bucket = TokenBucket(rate_per_minute=60000, capacity=1)
+
+    async def contend():
+        # Several waiters at once, so each loop really uses the lock
+        await asyncio.gather(*[bucket.acquire(1) for _ in range(5)])
+
+    asyncio.run(contend())
+    asyncio.run(contend())
+    print("✅ The same bucket works in a second event loop")
+
+
+def test_finished_event_loops_are_not_kept():
+    """Each asyncio.run leaves a closed loop behind; the limiter must not hold on to all of them"""
+    from services.rate_limiter import RateLimiter
+    limiter = RateLimiter(max_concurrency=1, requests_per_minute=60000, tokens_per_minute=10**9)
+
+    async def contend():
+        async def one():
+            await limiter.requests.acquire(1)
+            async with limiter.slot():
+                await asyncio.sleep(0.001)
+        await asyncio.gather(*[one() for _ in range(3)])
+
+    for _ in range(5):
+        asyncio.run(contend())
+    assert len(limiter._semaphores) <= 1 and len(limiter.requests._locks) <= 1
+    print("✅ Closed event loops are let go")
+
+
+if __name__ == "__main__":
+    print("===== TESTING OPENAI RATE LIMITING =====")
+    test_retries_rate_limits()
+    test_respects_concurrency_limit()
+    test_bucket_works_in_several_event_loops()
+    test_finished_event_loops_are_not_kept()
+    print("===== TEST COMPLETED =====")
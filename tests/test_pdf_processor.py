@@ -0,0 +1,61 @@
+# test_pdf_processor.py
+
+# Checks the PDF process pool: text comes back in page order, the page limit
+# holds, and a document that runs past the timeout is cut off. Builds its
+# own PDFs with PyMuPDF, no server needed.
+#
+# Run it from the repo root:   python tests/test_pdf_processor.py
+
+import os
+import sys
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import fitz  # PyMuPDF
+from utils.pdf_processor import PdfProcessPool, PdfLimitError
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        doc.new_page().insert_text((72, 72), f"Page {number} of {pages}")
+    doc.save(path)
+
+def test_pages_in_order_and_page_limit():
+    pool = PdfProcessPool(workers=2, max_pages=3)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "five.pdf")
+            make_pdf(path, 5)
+            text = asyncio.run(pool.extract_text(path))
+    finally:
+        pool.shutdown()
+    print(f"✅ Read {text.count('Page')} of 5 pages")
+    assert [line for line in text.splitlines() if line] == ["Page 1 of 5", "Page 2 of 5", "Page 3 of 5"]
+
+def test_timeout_and_missing_file():
+    pool = PdfProcessPool(workers=1, timeout=0.05, max_pages=5000)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "long.pdf")
+            make_pdf(path, 3000)
+            try:
+                asyncio.run(pool.extract_text(path))
+                assert False, "expected a timeout"
+            except PdfLimitError as e:
+                print(f"✅ Long PDF stopped: {e}")
+
+            try:
+                asyncio.run(pool.extract_text(os.path.join(folder, "missing.pdf")))
+                assert False, "expected FileNotFoundError"
+            except FileNotFoundError:
+                print("✅ Missing file reported")
+    finally:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    print("===== TESTING PDF PROCESSOR =====")
+    test_pages_in_order_and_page_limit()
+    test_timeout_and_missing_file()
+    print("===== TEST COMPLETED =====")
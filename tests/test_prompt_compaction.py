@@ -0,0 +1,62 @@
+# test_prompt_compaction.py
+
+# Checks that long invoices are trimmed to the token budget without losing
+# the lines the model needs. No server or OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_prompt_compaction.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.prompt_compaction import compact_invoice_text, estimate_tokens
+
+TERMS = (
+    "Terms and conditions: the supplier shall not be liable for indirect losses and any warranty "
+    "is limited to replacement of the goods. Disputes are settled by arbitration under the governing law."
+)
+
+LONG_INVOICE = "\n".join(
+    ["Globex Utilities", "500 Power Plant Road", "INVOICE #GX-2231", "Invoice Date: 2024-06-01"]
+    + [f"Meter reading {day}: 1{day:02d} kWh" for day in range(1, 31)]
+    + ["Subtotal $412.00", "Tax $32.96", "Amount Due", "$444.96"]
+    + ["Globex Utilities - Page 2 of 3"] + [TERMS] * 40
+    + ["Globex Utilities - Page 3 of 3"] + [TERMS] * 40
+)
+
+def test_long_invoice_fits_budget():
+    compacted = compact_invoice_text(LONG_INVOICE, budget=300)
+    print(f"✅ Compacted {estimate_tokens(LONG_INVOICE)} -> {estimate_tokens(compacted)} tokens")
+    assert estimate_tokens(compacted) <= 300 + 10  # plus the gap markers
+    for needed in ("Globex Utilities", "Invoice Date: 2024-06-01", "Amount Due", "$444.96"):
+        assert needed in compacted, needed
+    assert "arbitration" not in compacted
+
+def test_short_invoice_unchanged():
+    short = "Globex Utilities\nInvoice Date: 2024-06-01\nAmount Due $444.96"
+    assert compact_invoice_text(short, budget=300) == short
+    print("✅ Short invoices are sent as is")
+
+def test_one_long_line_is_cut_not_dropped():
+    # A PDF without line breaks comes out as a single huge line
+    text = "ACME Corp Invoice Date 2024-01-02 Total $100.00 " + "lorem ipsum dolor " * 300
+    compacted = compact_invoice_text(text, budget=300)
+    assert compacted.startswith("ACME Corp Invoice Date 2024-01-02 Total $100.00")
+    assert estimate_tokens(compacted) <= 300
+    print("✅ A line longer than the budget is cut to fit")
+
+def test_all_boilerplate_falls_back_to_the_start():
+    text = "\n".join([TERMS] * 60)
+    compacted = compact_invoice_text(text, budget=300)
+    assert compacted and text.startswith(compacted)
+    assert estimate_tokens(compacted) <= 300 + 1
+    print("✅ Text with nothing worth keeping sends its start instead of nothing")
+
+if __name__ == "__main__":
+    print("===== TESTING PROMPT COMPACTION =====")
+    test_long_invoice_fits_budget()
+    test_short_invoice_unchanged()
+    test_one_long_line_is_cut_not_dropped()
+    test_all_boilerplate_falls_back_to_the_start()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,76 @@
+# test_rule_extractor.py
+
+# Checks the vendor template fast path on plain invoice text - no database,
+# no server and no OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_rule_extractor.py
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.rule_extractor import CONFIDENCE_THRESHOLD, extract_with_rules, learn_labels
+
+def northwind_invoice(number, date, subtotal, total):
+    return f"""
+        Northwind Supplies
+        42 Harbor Road, Seattle WA
+
+        INVOICE #{number}
+        Invoice Date: {date}
+        Due Date: 04/30/2024
+
+        Description          Qty     Price
+        Printer paper          10     $25.00
+        Subtotal                    {subtotal}
+        Tax                              $8.00
+        Total Due
+        {total}
+    """
+
+FIRST = northwind_invoice("NW-1001", "03/15/2024", "$1,000.00", "$1,080.00")
+SECOND = northwind_invoice("NW-1042", "04/02/2024", "$250.00", "$270.50")
+
+def make_template(confirmations):
+    labels = learn_labels(FIRST, {"vendor": "Northwind Supplies", "amount": 1080.0, "invoice_date": "2024-03-15"})
+    amount_label, date_label = labels
+    return SimpleNamespace(vendor="Northwind Supplies", amount_label=amount_label, date_label=date_label,
+                           category="Supplies", currency="USD", confirmations=confirmations)
+
+def test_learns_labels_from_extraction():
+    labels = learn_labels(FIRST, {"vendor": "Northwind Supplies", "amount": 1080.0, "invoice_date": "2024-03-15"})
+    print(f"✅ Learned labels: {labels}")
+    assert labels == ("total due", "invoice date")
+
+    # An answer the text doesn't back up teaches nothing
+    assert learn_labels(FIRST, {"vendor": "Northwind Supplies", "amount": 999.0, "invoice_date": "2024-03-15"}) is None
+
+def test_confirmed_template_extracts_new_invoice():
+    data, confidence = extract_with_rules(SECOND, [make_template(confirmations=3)])
+    print(f"✅ Rules extracted: {data} (confidence {confidence})")
+    assert confidence >= CONFIDENCE_THRESHOLD
+    assert data == {"vendor": "Northwind Supplies", "amount": 270.5, "invoice_date": "2024-04-02",
+                    "category": "Supplies", "currency": "USD"}
+
+def test_unknown_or_unconfirmed_vendor_falls_back():
+    assert extract_with_rules(SECOND, [make_template(confirmations=1)]) == (None, 0.0)
+
+    other = SECOND.replace("Northwind Supplies", "Contoso Ltd")
+    assert extract_with_rules(other, [make_template(confirmations=3)]) == (None, 0.0)
+    print("✅ Unknown and unconfirmed vendors go to the AI")
+
+def test_vendor_must_match_whole_words():
+    # A different vendor whose name merely starts with ours
+    other = SECOND.replace("Northwind Supplies", "Northwind SuppliesCo")
+    assert extract_with_rules(other, [make_template(confirmations=3)]) == (None, 0.0)
+    print("✅ Vendor names only match as whole words")
+
+if __name__ == "__main__":
+    print("===== TESTING RULE EXTRACTOR =====")
+    test_learns_labels_from_extraction()
+    test_confirmed_template_extracts_new_invoice()
+    test_unknown_or_unconfirmed_vendor_falls_back()
+    test_vendor_must_match_whole_words()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,95 @@
+# test_search_index.py
+
+# Checks the FTS5 invoice search on a throwaway SQLite database - no server
+# and no OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_search_index.py
+
+import os
+import sys
+import zlib
+import tempfile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database import Base
+from migrations import run_migrations
+from models.invoice import Invoice
+from models.user import User  # noqa: F401 - invoices.owner_id points at users
+from models.document_text import DocumentText
+from services.search_index import InvalidSearchQuery, index_invoice, remove_invoice, search_invoices
+
+def make_database(folder):
+    """A fresh database with one invoice that exists before the search table does."""
+    engine = create_engine(f"sqlite:///{os.path.join(folder, 'search.db')}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add(DocumentText(content_hash="a" * 64, text_zlib=zlib.compress(b"Northwind Supplies\nPrinter paper 10 x 25.00")))
+        db.add(Invoice(id=1, owner_id=1, file_name="northwind.pdf", vendor="Northwind Supplies", content_hash="a" * 64))
+        db.commit()
+    run_migrations(engine)
+    return engine
+
+def hit_ids(db, owner_id, query):
+    return [invoice_id for invoice_id, _, _ in search_invoices(db, owner_id, query, limit=20)]
+
+def test_existing_invoices_are_indexed_and_scoped_to_owner():
+    with tempfile.TemporaryDirectory() as folder:
+        engine = make_database(folder)
+        with Session(engine) as db:
+            assert hit_ids(db, 1, "printer") == [1]
+            assert hit_ids(db, 1, "northw") == [1]   # Last word matches as a prefix
+            assert hit_ids(db, 2, "printer") == []   # Other users never see it
+
+            invoice_id, score, snippet = search_invoices(db, 1, "paper", limit=20)[0]
+            print(f"✅ Snippet: {snippet!r} (score {score:.3f})")
+            assert "**paper**" in snippet
+        engine.dispose()
+
+def test_index_follows_updates_and_deletes():
+    with tempfile.TemporaryDirectory() as folder:
+        engine = make_database(folder)
+        with Session(engine) as db:
+            invoice = Invoice(owner_id=1, file_name="manual.pdf", vendor="Contoso", category="Consulting")
+            db.add(invoice)
+            db.flush()
+            index_invoice(db, invoice, "Contoso Ltd\nConsulting hours 12")
+            db.commit()
+            assert hit_ids(db, 1, "consulting hours") == [invoice.id]
+
+            # Renaming keeps the indexed PDF text
+            invoice.vendor = "Initech"
+            index_invoice(db, invoice)
+            db.commit()
+            assert hit_ids(db, 1, "initech") == [invoice.id]
+            assert hit_ids(db, 1, "hours") == [invoice.id]
+            assert hit_ids(db, 1, "contoso") == [invoice.id]  # Still in the PDF text
+
+            remove_invoice(db, invoice.id)
+            db.commit()
+            assert hit_ids(db, 1, "initech") == []
+            print("✅ Search follows updates and deletes")
+        engine.dispose()
+
+def test_query_syntax_is_not_passed_through():
+    with tempfile.TemporaryDirectory() as folder:
+        engine = make_database(folder)
+        with Session(engine) as db:
+            # FTS operators and column filters are just words to us
+            assert hit_ids(db, 1, 'owner:u1 OR "printer') == []
+            assert hit_ids(db, 1, "printer)*") == [1]
+            try:
+                search_invoices(db, 1, "*** ()", limit=20)
+                assert False, "expected InvalidSearchQuery"
+            except InvalidSearchQuery:
+                print("✅ Queries without words are rejected")
+        engine.dispose()
+
+if __name__ == "__main__":
+    print("===== TESTING SEARCH INDEX =====")
+    test_existing_invoices_are_indexed_and_scoped_to_owner()
+    test_index_follows_updates_and_deletes()
+    test_query_syntax_is_not_passed_through()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,86 @@
+# test_usage_ledger.py
+
+# Checks the buffered usage ledger against a throwaway SQLite database:
+# pricing, batched writes, owner lookup and keeping entries when a write fails.
+#
+# Run it from the repo root:   python tests/test_usage_ledger.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from migrations import run_migrations
+from models.api_usage import ApiUsage
+from models.invoice import Invoice
+from models.user import User
+from services import usage_ledger as ledger_module
+from services.usage_ledger import UsageLedger, cost_micro_usd
+
+def make_database():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'usage.db')}")
+    run_migrations(engine)
+    sessions = sessionmaker(bind=engine)
+    db = sessions()
+    db.add(User(id=1, email="a@b.c", hashed_password="x"))
+    db.add(Invoice(id=10, owner_id=1, file_path="uploads/a.pdf"))
+    db.commit()
+    db.close()
+    # The ledger opens its own sessions
+    ledger_module.SessionLocal = sessions
+    return sessions
+
+def test_pricing():
+    # gpt-3.5-turbo: $0.50 / $1.50 per million tokens
+    assert cost_micro_usd("gpt-3.5-turbo", 1_000_000, 0) == 500_000
+    assert cost_micro_usd("gpt-3.5-turbo", 400, 20) == 230
+    assert cost_micro_usd("gpt-3.5-turbo", 400, 20, factor=0.5) == 115
+    assert cost_micro_usd("some-unknown-model", 400, 20) == 0
+    print("✅ Tokens are priced in micro-dollars")
+
+def test_entries_are_buffered_and_written_in_batches():
+    sessions = make_database()
+    ledger = UsageLedger(flush_size=3)
+    ledger.record(10, "gpt-3.5-turbo", 400, 20, 0.25)
+    ledger.record(10, "gpt-3.5-turbo", cache_status="hit")
+    db = sessions()
+    assert db.query(ApiUsage).count() == 0, "Nothing should be written before the batch is full"
+
+    # The third entry fills the batch; without a running flusher the caller writes it
+    ledger.record(99, "gpt-3.5-turbo", 100, 10, 0.1, success=False)
+    rows = db.query(ApiUsage).order_by(ApiUsage.id).all()
+    assert len(rows) == 3
+    assert [row.owner_id for row in rows] == [1, 1, None]  # Invoice 99 doesn't exist
+    assert rows[0].latency_ms == 250 and rows[0].cost_micro_usd == 230
+    assert rows[1].cache_status == "hit" and rows[1].cost_micro_usd == 0
+    assert rows[2].success is False
+    assert ledger.flush() == 0
+    db.close()
+    print("✅ Entries are written in one batch once the buffer is full")
+
+def test_failed_write_keeps_entries():
+    make_database()
+    ledger = UsageLedger()
+    ledger.record(10, "gpt-3.5-turbo", 400, 20)
+
+    working = ledger_module.SessionLocal
+    def broken_session():
+        raise RuntimeError("database is locked")
+    ledger_module.SessionLocal = broken_session
+    try:
+        assert ledger.flush() == 0
+    finally:
+        ledger_module.SessionLocal = working
+    assert ledger.flush() == 1, "The entry should be written by the next flush"
+    print("✅ A failed write keeps its entries for the next flush")
+
+if __name__ == "__main__":
+    print("===== TESTING THE USAGE LEDGER =====")
+    test_pricing()
+    test_entries_are_buffered_and_written_in_batches()
+    test_failed_write_keeps_entries()
+    print("===== TEST COMPLETED =====")
@@ -0,0 +1,43 @@
+# test_vendor_directory.py
+
+# Checks how vendor spellings are normalized and matched to canonical
+# vendors - no database, no server and no OpenAI calls.
+#
+# Run it from the repo root:   python tests/test_vendor_directory.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.vendor_directory import OwnerVendors, vendor_key
+
+def test_spellings_share_a_key():
+    keys = {vendor_key(name) for name in ["ACME Corp", "Acme Corporation", "ACME CORP.", "The Acme Co., Ltd."]}
+    print(f"✅ Keys: {keys}")
+    assert keys == {"acme"}
+    assert vendor_key("Hanson's Hardware") == "hansons hardware"
+    assert vendor_key("Procter & Gamble") == "procter and gamble"
+    # A legal suffix on its own is still a name
+    assert vendor_key("Company") == "company"
+    assert vendor_key(" ... ") == ""
+
+def test_trigram_matching():
+    vendors = OwnerVendors()
+    vendors.add("northwind supplies", 1)
+    vendors.add("acme", 2)
+    vendors.add("acme industries", 3)
+
+    assert vendors.match("northwind supplies") == 1
+    assert vendors.match("northwnd supplies") == 1      # Typo
+    assert vendors.match("northwind supply") == 1       # Small variation
+    assert vendors.match("acme industries") == 3
+    assert vendors.match("acme tools") is None          # Same first word isn't enough
+    assert vendors.match("globex") is None
+    print("✅ Typos match, different vendors don't")
+
+if __name__ == "__main__":
+    print("===== TESTING VENDOR DIRECTORY =====")
+    test_spellings_share_a_key()
+    test_trigram_matching()
+    print("===== TEST COMPLETED =====")